@@ -16,5 +16,11 @@
     along with BinCAT.  If not, see <http://www.gnu.org/licenses/>.
 *)
 
-Printf.printf "%s" "Running native BinCAT\n";;
-Main.process Sys.argv.(1) Sys.argv.(2) Sys.argv.(3)
+(* bincat_native --server runs the analyses requested on its standard input (see Main.serve) *)
+if Array.length Sys.argv = 2 && Sys.argv.(1) = "--server" then
+  Main.serve stdin stdout
+else
+  begin
+    Printf.printf "%s" "Running native BinCAT\n";
+    Main.process Sys.argv.(1) Sys.argv.(2) Sys.argv.(3)
+  end;;
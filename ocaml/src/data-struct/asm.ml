@@ -89,6 +89,12 @@ and bexp =
   | BConst of bool                   (** boolean constant true of false *)
 		
 	   
+(** string operations that a rep prefix repeats, see directive Rep *)
+type rep_t =
+  | Rep_movs of exp * exp       (** Rep_movs (dst, src): copy of the element at address src to address dst *)
+  | Rep_stos of exp * exp       (** Rep_stos (dst, v): store of v at address dst *)
+  | Rep_scas of exp * cmp * exp (** Rep_scas (e, cmp, v): comparison of the element at address e with v. The repetition stops as soon as (element cmp v) is true *)
+
 (** type of directives for the analyzer *)
 type directive_t =
   | Remove of Register.t   (** remove the register *)
@@ -100,6 +106,9 @@ type directive_t =
   | Unroll_until of exp * cmp * exp * int * int (** Unroll (e, cmp terminator, bs, sz) set the current unroll value to tmin (n, bs) where n is an offset from memory [e].
 						    This offset is the minimal integer where (sz)[e] cmp terminator is true *)
   | Stub of string * (exp list) (** Stub (f, args) is the stub of the function f with args as arguments *)    
+  | Rep of rep_t * lval * lval list * int * bool (** Rep (op, count, ptrs, sz, forward) applies op in one step on the count elements of sz bits
+						    the iterations of a rep prefix would go through, the pointers ptrs being moved upward if forward is true and downward otherwise.
+						    count and ptrs are updated as if these iterations had been done. Nothing is done if count is not concrete *)
 
 (** data type of jump targets *)
 type jmp_target = 
@@ -242,6 +251,14 @@ let string_of_directive d =
   | Default_unroll -> "set unroll value to its default value"
   | Unroll_until (e, cmp, terminator, ub, sz) -> Printf.sprintf "unroll current loop min (n, %d) times with n = minimal offset from e such that (%d)[%s+n] %s %s" ub sz (string_of_exp e false) (string_of_cmp cmp) (string_of_exp terminator false)
   | Stub (f, _) -> Printf.sprintf "stub of %s" f
+  | Rep (op, count, _, sz, forward) ->
+     let op' =
+       match op with
+       | Rep_movs (dst, src) -> Printf.sprintf "copy of (%d)[%s] to (%d)[%s]" sz (string_of_exp src false) sz (string_of_exp dst false)
+       | Rep_stos (dst, v) -> Printf.sprintf "store of %s to (%d)[%s]" (string_of_exp v false) sz (string_of_exp dst false)
+       | Rep_scas (e, cmp, v) -> Printf.sprintf "comparison of (%d)[%s] with %s until %s" sz (string_of_exp e false) (string_of_exp v false) (string_of_cmp cmp)
+     in
+     Printf.sprintf "repeat %s %s times %s" op' (string_of_lval count false) (if forward then "upward" else "downward")
      
 
 let string_of_target tgt =
@@ -33,12 +33,20 @@ let make ~code ~rva ~ep =
   }
     
     
+type cursor = {
+    buf: string; (** the byte sequence of the code (shared, never copied) *)
+    start: int;  (** offset in buf of the first byte of the cursor *)
+  }
+
 let sub v a =
   try
     let o   = Z.to_int (Z.sub (Data.Address.to_int a) v.rva) in
-    let len = (String.length v.c) - o         		     in
-    String.sub v.c o len 
+    if o < 0 || o > String.length v.c then
+      raise Exit;
+    { buf = v.c; start = o }
   with _ ->  raise (Exceptions.Error (Printf.sprintf "Illegal address of code %s" (Data.Address.to_string a)))
+
+let getchar cur o = String.get cur.buf (cur.start + o)
 		   
 let to_string c =
   let s = ref "" in
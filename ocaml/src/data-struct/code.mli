@@ -26,9 +26,17 @@
     val make: code:string -> rva:Z.t -> ep:Z.t -> t
 									      
 				     
+    (** read-only view on the code starting at a given address.
+    The underlying byte sequence is shared, not copied *)
+    type cursor
+
     (** returns the sub sequence starting at the given address.
     May raise an exception if the given address is out of range *)
-    val sub: t -> Data.Address.t -> string
+    val sub: t -> Data.Address.t -> cursor
+
+    (** [getchar c o] returns the byte at offset _o_ from the start of the cursor _c_.
+    Raise Invalid_argument if the offset is beyond the end of the code *)
+    val getchar: cursor -> int -> char
 				   
 
     (** string conversion *)
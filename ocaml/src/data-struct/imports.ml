@@ -125,6 +125,9 @@ struct
     List.iter (fun (name, body) -> Hashtbl.add cdecl_stubs name (body())) funs
   	 
   let init () =
+    Hashtbl.reset tbl;
+    Hashtbl.reset stdcall_stubs;
+    Hashtbl.reset cdecl_stubs;
     init_stdcall ();
     init_cdecl ()
 
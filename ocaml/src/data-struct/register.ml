@@ -45,9 +45,15 @@ let make_sp ~name ~size = imake name size true
 let equal v1 v2 = compare v1 v2 = 0
 				    
 let fresh_name () = "_bincat_tmp_"^(string_of_int !cid)
+
+let next_id () = !cid
+
+let reserve_ids n = cid := max !cid n
     
 let remove r = registers := Set.remove r !registers
 
+let remove_from id = registers := Set.filter (fun r -> r.id < id) !registers
+
 let name r = r.name
 
 let size r = r.sz
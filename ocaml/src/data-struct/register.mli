@@ -34,10 +34,17 @@ val make_sp: name:string -> size:int -> t
 		  
 (** returns a fresh register name *)
 val fresh_name: unit -> string
+(** returns the identifier of the next created register *)
+val next_id: unit -> int
+(** [reserve_ids n] ensures that the identifiers of the next created registers are greater than or equal to n *)
+val reserve_ids: int -> unit
 
 (** remove the given register from the set of used registers *)
 val remove: t -> unit
 
+(** [remove_from id] removes from the set of used registers the ones created since next_id returned id *)
+val remove_from: int -> unit
+
 (** returns the name of the given register *)
 val name: t -> string
 
@@ -44,6 +44,7 @@ module Make(Domain: Domain.T) =
 	      mutable forward_loop: bool; (** true whenever the state belongs to a loop that is forward analysed in CFA mode *)
 	      mutable branch: bool option; (** None is for unconditional predecessor. Some true if the predecessor is a If-statement for which the true branch has been taken. Some false if the false branch has been taken *)
 	      mutable bytes: char list;      (** corresponding list of bytes *)
+	      mutable block: int list;      (** lengths of the instructions of a basic block node (see Config.block_nodes). Empty for the node of a single instruction *)
 	    mutable is_tainted: bool (** true whenever a source left value is the stmt list (field stmts) may be tainted *)
 	    }
 
@@ -68,8 +69,13 @@ module Make(Domain: Domain.T) =
       module G = Graph.Imperative.Digraph.ConcreteBidirectional(State)
       open State
 
-      (** type of a CFA *)
-      type t = G.t
+      (** type of a CFA: the graph of its states and their index by instruction pointer.
+      The index is updated by every function that adds, removes or moves a state so that
+      looking for the states at a given address does not need to scan the whole CFA *)
+      type t = {
+	  graph: G.t;
+	  by_ip: (Data.Address.t, State.t list) Hashtbl.t;
+	}
 
       (* utilities for memory and register initialization with respect to the provided configuration *)
       (***********************************************************************************************)
@@ -149,25 +155,37 @@ module Make(Domain: Domain.T) =
 	(* init of the Heap memory *)
 	init_mem d' Data.Address.Heap Config.heap_content
 	
-      (** returned CFA has only one node : the state whose ip is given by the parameter and whose domain field is generated from the Config module *)
-      let init ip =
-	let d' = init_abstract_value () in
+      (* state without predecessor *)
+      let root id ip d =
 	{
-	    id = 0;
+	    id = id;
 	    ip = ip;
-	    v = d';
+	    v = d;
 	    final = false;
 	    back_loop = false;
 	    forward_loop = false;
 	    branch = None;
 	    stmts = [];
 	    bytes = [];
+	    block = [];
 	    ctx = {
 		op_sz = !Config.operand_sz;
 		addr_sz = !Config.address_sz;
 	      };
 	    is_tainted = false;
 	}
+
+      (** returned CFA has only one node : the state whose ip is given by the parameter and whose domain field is generated from the Config module *)
+      let init ip = root 0 ip (init_abstract_value ())
+
+      (** ranges of the ids of the states computed from every entry point of a batch analysis (see Config.entry_points):
+      entry point, first id and last id *)
+      let entry_ranges: (Data.Address.t * int * int) list ref = ref []
+
+      (** [init_entry ip d] returns the initial state of the analysis from the entry point _ip_ of a batch analysis
+      with _d_ as abstract value. The first one has the id 0 as the state returned by init *)
+      let init_entry ip d =
+	root (if !entry_ranges = [] then 0 else State.new_state_id ()) ip d
 	
 
       (* CFA utilities *)
@@ -175,6 +193,24 @@ module Make(Domain: Domain.T) =
       (** returns true whenever the two given contexts are equal *)
       let ctx_equal c1 c2 = c1.addr_sz = c2.addr_sz && c1.op_sz = c2.op_sz
 
+      (** adds the given state to the address index of the CFA _g_ *)
+      let index_state g v =
+	try Hashtbl.replace g.by_ip v.ip (v::(Hashtbl.find g.by_ip v.ip))
+	with Not_found -> Hashtbl.add g.by_ip v.ip [v]
+
+      (** removes the given state from the address index of the CFA _g_ *)
+      let unindex_state g v =
+	try
+	  match List.filter (fun s -> s.id <> v.id) (Hashtbl.find g.by_ip v.ip) with
+	  | [] -> Hashtbl.remove g.by_ip v.ip
+	  | l  -> Hashtbl.replace g.by_ip v.ip l
+	with Not_found -> ()
+
+      (** returns the list of states of the given CFA whose ip field is the given address *)
+      let states_at g ip =
+	try Hashtbl.find g.by_ip ip
+	with Not_found -> []
+
       (** [add_state g pred ip s stmts ctx] creates a new state in _g_ with
     - ip as instruction pointer;
     - stmts as list of statements;
@@ -193,26 +229,62 @@ module Make(Domain: Domain.T) =
 	    forward_loop = forward_loop;
 	    branch = branch;
 	    bytes    = bytes;
+	    block    = [];
 	    is_tainted = is_tainted;
 	  }
 	  in
 	  L.debug (fun p -> p "Create CFA node %i for IP=%s #############################" v.id (Data.Address.to_string v.ip));
-	  G.add_vertex g v;
+	  G.add_vertex g.graph v;
+	  index_state g v;
 	  v
 
-      let add_vertex g v = G.add_vertex g v
+      let add_vertex g v =
+	if not (G.mem_vertex g.graph v) then
+	  begin
+	    G.add_vertex g.graph v;
+	    index_state g v
+	  end
 					
-      let create () = G.create ()
+      let create () = { graph = G.create (); by_ip = Hashtbl.create 1000 }
+
+      (** returns the CFA of the given graph of states *)
+      let of_graph graph =
+	let g = { graph = graph; by_ip = Hashtbl.create 1000 } in
+	G.iter_vertex (index_state g) graph;
+	g
 					
-      let remove_state g v = G.remove_vertex g v
+      let remove_state g v =
+	unindex_state g v;
+	G.remove_vertex g.graph v
+
+      (** [update_ip g v ip] sets the instruction pointer of the state _v_ of _g_ to _ip_ and keeps the address index up to date *)
+      let update_ip g v ip =
+	unindex_state g v;
+	v.ip <- ip;
+	index_state g v
 
-      let remove_edge g src dst = G.remove_edge g src dst
+      let remove_edge g src dst = G.remove_edge g.graph src dst
 						   
       (** returns a fresh copy of the given state *)
       let copy_state g s = add_state g s.ip s.v s.stmts s.ctx s.final s.back_loop s.forward_loop s.branch s.bytes s.is_tainted
 
       (** [add_edge g src dst] adds in _g_ an edge _src_ -> _dst_ *)
-      let add_edge g src dst = G.add_edge g src dst
+      let add_edge g src dst = G.add_edge g.graph src dst
+
+      (** returns the list of successors of the given vertex in the given CFA *)
+      let succs g v  = G.succ g.graph v
+
+      (** [merge_state g b s] appends the instruction of the state _s_ to the basic block node _b_ (see Config.block_nodes):
+      the bytes and statements of _s_ are added to the ones of _b_, the successors of _s_ become successors of _b_
+      and _s_ is removed from _g_ *)
+      let merge_state g b s =
+	if b.block = [] then b.block <- [List.length b.bytes];
+	b.block <- b.block @ [List.length s.bytes];
+	b.bytes <- b.bytes @ s.bytes;
+	b.stmts <- b.stmts @ s.stmts;
+	b.is_tainted <- b.is_tainted || s.is_tainted;
+	List.iter (fun s' -> add_edge g b s') (succs g s);
+	remove_state g s
 
       (** updates the abstract value field of the given state *)
       let update_state s v'=
@@ -224,36 +296,33 @@ module Make(Domain: Domain.T) =
       	s.stmts <- stmts;
       	s.ctx   <- { addr_sz = addr_sz; op_sz = op_sz }
 
-      (** returns the list of successors of the given vertex in the given CFA *)
-      let succs g v  = G.succ g v
-
       (** fold on all vertices of a graph *)
-      let fold_vertex f g i = G.fold_vertex f g i
+      let fold_vertex f g i = G.fold_vertex f g.graph i
 
       (** iter on all vertices of a graph *)
-      let iter_vertex f g = G.iter_vertex f g
+      let iter_vertex f g = G.iter_vertex f g.graph
+
+      (** returns the number of states of the given CFA *)
+      let nb_states g = G.nb_vertex g.graph
 
       (** returns the unique predecessor of the given vertex in the given CFA.
       May raise an exception if the vertex has no predessor *)
       let pred g v   =
-	try List.hd (G.pred g v)
+	try List.hd (G.pred g.graph v)
 	with _ -> raise (Invalid_argument "vertex without predecessor")
 
       (** returns every node without successor in the given CFA *)
       let last g =
-	G.fold_vertex (fun v l -> if succs g v = [] then v::l else l) g []
+	G.fold_vertex (fun v l -> if succs g v = [] then v::l else l) g.graph []
 	       
       (** returns the state with the highest id and which has the given addr as ip field *)
       let last_addr g ip =
-	let s = ref None in
-	let last s' =
-	  if Data.Address.compare s'.ip ip = 0 then
-	    match !s with
-	    | None -> s := Some s'
-	    | Some prev -> if prev.id < s'.id then s := Some s'
+	let last s s' =
+	  match s with
+	  | None -> Some s'
+	  | Some prev -> if prev.id < s'.id then Some s' else s
 	in
-	G.iter_vertex last g;
-	match !s with
+	match List.fold_left last None (states_at g ip) with
 	| None -> raise Not_found
 	| Some s'   -> s'
 			   
@@ -271,50 +340,319 @@ module Make(Domain: Domain.T) =
       end
       module Dot = Graph.Graphviz.Dot(GDot)
 
-      let print dumpfile dotfile g =
-	let f = open_out dumpfile in
-	(* state printing (detailed) *)
-	let print_ip s =
-	  let bytes = List.fold_left (fun s c -> s ^" " ^ (Printf.sprintf "%02x" (Char.code c))) "" s.bytes in
-	  Printf.fprintf f "[node = %d]\naddress = %s\nbytes =%s\nfinal =%s\ntainted=%s\n" s.id (Data.Address.to_string s.ip) bytes (string_of_bool s.final) (string_of_bool s.is_tainted);
-      List.iter (fun v -> Printf.fprintf f "%s\n" v) (Domain.to_string s.v);
-	  if !Config.loglevel > 2 then
-	    begin
-	      Printf.fprintf f "statements =";
-	      List.iter (fun stmt -> Printf.fprintf f " %s\n" (Asm.string_of_stmt stmt true)) s.stmts;
-	    end;
-	  Printf.fprintf f "\n";
+      (* state printing (detailed) *)
+      let print_state_values f s values =
+	let bytes = List.fold_left (fun s c -> s ^" " ^ (Printf.sprintf "%02x" (Char.code c))) "" s.bytes in
+	Printf.fprintf f "[node = %d]\naddress = %s\nbytes =%s\nfinal =%s\ntainted=%s\n" s.id (Data.Address.to_string s.ip) bytes (string_of_bool s.final) (string_of_bool s.is_tainted);
+	if s.block <> [] then
+	  begin
+	    (* addresses of the instructions of the basic block *)
+	    let addrs, _ = List.fold_left (fun (l, o) n -> (Data.Address.to_string (Data.Address.add_offset s.ip (Z.of_int o)))::l, o+n) ([], 0) s.block in
+	    Printf.fprintf f "instructions = %s\n" (String.concat ", " (List.rev addrs))
+	  end;
+	List.iter (fun v -> Printf.fprintf f "%s\n" v) values;
+	if !Config.loglevel > 2 then
+	  begin
+	    Printf.fprintf f "statements =";
+	    List.iter (fun stmt -> Printf.fprintf f " %s\n" (Asm.string_of_stmt stmt true)) s.stmts;
+	  end;
+	Printf.fprintf f "\n"
+
+      (** value lines of the given state. The abstract value of a state that has not been retained
+      (see Config.retention) is bottom and not printed *)
+      let values s =
+	if Domain.is_bot s.v then []
+	else Domain.to_string s.v
+
+      let print_state f s = print_state_values f s (values s)
+
+      (** key of a value line, that is its part before the first '=' *)
+      let line_key l =
+	try String.trim (String.sub l 0 (String.index l '='))
+	with Not_found -> l
+
+      (** [delta_lines p plines lines] returns the lines of a state whose predecessor _p_ has the lines _plines_ with
+      the delta encoding (see Config.delta_output): the parent key gives the id of _p_, the removed key lists the
+      keys of _plines_ that are not in _lines_ and only the lines of _lines_ that are not in _plines_ are kept *)
+      let delta_lines p plines lines =
+	let previous = Hashtbl.create (List.length plines) in
+	List.iter (fun l -> Hashtbl.replace previous l ()) plines;
+	let keys = Hashtbl.create (List.length lines) in
+	List.iter (fun l -> Hashtbl.replace keys (line_key l) ()) lines;
+	let removed = List.filter (fun l -> not (Hashtbl.mem keys (line_key l))) plines in
+	let removed = if removed = [] then [] else [Printf.sprintf "removed = %s" (String.concat "; " (List.map line_key removed))] in
+	(Printf.sprintf "parent = %d" p.id)::(removed @ (List.filter (fun l -> not (Hashtbl.mem previous l)) lines))
+
+      (** prints the states of _g_ with the delta encoding. States are printed by increasing id so that the lines of
+      a predecessor are usually computed before the ones of its successors. They are kept until all the successors
+      whose parent it is are printed *)
+      let print_delta f g =
+	let cache = Hashtbl.create 100 in
+	let parent s = try Some (pred g s) with Invalid_argument _ -> None in
+	let lines_of p =
+	  try
+	    let lines, n = Hashtbl.find cache p.id in
+	    decr n;
+	    if !n <= 0 then Hashtbl.remove cache p.id;
+	    lines
+	  with Not_found -> values p
 	in
-	G.iter_vertex print_ip g;
+	let states = List.sort State.compare (G.fold_vertex (fun s l -> s::l) g.graph []) in
+	List.iter (fun s ->
+	  let lines = values s in
+	  let children = List.length (List.filter (fun s' -> match parent s' with Some p -> p.id = s.id | None -> false) (succs g s)) in
+	  if children > 0 then Hashtbl.replace cache s.id (lines, ref children);
+	  let lines' =
+	    match parent s with
+	    | Some p ->
+	       let plines = lines_of p in
+	       if lines = [] || plines = [] then lines
+	       else delta_lines p plines lines
+	    | None -> lines
+	  in
+	  print_state_values f s lines') states
+
+      let edge_to_string e = Printf.sprintf "e%d_%d = %d -> %d\n" (G.E.src e).id (G.E.dst e).id (G.E.src e).id (G.E.dst e).id
+
+      (** results streamed while the analysis is running.
+      Every processed state is appended as a node section to the partial result file ;
+      the edges are buffered and appended as an [edges] section every stream_period states.
+      As sections of the same name are merged by ini readers, the partial file is a valid
+      result file up to its last complete section *)
+      type stream_t = {
+	  chan: out_channel;
+	  fname: string;
+	  edges: Buffer.t;
+	  mutable pending: int; (* number of states written since the last flush *)
+	}
+
+      let stream: stream_t option ref = ref None
+
+      let stream_period = 100
+
+      (** returns the name of the partial result file corresponding to the given result file *)
+      let partial_name dumpfile = dumpfile ^ ".part"
+
+      let stream_start dumpfile =
+	let fname = partial_name dumpfile in
+	stream := Some { chan = open_out fname; fname = fname; edges = Buffer.create 4096; pending = 0 }
+
+      let stream_flush s =
+	if Buffer.length s.edges > 0 then
+	  begin
+	    Printf.fprintf s.chan "[edges]\n";
+	    Buffer.output_buffer s.chan s.edges;
+	    Printf.fprintf s.chan "\n";
+	    Buffer.clear s.edges
+	  end;
+	s.pending <- 0;
+	flush s.chan
+
+      (** appends the given state and its outgoing edges to the partial result file if streaming is on *)
+      let stream_state g v =
+	match !stream with
+	| None -> ()
+	| Some s ->
+	   print_state s.chan v;
+	   G.iter_succ_e (fun e -> Buffer.add_string s.edges (edge_to_string e)) g.graph v;
+	   s.pending <- s.pending + 1;
+	   if s.pending >= stream_period then stream_flush s
+
+      (* the partial result file is removed once the complete one is written *)
+      let stream_stop () =
+	match !stream with
+	| None -> ()
+	| Some s ->
+	   close_out s.chan;
+	   stream := None;
+	   try Sys.remove s.fname with Sys_error _ -> ()
+
+      (** forgets the previous analysis run with the same module: the ids of the states start again from 0. The
+      partial result file of a failed analysis is closed and kept *)
+      let reset () =
+	State.state_cpt := 0;
+	entry_ranges := [];
+	match !stream with
+	| None -> ()
+	| Some s ->
+	   close_out_noerr s.chan;
+	   stream := None
+
+      (** the result file is first written into a temporary file that is renamed at the end,
+      so that readers never see a truncated file *)
+      let print dumpfile dotfile g =
+	let tmp = dumpfile ^ ".tmp" in
+	let f = open_out tmp in
+	if !Config.delta_output then print_delta f g
+	else G.iter_vertex (print_state f) g.graph;
 	(* edge printing (summary) *)
 	Printf.fprintf f "[edges]\n";
-	G.iter_edges_e (fun e -> Printf.fprintf f "e%d_%d = %d -> %d\n" (G.E.src e).id (G.E.dst e).id (G.E.src e).id (G.E.dst e).id) g;
+	G.iter_edges_e (fun e -> output_string f (edge_to_string e)) g.graph;
+	if !entry_ranges <> [] then
+	  begin
+	    Printf.fprintf f "[entry points]\n";
+	    List.iter (fun (ep, first, last) -> Printf.fprintf f "%s = %d, %d\n" (Data.Address.to_string ep) first last)
+	      (List.rev !entry_ranges)
+	  end;
 	close_out f;
+	Sys.rename tmp dumpfile;
+	stream_stop ();
 	(* dot generation *)
 	if dotfile <> "" then
 	  begin
 	    let f' = open_out dotfile in
-	    Dot.output_graph f' g;
+	    Dot.output_graph f' g.graph;
 	    close_out f'
 	  end
 
-      (** marshalling in that order:
-           - cfa
-           - state_id
-	     *)
+      (** marshalled CFA files (versioned container):
+      - the magic string and the format version ;
+      - the abstract values of the states, each one as a separate chunk. A value physically shared by several
+      states is written once ;
+      - the index: the CFA whose abstract values are replaced by bottom, the state counter and the offset of
+      the chunk of every state ;
+      - the offset of the index as a fixed width decimal number.
+      Every chunk and the index are marshalled, compressed (see Lz) and preceded by their compressed length *)
+      let marshal_magic = "BINCATMCFA"
+
+      let marshal_version = 2
+
+      (* width of the offset of the index at the end of the file *)
+      let offset_width = 20
+
+      module Values = Hashtbl.Make(struct type t = Domain.t let equal = (==) let hash = Hashtbl.hash end)
+
+      type index_t = {
+	  ix_cfa: G.t; (** states without abstract value *)
+	  ix_cpt: int; (** state counter *)
+	  ix_chunks: (int, int) Hashtbl.t; (** offset of the abstract value of every state *)
+	}
+
+      let output_chunk f v =
+	let c = Lz.compress (Marshal.to_string v []) in
+	output_binary_int f (String.length c);
+	output_string f c
+
+      (** reads the chunk of _infname_ at the current position of _f_ *)
+      let input_chunk infname f =
+	try
+	  let n = input_binary_int f in
+	  Marshal.from_string (Lz.decompress (really_input_string f n)) 0
+	with Invalid_argument _ | Failure _ | End_of_file ->
+	  close_in f;
+	  L.abort (fun p -> p "marshalled CFA %s is corrupted" infname)
+
       let marshal outfname cfa =
-	let cfa_marshal_fd = open_out_bin outfname in
-	Marshal.to_channel cfa_marshal_fd cfa [];
-	Marshal.to_channel cfa_marshal_fd !state_cpt [];
-	close_out cfa_marshal_fd;;
+	let f = open_out_bin outfname in
+	output_string f marshal_magic;
+	output_binary_int f marshal_version;
+	let written = Values.create 1000 in
+	let chunks = Hashtbl.create 1000 in
+	let skeleton = G.create () in
+	let copies = Hashtbl.create 1000 in
+	G.iter_vertex (fun s ->
+	  let o =
+	    try Values.find written s.v
+	    with Not_found ->
+	      let o = pos_out f in
+	      output_chunk f s.v;
+	      Values.add written s.v o;
+	      o
+	  in
+	  Hashtbl.add chunks s.id o;
+	  let s' = { s with v = Domain.bot } in
+	  Hashtbl.add copies s.id s';
+	  G.add_vertex skeleton s') cfa.graph;
+	G.iter_edges (fun src dst -> G.add_edge skeleton (Hashtbl.find copies src.id) (Hashtbl.find copies dst.id)) cfa.graph;
+	let index_offset = pos_out f in
+	output_chunk f { ix_cfa = skeleton; ix_cpt = !state_cpt; ix_chunks = chunks };
+	Printf.fprintf f "%0*d" offset_width index_offset;
+	close_out f
+
+      (** opens the given marshalled CFA file and reads its index. Returns also the CFA of the index whose
+      abstract values are not loaded yet *)
+      let open_marshalled infname =
+	let f = open_in_bin infname in
+	let n = String.length marshal_magic in
+	if in_channel_length f < n || really_input_string f n <> marshal_magic then
+	  begin
+	    close_in f;
+	    L.abort (fun p -> p "%s is not a marshalled CFA of this version of BinCAT" infname)
+	  end;
+	let version = try input_binary_int f with End_of_file -> -1 in
+	if version <> marshal_version then
+	  begin
+	    close_in f;
+	    L.abort (fun p -> p "marshalled CFA %s has the unsupported format version %d (expected %d)" infname version marshal_version)
+	  end;
+	begin
+	  try
+	    seek_in f (in_channel_length f - offset_width);
+	    seek_in f (int_of_string (really_input_string f offset_width))
+	  with Invalid_argument _ | Failure _ | End_of_file ->
+	    close_in f;
+	    L.abort (fun p -> p "marshalled CFA %s is corrupted" infname)
+	end;
+	let index: index_t = input_chunk infname f in
+	state_cpt := index.ix_cpt;
+	f, index, of_graph index.ix_cfa
+
+      (** sets the abstract values of the given states from their chunks. The table _loaded_ gives the values of the
+      chunks already read, so that shared chunks are read once *)
+      let load_values infname f index loaded states =
+	List.iter (fun s ->
+	  let o = Hashtbl.find index.ix_chunks s.id in
+	  s.v <-
+	    try Hashtbl.find loaded o
+	    with Not_found ->
+	      seek_in f o;
+	      let v = input_chunk infname f in
+	      Hashtbl.add loaded o v;
+	      v) states
 
       let unmarshal infname =
-	let cfa_marshal_fd = open_in_bin infname in
-	let origcfa = Marshal.from_channel cfa_marshal_fd in
-	let last_id = Marshal.from_channel cfa_marshal_fd in
-	state_cpt := last_id;
-	close_in cfa_marshal_fd;
-        origcfa;
+	let f, index, g = open_marshalled infname in
+	load_values infname f index (Hashtbl.create 1000) (G.fold_vertex (fun s l -> s::l) g.graph []);
+	close_in f;
+        g
+
+      (** [unmarshal_from infname ip forward] loads from _infname_ the CFA and the abstract values of the states
+      reachable from the last state at the address _ip_ (see last_addr), following the edges if _forward_ is true and
+      backwards otherwise. The other states are kept in the CFA but their abstract value is bottom until the returned
+      function is called: it reads them, so that they are only loaded when the results are written.
+      Returns the CFA, the state at _ip_ and this function. Raises Not_found if there is no state at _ip_ *)
+      let unmarshal_from infname ip forward =
+	let f, index, g = open_marshalled infname in
+	let s =
+	  try last_addr g ip
+	  with Not_found -> close_in f; raise Not_found
+	in
+	let reached = Hashtbl.create 1000 in
+	let todo = Queue.create () in
+	Queue.add s todo;
+	Hashtbl.add reached s.id ();
+	while not (Queue.is_empty todo) do
+	  let s' = Queue.take todo in
+	  List.iter (fun s'' ->
+	    if not (Hashtbl.mem reached s''.id) then
+	      begin
+		Hashtbl.add reached s''.id ();
+		Queue.add s'' todo
+	      end) (if forward then G.succ g.graph s' else G.pred g.graph s')
+	done;
+	let reachable, others = G.fold_vertex (fun s' (r, o) -> if Hashtbl.mem reached s'.id then s'::r, o else r, s'::o) g.graph ([], []) in
+	let loaded = Hashtbl.create 1000 in
+	load_values infname f index loaded reachable;
+	let pending = ref true in
+	let load_others () =
+	  if !pending then
+	    begin
+	      pending := false;
+	      load_values infname f index loaded others;
+	      close_in f
+	    end
+	in
+	g, s, load_others
 
     end
   (** module Cfa *)
@@ -22,6 +22,70 @@
 
 module L = Log.Make(struct let name = "decoder" end)
 
+(************************************************************************)
+(* Creation of the general purpose registers *)
+(************************************************************************)
+
+let (register_tbl: (int, Register.t) Hashtbl.t) = Hashtbl.create 8;;
+
+let eax = Register.make ~name:"eax" ~size:32;;
+let ecx = Register.make ~name:"ecx" ~size:32;;
+let edx = Register.make ~name:"edx" ~size:32;;
+let ebx = Register.make ~name:"ebx" ~size:32;;
+let esp = Register.make_sp ~name:"esp" ~size:32;;
+let ebp = Register.make ~name:"ebp" ~size:32;;
+let esi = Register.make ~name:"esi" ~size:32;;
+let edi = Register.make ~name:"edi" ~size:32;;
+let cl = Asm.P(ecx, 0, 7);;
+
+Hashtbl.add register_tbl 0 eax;;
+Hashtbl.add register_tbl 1 ecx;;
+Hashtbl.add register_tbl 2 edx;;
+Hashtbl.add register_tbl 3 ebx;;
+Hashtbl.add register_tbl 4 esp;;
+Hashtbl.add register_tbl 5 ebp;;
+Hashtbl.add register_tbl 6 esi;;
+Hashtbl.add register_tbl 7 edi;;
+
+
+(*************************************************************************)
+(* Creation of the flag registers *)
+(*************************************************************************)
+let fcf    = Register.make ~name:"cf" ~size:1;;
+let fpf    = Register.make ~name:"pf" ~size:1;;
+let faf    = Register.make ~name:"af" ~size:1;;
+let fzf    = Register.make ~name:"zf" ~size:1;;
+let fsf    = Register.make ~name:"sf" ~size:1;;
+let _ftf   = Register.make ~name:"tf" ~size:1;;
+let fif    = Register.make ~name:"if" ~size:1;;
+let fdf    = Register.make ~name:"df" ~size:1;;
+let fof    = Register.make ~name:"of" ~size:1;;
+let _fiopl = Register.make ~name:"iopl" ~size:2;;
+let _fnt   = Register.make ~name:"nt" ~size:1;;
+let _frf   = Register.make ~name:"rf" ~size:1;;
+let _fvm   = Register.make ~name:"vm" ~size:1;;
+let _fac   = Register.make ~name:"ac" ~size:1;;
+let _fvif  = Register.make ~name:"vif" ~size:1;;
+let _fvip  = Register.make ~name:"vip" ~size:1;;
+let _fid   = Register.make ~name:"id" ~size:1;;
+
+
+(***********************************************************************)
+(* Creation of the segment registers *)
+(***********************************************************************)
+let cs = Register.make ~name:"cs" ~size:16;;
+let ds = Register.make ~name:"ds" ~size:16;;
+let ss = Register.make ~name:"ss" ~size:16;;
+let es = Register.make ~name:"es" ~size:16;;
+let fs = Register.make ~name:"fs" ~size:16;;
+let gs = Register.make ~name:"gs" ~size:16;;
+
+(** id of the first register created after the ones above, that is of the first temporary register (see
+Register.fresh_name). The registers are created once for all the analyses run by the process, whatever the
+domain the decoder is instantiated with, so that they can be referred to by the configuration *)
+let first_tmp_id = Register.next_id ()
+
+
 module Make(Domain: Domain.T) =
 struct
 
@@ -56,63 +120,6 @@ struct
             i
 
 
-    (************************************************************************)
-    (* Creation of the general purpose registers *)
-    (************************************************************************)
-
-    let (register_tbl: (int, Register.t) Hashtbl.t) = Hashtbl.create 8;;
-
-    let eax = Register.make ~name:"eax" ~size:32;;
-    let ecx = Register.make ~name:"ecx" ~size:32;;
-    let edx = Register.make ~name:"edx" ~size:32;;
-    let ebx = Register.make ~name:"ebx" ~size:32;;
-    let esp = Register.make_sp ~name:"esp" ~size:32;;
-    let ebp = Register.make ~name:"ebp" ~size:32;;
-    let esi = Register.make ~name:"esi" ~size:32;;
-    let edi = Register.make ~name:"edi" ~size:32;;
-    let cl = P(ecx, 0, 7);;
-
-    Hashtbl.add register_tbl 0 eax;;
-    Hashtbl.add register_tbl 1 ecx;;
-    Hashtbl.add register_tbl 2 edx;;
-    Hashtbl.add register_tbl 3 ebx;;
-    Hashtbl.add register_tbl 4 esp;;
-    Hashtbl.add register_tbl 5 ebp;;
-    Hashtbl.add register_tbl 6 esi;;
-    Hashtbl.add register_tbl 7 edi;;
-
-
-    (*************************************************************************)
-    (* Creation of the flag registers *)
-    (*************************************************************************)
-    let fcf    = Register.make ~name:"cf" ~size:1;;
-    let fpf    = Register.make ~name:"pf" ~size:1;;
-    let faf    = Register.make ~name:"af" ~size:1;;
-    let fzf    = Register.make ~name:"zf" ~size:1;;
-    let fsf    = Register.make ~name:"sf" ~size:1;;
-    let _ftf   = Register.make ~name:"tf" ~size:1;;
-    let fif    = Register.make ~name:"if" ~size:1;;
-    let fdf    = Register.make ~name:"df" ~size:1;;
-    let fof    = Register.make ~name:"of" ~size:1;;
-    let _fiopl = Register.make ~name:"iopl" ~size:2;;
-    let _fnt   = Register.make ~name:"nt" ~size:1;;
-    let _frf   = Register.make ~name:"rf" ~size:1;;
-    let _fvm   = Register.make ~name:"vm" ~size:1;;
-    let _fac   = Register.make ~name:"ac" ~size:1;;
-    let _fvif  = Register.make ~name:"vif" ~size:1;;
-    let _fvip  = Register.make ~name:"vip" ~size:1;;
-    let _fid   = Register.make ~name:"id" ~size:1;;
-
-
-    (***********************************************************************)
-    (* Creation of the segment registers *)
-    (***********************************************************************)
-    let cs = Register.make ~name:"cs" ~size:16;;
-    let ds = Register.make ~name:"ds" ~size:16;;
-    let ss = Register.make ~name:"ss" ~size:16;;
-    let es = Register.make ~name:"es" ~size:16;;
-    let fs = Register.make ~name:"fs" ~size:16;;
-    let gs = Register.make ~name:"gs" ~size:16;;
 
     (***********************************************************************)
     (* Internal state of the decoder *)
@@ -262,6 +269,7 @@ struct
         gdt: desc_tbl;                                     (** current content of the GDT *)
         ldt: desc_tbl;                                     (** current content of the LDT *)
         idt: desc_tbl;                                     (** current content of the IDT *)
+        tables_id: Digest.t;                               (** digest of the content of the GDT, LDT and IDT (see tables_digest) *)
         reg: (Register.t, segment_register_mask) Hashtbl.t (** current value of the segment registers *)
     }
 
@@ -274,7 +282,7 @@ struct
         mutable c         : char list; (** current decoded bytes in reverse order  *)
         mutable addr_sz   : int;   	   (** current address size in bits *)
         mutable operand_sz: int;  	   (** current operand size in bits *)
-        buf 	     	    : string;      (** buffer to decode *)
+        buf 	     	    : Code.cursor; (** buffer to decode *)
         mutable o 	    : int; 	   (** current offset to decode into the buffer *)
         mutable rep_prefix: bool option; (** None = no rep prefix ; Some true = rep prefix ; Some false = repne/repnz prefix *)
       mutable segments  : segment_t;   (** all about segmentation *)
@@ -296,7 +304,7 @@ struct
     (** extract from the string code the current byte to decode 
     The offset field of the decoder state is increased *)
     let getchar s =
-        let c = String.get s.buf s.o in
+        let c = Code.getchar s.buf s.o in
         s.o <- s.o + 1;
         s.c <- c::s.c;
         c
@@ -304,7 +312,7 @@ struct
     (** int conversion of a byte in the string code *)
     let int_of_byte s = Z.of_int (Char.code (getchar s))
 
-    (** [int_of_bytes s sz] is an integer conversion of sz bytes of the string code s.buf *)
+    (** [int_of_bytes s sz] is an integer conversion of sz bytes of the code s.buf *)
     (* TODO check if Z.of_bits could work *)
     let int_of_bytes s sz =
         let n = ref Z.zero in
@@ -363,7 +371,13 @@ struct
             registers
         with _ -> error a "Decoder: overflow in a segment register"
 
-    let copy_segments s a ctx = { gdt = Hashtbl.copy s.gdt; ldt = Hashtbl.copy s.ldt; idt = Hashtbl.copy s.idt; data = ds; reg = get_segments a ctx  }
+    let copy_segments s a ctx = { gdt = Hashtbl.copy s.gdt; ldt = Hashtbl.copy s.ldt; idt = Hashtbl.copy s.idt; tables_id = s.tables_id; data = ds; reg = get_segments a ctx  }
+
+    (** digest of the content of the given descriptor tables. It is computed once when the tables are built: the
+    decoder only copies them afterwards *)
+    let tables_digest gdt ldt idt =
+      let content t = List.sort compare (Hashtbl.fold (fun o e l -> (o, e)::l) t []) in
+      Digest.string (Marshal.to_string (content gdt, content ldt, content idt) [])
 
     let get_base_address s c =
         if !Config.mode = Config.Protected then
@@ -2075,6 +2089,32 @@ struct
       let mem  = add_segment s (Lval edi') es in
       Directive (Unroll_until (mem, cmp, Lval (V (to_reg eax i)), 10000, i))
       
+    (** directive applying in one step the iterations of a rep prefixed MOVS, STOS or SCAS when ecx is concrete (see Asm.Rep).
+    It leaves ecx, edi and esi as the iterations would have so that the loop built by rep only does the remaining iterations *)
+    let bulk_rep s (opcode: char): stmt list =
+      let ecx' = V (to_reg ecx s.addr_sz) in
+      let edi' = V (to_reg edi s.addr_sz) in
+      let esi' = V (to_reg esi s.addr_sz) in
+      let wrt_df op ptrs i backward =
+        let rep forward = Directive (Rep (op, ecx', List.map (fun r -> V (T r)) ptrs, i, forward)) in
+        [ If (Cmp (EQ, Lval (V (T fdf)), Const (Word.zero fdf_sz)), [rep true], if backward then [rep false] else []) ]
+      in
+      let movs i = wrt_df (Rep_movs (add_segment s (Lval edi') ds, add_segment s (Lval esi') es)) [edi ; esi] i true in
+      let stos i = wrt_df (Rep_stos (add_segment s (Lval edi') ds, Lval (V (to_reg eax i)))) [edi] i true in
+      (* only the first iterations going upward are skipped *)
+      let scas i =
+        let cmp = if s.repne then EQ else NEQ in
+        wrt_df (Rep_scas (add_segment s (Lval edi') es, cmp, Lval (V (to_reg eax i)))) [edi] i false
+      in
+      match opcode with
+      | '\xa4' -> movs 8
+      | '\xa5' -> movs s.addr_sz
+      | '\xaa' -> stos 8
+      | '\xab' -> stos s.addr_sz
+      | '\xae' -> scas 8
+      | '\xaf' -> scas s.addr_sz
+      | _ -> []
+
     (** decoding of one instruction *)
     let decode s =
         let add_sub_mrm s op use_carry sz direction =
@@ -2327,6 +2367,24 @@ struct
               | Return -> L.decoder (fun p -> p "simplified rep ret into ret")
               | _ ->
                  let a'  = Data.Address.add_offset s.a (Z.of_int s.o) in
+                 (* opcode following the rep prefix and the other prefixes that the decoder accepts after it
+                 (operand size, address size, segment override and rep) *)
+                 let rec opcode_of bytes =
+                   match bytes with
+                   | ('\x66' | '\x67' | '\x26' | '\x2e' | '\x36' | '\x3e' | '\x64' | '\x65' | '\xf2' | '\xf3')::bytes' -> opcode_of bytes'
+                   | c::_ -> c
+                   | [] -> '\x00'
+                 in
+                 let rec after_rep bytes =
+                   match bytes with
+                   | ('\xf2' | '\xf3')::bytes' -> opcode_of bytes'
+                   | _::bytes' -> after_rep bytes'
+                   | [] -> '\x00'
+                 in
+                 let opcode = after_rep v.Cfa.State.bytes in
+                 (* REP is REPE only for CMPS and SCAS *)
+                 if s.repe && not ('\xa6' <= opcode && opcode <= '\xa7' || '\xae' <= opcode && opcode <= '\xaf') then
+                   s.repe <- false;
                  let zf_stmts =
                            if s.repe || s.repne then
                              [ If (Cmp (EQ, Lval (V (T fzf)), Const (c fzf_sz)), [Directive Default_unroll ; Jmp (A a')],
@@ -2343,19 +2401,20 @@ struct
                      [Directive Default_unroll ; Jmp (A a')])
                    ]
                  in
+                 let bulk = bulk_rep s opcode in
                  if not (s.repe || s.repne) then
-                   v.Cfa.State.stmts <- [ Directive (Type (V (T ecx), Types.T (TypedC.Int (Newspeak.Unsigned, Register.size ecx))));
+                   v.Cfa.State.stmts <- bulk @ [ Directive (Type (V (T ecx), Types.T (TypedC.Int (Newspeak.Unsigned, Register.size ecx))));
                               Directive (Unroll (Lval (V (T ecx)), 10000)) ] @ blk
                  else
                    begin
                      let cmp = if s.repne then EQ else NEQ in
                      let stmts =
-                       match (List.hd (List.tl v.Cfa.State.bytes)) with
+                       match opcode with
                        | '\xae' -> (unroll_scas cmp s 8)::blk
                        | '\xaf' -> (unroll_scas cmp s s.addr_sz)::blk
                     | _ -> blk
                      in
-                     v.Cfa.State.stmts <- stmts
+                     v.Cfa.State.stmts <- bulk @ stmts
                    end;
                 end;
                 v, ip
@@ -2557,14 +2616,43 @@ struct
       Hashtbl.iter (fun o v -> Hashtbl.replace gdt (Word.of_int o 64) (tbl_entry_of_int v)) Config.gdt;
         let reg = Hashtbl.create 6 in
         List.iter (fun (r, v) -> Hashtbl.add reg r (get_segment_register_mask v)) [cs, !Config.cs; ds, !Config.ds; ss, !Config.ss; es, !Config.es; fs, !Config.fs; gs, !Config.gs];
-        { gdt = gdt; ldt = ldt; idt = idt; data = ds; reg = reg;}
+        { gdt = gdt; ldt = ldt; idt = idt; tables_id = tables_digest gdt ldt idt; data = ds; reg = reg;}
 	  
-    (** launch the decoder *)
-    let parse text g is v a ctx =
+    (** key of the cache of decoded instructions: address of the instruction, operand size, address size,
+    values of the segment registers (cs, ds, ss, es, fs, gs) and digest of the descriptor tables (gdt, ldt, idt)
+    of the incoming segmentation state. The other fields of this state are not read by the decoder: the data
+    segment register is reset to ds and the segment register masks are recomputed from the context (see copy_segments) *)
+    type cache_key = Address.t * int * int * Z.t list * Digest.t
+
+    (** decoding result stored in the cache *)
+    type cache_entry = {
+        c_stmts   : Asm.stmt list;     (** statements of the instruction *)
+        c_size    : int;               (** number of statements of the instruction before the removal of dead flag updates *)
+        c_bytes   : char list;         (** bytes of the instruction *)
+        c_ctx     : Cfa.State.ctx_t;   (** decoding context at the end of the instruction *)
+        c_ip      : Address.t;         (** address of the next instruction *)
+        c_segments: segment_t;         (** segmentation state at the end of the instruction *)
+      }
+
+    (** cache of decoded instructions *)
+    let cache: (cache_key, cache_entry) Hashtbl.t = Hashtbl.create 1000
+
+    (** number of instructions found in the cache *)
+    let cache_hits = ref 0
+
+    (** number of instructions actually decoded *)
+    let cache_misses = ref 0
+
+    (** dump the hit/miss counters of the cache of decoded instructions into the log *)
+    let log_cache_stats () =
+      L.analysis (fun p -> p "decoded instruction cache: %d hit(s), %d miss(es), %d entries" !cache_hits !cache_misses (Hashtbl.length cache))
+
+    (** decodes the instruction at offset _o_ of _text_, _a_ being the address of the start of _text_ *)
+    let decode_at text g is v a o ctx =
         let s' = {
             g 	       = g;
             a 	       = a;
-            o 	       = 0;
+            o 	       = o;
             c          = [];
             addr_sz    = !Config.address_sz;
             operand_sz = !Config.operand_sz;
@@ -2577,12 +2665,255 @@ struct
             repne      = false
         }
         in
+        let v', ip = decode s' in
+        v', ip, s'.segments
+
+    (** decodes the instruction at address _a_ without looking into the cache *)
+    let parse_no_cache text g is v a ctx =
         try
-            let v', ip = decode s' in
-            Some (v', ip, s'.segments)
+            Some (decode_at text g is v a 0 ctx)
         with
         | Exceptions.Error _ as e -> raise e
         | _ 			  -> (*end of buffer *) None
+
+    (************************************************************************************)
+    (* removal of the dead updates of flags (flag_liveness option)                      *)
+    (************************************************************************************)
+
+    (** flags whose dead updates are removed *)
+    let liveness_flags = [ fcf ; fpf ; faf ; fzf ; fsf ; fof ]
+
+    (** maximal number of instructions decoded after an instruction to find whether its flags are read *)
+    let liveness_lookahead = 8
+
+    let mem_reg r l = List.exists (Register.equal r) l
+
+    let is_flag r = mem_reg r liveness_flags
+
+    (** adds to _acc_ the registers read by an expression, a left value or a condition *)
+    let rec exp_regs e acc =
+      match e with
+      | Const _ -> acc
+      | Lval lv -> lval_regs lv acc
+      | BinOp (_, e1, e2) -> exp_regs e1 (exp_regs e2 acc)
+      | UnOp (_, e') -> exp_regs e' acc
+      | TernOp (c, e1, e2) -> bexp_regs c (exp_regs e1 (exp_regs e2 acc))
+
+    and lval_regs lv acc =
+      match lv with
+      | V (T r) | V (P (r, _, _)) -> r::acc
+      | M (e, _) -> exp_regs e acc
+
+    and bexp_regs c acc =
+      match c with
+      | BUnOp (_, c') -> bexp_regs c' acc
+      | Cmp (_, e1, e2) -> exp_regs e1 (exp_regs e2 acc)
+      | BBinOp (_, c1, c2) -> bexp_regs c1 (bexp_regs c2 acc)
+      | BConst _ -> acc
+
+    (** adds to _acc_ the registers read by a statement. The destination register of a Set and the register of
+    a Forget directive are written, not read *)
+    let rec stmt_regs stmt acc =
+      match stmt with
+      | Set (V (T _), e) -> exp_regs e acc
+      | Set (lv, e) -> lval_regs lv (exp_regs e acc)
+      | If (c, stmts1, stmts2) -> bexp_regs c (List.fold_right stmt_regs stmts1 (List.fold_right stmt_regs stmts2 acc))
+      | Jmp (R e) | Call (R e) -> exp_regs e acc
+      | Jmp (A _) | Call (A _) | Return | Nop -> acc
+      | Assert (c, _) -> bexp_regs c acc
+      | Directive d ->
+	 match d with
+	 | Forget _ | Default_unroll -> acc
+	 | Remove r -> r::acc
+	 | Taint (e, lv) -> lval_regs lv (match e with Some e' -> exp_regs e' acc | None -> acc)
+	 | Type (lv, _) -> lval_regs lv acc
+	 | Unroll (e, _) -> exp_regs e acc
+	 | Unroll_until (e, _, t, _, _) -> exp_regs e (exp_regs t acc)
+	 | Stub (_, args) -> List.fold_right exp_regs args acc
+	 | Rep (op, count, ptrs, _, _) ->
+	    let acc' = List.fold_right lval_regs (count::ptrs) acc in
+	    match op with
+	    | Rep_movs (e1, e2) | Rep_stos (e1, e2) | Rep_scas (e1, _, e2) -> exp_regs e1 (exp_regs e2 acc')
+
+    (** returns the flag that a top level statement writes without reading it *)
+    let killed_flag stmt =
+      match stmt with
+      | Set (V (T r), _) | Directive (Forget r) when is_flag r -> Some r
+      | _ -> None
+
+    let rec has_jmp stmt =
+      match stmt with
+      | Jmp _ | Call _ | Return -> true
+      | If (_, stmts1, stmts2) -> List.exists has_jmp stmts1 || List.exists has_jmp stmts2
+      | _ -> false
+
+    (** returns the flags among _flags_ that _stmts_ set before reading them and the flags that are neither read nor set.
+    As the flags may be read at the target of a jump, the walk stops at the first statement that may jump and None is
+    returned for the unresolved flags *)
+    let resolve flags stmts =
+      let rec walk unresolved dead stmts =
+	match stmts with
+	| [] -> dead, Some unresolved
+	| stmt::stmts' ->
+	   let read = stmt_regs stmt [] in
+	   let unresolved = List.filter (fun f -> not (mem_reg f read)) unresolved in
+	   if has_jmp stmt then dead, None
+	   else
+	     match killed_flag stmt with
+	     | Some f when mem_reg f unresolved -> walk (List.filter (fun f' -> not (Register.equal f f')) unresolved) (f::dead) stmts'
+	     | _ -> walk unresolved dead stmts'
+      in
+      walk flags [] stmts
+
+    (** returns the flags among _flags_ that are set before being read by the instructions following the one at
+    offset _o_ of _text_. These instructions are decoded without being cached nor logged *)
+    let dead_flags text g is v a o ctx flags =
+      let first_id = Register.next_id () in
+      let rec next is o n unresolved dead =
+	if unresolved = [] || n = 0 then dead
+	else
+	  (* overrides may read the flags *)
+	  if Hashtbl.mem Config.reg_override (Address.to_int (Address.add_offset a (Z.of_int o))) then dead
+	  else
+	    let r =
+	      try Some (Log.mute (fun () -> decode_at text g is { v with Cfa.State.stmts = [] } a o ctx))
+	      with _ -> None
+	    in
+	    match r with
+	    | None -> dead
+	    | Some (v', _, is') ->
+	       match resolve unresolved v'.Cfa.State.stmts with
+	       | dead', None -> dead' @ dead
+	       | dead', Some unresolved' -> next is' (o + List.length v'.Cfa.State.bytes) (n-1) unresolved' (dead' @ dead)
+      in
+      let dead = next is o liveness_lookahead flags [] in
+      (* the temporary registers of the decoded instructions are not used *)
+      Register.remove_from first_id;
+      dead
+
+    (** removes from _stmts_ the top level updates of flags that are not read before the end of _stmts_,
+    _live_ being the flags that may be read after them *)
+    let remove_dead_updates stmts live =
+      let stmts', _ =
+	List.fold_right (fun stmt (stmts, live) ->
+	  match killed_flag stmt with
+	  | Some f when not (mem_reg f live) -> stmts, live
+	  | k ->
+	     let live = match k with Some f -> List.filter (fun f' -> not (Register.equal f f')) live | None -> live in
+	     stmt::stmts, (List.filter is_flag (stmt_regs stmt [])) @ live) stmts ([], live)
+      in
+      stmts'
+
+    (** removes the updates of flags of the decoded instruction _v_ that the next instructions set again before
+    reading them. Instructions that may jump are left unchanged *)
+    let remove_dead_flags text g v a ctx segments =
+      let stmts = v.Cfa.State.stmts in
+      if not (List.exists has_jmp stmts) then
+	let set = List.fold_left (fun l stmt -> match killed_flag stmt with Some f when not (mem_reg f l) -> f::l | _ -> l) [] stmts in
+	if set <> [] then
+	  let dead = dead_flags text g segments v a (List.length v.Cfa.State.bytes) ctx set in
+	  if dead <> [] then
+	    let live = List.filter (fun f -> not (mem_reg f dead)) liveness_flags in
+	    v.Cfa.State.stmts <- remove_dead_updates stmts live
+
+    let rec stmts_size stmts =
+      List.fold_left (fun n stmt ->
+	match stmt with
+	| If (_, stmts1, stmts2) -> n + 1 + (stmts_size stmts1) + (stmts_size stmts2)
+	| _ -> n + 1) 0 stmts
+
+    (** number of decoded instructions and of their statements before and after the removal of dead flag updates *)
+    let liveness_instructions = ref 0
+    let liveness_before = ref 0
+    let liveness_after = ref 0
+
+    (** dump the average number of statements per instruction before and after the removal of dead flag updates *)
+    let log_liveness_stats () =
+      if !liveness_instructions > 0 then
+	let n = float !liveness_instructions in
+	L.analysis (fun p -> p "flag liveness: %.2f statement(s) per instruction before the removal of dead flag updates, %.2f after"
+	  (float !liveness_before /. n) (float !liveness_after /. n))
+
+    (** digest of the inputs of the decoding that are not in the key of the cache: the code, the import table,
+    the typing and tainting rules of the imported functions, the addresses of the register overrides and the
+    decoding options *)
+    let decoding_inputs () =
+      let sorted t = List.sort (fun (k1, _) (k2, _) -> compare k1 k2) (Hashtbl.fold (fun k v l -> (k, v)::l) t []) in
+      Digest.string (Marshal.to_string
+	(Digest.string !Config.text, !Config.rva_code, !Config.mode, !Config.call_conv, !Config.stack_width, !Config.flag_liveness,
+	 sorted Config.import_tbl, sorted Config.tainting_rules, sorted Config.typing_rules,
+	 List.map fst (sorted Config.reg_override)) [])
+
+    (* decoding inputs of the instructions of the cache *)
+    let cached_inputs = ref ""
+
+    (** prepares the decoder for a new analysis by the same module (see Main.serve). The counters are reset and the
+    cache of decoded instructions is emptied unless the inputs of the decoding are the ones of the previous analysis *)
+    let reset () =
+      let inputs = decoding_inputs () in
+      if inputs <> !cached_inputs then
+	begin
+	  Hashtbl.reset cache;
+	  cached_inputs := inputs
+	end;
+      cache_hits := 0;
+      cache_misses := 0;
+      liveness_instructions := 0;
+      liveness_before := 0;
+      liveness_after := 0
+
+    (** launch the decoder.
+    Already decoded instructions with the same decoding context are taken from the cache *)
+    let parse text g is v a ctx =
+      let key =
+        try Some (a, !Config.operand_sz, !Config.address_sz, List.map (fun r -> ctx#value_of_register r) [ cs; ds; ss; es; fs; gs ], is.tables_id)
+        with _ -> None
+      in
+      let count size stmts =
+	if !Config.flag_liveness then
+	  begin
+	    incr liveness_instructions;
+	    liveness_before := !liveness_before + size;
+	    liveness_after := !liveness_after + (stmts_size stmts)
+	  end
+      in
+      try
+        match key with
+        | None   -> raise Not_found
+        | Some k ->
+           let e = Hashtbl.find cache k in
+           incr cache_hits;
+           v.Cfa.State.ctx <- e.c_ctx;
+           v.Cfa.State.stmts <- e.c_stmts;
+           v.Cfa.State.bytes <- e.c_bytes;
+	   count e.c_size e.c_stmts;
+           Some (v, e.c_ip, e.c_segments)
+      with Not_found ->
+        incr cache_misses;
+        let r = parse_no_cache text g is v a ctx in
+        begin
+          match r with
+          | Some (v', ip, segments) ->
+	     let size = stmts_size v'.Cfa.State.stmts in
+	     if !Config.flag_liveness then
+	       remove_dead_flags text g v' a ctx segments;
+	     count size v'.Cfa.State.stmts;
+	     begin
+	       match key with
+	       | Some k ->
+		  Hashtbl.replace cache k {
+                      c_stmts    = v'.Cfa.State.stmts;
+		      c_size     = size;
+                      c_bytes    = v'.Cfa.State.bytes;
+                      c_ctx      = v'.Cfa.State.ctx;
+                      c_ip       = ip;
+                      c_segments = segments;
+		    }
+	       | None -> ()
+	     end
+          | None -> ()
+        end;
+        r
 end
 (* end Decoder *)
 
@@ -76,6 +76,9 @@ module type T =
       (** widens the two abstract values *)
       val widen: t -> t -> t
 
+      (** logs statistics on the join, meet, widen and is_subset operations *)
+      val log_stats: unit -> unit
+
       (** [set_memory_from_config a c nb m] update the abstract value in _m_ with the value configuration _c_ (pair content * tainting value ) for the memory location _a_ 
       The integer _nb_ is the number of consecutive configurations _c_ to set *)
       val set_memory_from_config: Data.Address.t -> Data.Address.region -> Config.cvalue * (Config.tvalue option) -> int -> t -> t
@@ -121,6 +124,21 @@ module type T =
       (** [copy d dst arg sz] copy the first sz bits of arg into dst. May raise an exception if dst is undefined in d *)
       val copy: t -> Asm.exp -> Asm.exp -> int -> t
 
+      (** [copy_elements d dst src nb sz forward] copies in one update the nb elements of sz bits from address src to address dst,
+	  stored upward if forward is true and downward otherwise, as a rep movs would. Returns also whether a copied value is tainted.
+	  Raises an exception if dst or src is not a single address or if the source and the destination overlap *)
+      val copy_elements: t -> Asm.exp -> Asm.exp -> int -> int -> bool -> t * bool
+
+      (** [fill_elements d dst v nb sz forward] stores in one update nb times the value v of sz bits from address dst,
+	  upward if forward is true and downward otherwise, as a rep stos would. Returns also whether v is tainted.
+	  Raises an exception if dst is not a single address *)
+      val fill_elements: t -> Asm.exp -> Asm.exp -> int -> int -> bool -> t * bool
+
+      (** [skip_elements d e cmp v nb sz] returns the number n < nb of elements of sz bits from address e that a rep scas
+	  may skip, ie such that (element cmp v) is surely false, and whether one of the compared values is tainted.
+	  Raises an exception if e is not a single address *)
+      val skip_elements: t -> Asm.exp -> Asm.cmp -> Asm.exp -> int -> int -> t * int * bool
+
       (** [print d arg sz] prints the first sz bits of arg. May raise an exception if dst is undefined in d *)
       val print: t -> Asm.exp -> int -> t
 	
@@ -55,6 +55,21 @@ module Key =
 module Map = MapOpt.Make(Key)
 include Map
 
+(** compares _key_ with the range of addresses from _low_ to _high_ (included), for use in find_key and remove_range:
+0 if the key overlaps the range, -1 if the range is below the key and 1 if it is above the key.
+Registers are after any address in the order of Key *)
+let range_cmp low high key =
+  match key with
+  | Key.Reg _ -> -1
+  | Key.Mem a ->
+     if Data.Address.compare a low < 0 then 1
+     else if Data.Address.compare a high > 0 then -1
+     else 0
+  | Key.Mem_Itv (a_low, a_high) ->
+     if Data.Address.compare a_high low < 0 then 1
+     else if Data.Address.compare a_low high > 0 then -1
+     else 0
+
 
 (* apply f v1 v2 for every pair (k, v1), (k, v2) in m1 and m2. If k is not a key of m2 then (k, v1) is added to the result *)
 let join f m1 m2 =
@@ -0,0 +1,257 @@
+(*
+    This file is part of BinCAT.
+    Copyright 2014-2017 - Airbus Group
+
+    BinCAT is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or (at your
+    option) any later version.
+
+    BinCAT is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with BinCAT.  If not, see <http://www.gnu.org/licenses/>.
+*)
+
+(** packed vector lifting of a value_domain.
+Vectors whose bits are all known (value and taint) are stored as machine words (Z.t) and
+the usual operations on them are computed at the word level.
+Other vectors use the per bit representation of Vector.Make. Taint does not take part in comparisons *)
+
+module Make(V: Vector.Val) =
+    (struct
+        (** per bit representation *)
+        module B = Vector.Make(V)
+
+        type t =
+	  | Packed of Z.t * Z.t * int (** (value, taint, size): bit i of the taint is set iff bit i of the value is tainted *)
+	  | Bits of B.t               (** at least one bit is not fully known *)
+
+	(** mask of the n least significant bits *)
+	let mask n = Z.pred (Z.shift_left Z.one n)
+
+	(** two's complement interpretation of the n-bit value z *)
+	let signed z n =
+	  if n > 0 && Z.testbit z (n-1) then Z.sub z (Z.shift_left Z.one n)
+	  else z
+
+	let to_bits v =
+	  match v with
+	  | Bits b -> b
+	  | Packed (z, t, n) ->
+	     let b = B.of_word (Data.Word.of_int z n) in
+	     if Z.sign t = 0 then b
+	     else B.taint_of_config (Config.Taint t) n (Some b)
+
+	let of_bits b =
+	  try Packed (B.to_z b, B.taint_to_z b, B.size b)
+	  with Exceptions.Concretization -> Bits b
+
+	(* per bit computation of f. The result is packed again if possible *)
+	let lift1 f v = of_bits (f (to_bits v))
+
+	let lift2 f v1 v2 = of_bits (f (to_bits v1) (to_bits v2))
+
+	let same v1 v2 =
+	  match v1, v2 with
+	  | Packed (z1, t1, n1), Packed (z2, t2, n2) -> n1 = n2 && Z.equal z1 z2 && Z.equal t1 t2
+	  | _ -> false
+
+        let top sz = Bits (B.top sz)
+
+	let size v =
+	  match v with
+	  | Packed (_, _, n) -> n
+	  | Bits b -> B.size b
+
+	let forget v = lift1 B.forget v
+
+	let is_tainted v =
+	  match v with
+	  | Packed (_, t, _) -> Z.sign t <> 0
+	  | Bits b -> B.is_tainted b
+
+	let to_z v =
+	  match v with
+	  | Packed (z, _, _) -> z
+	  | Bits b -> B.to_z b
+
+	let taint_to_z v =
+	  match v with
+	  | Packed (_, t, _) -> t
+	  | Bits b -> B.taint_to_z b
+
+	let to_char v =
+	  match v with
+	  | Packed (z, _, 8) -> Char.chr (Z.to_int z)
+	  | _ -> B.to_char (to_bits v)
+
+	let join v1 v2 =
+	  if v1 == v2 || same v1 v2 then v1
+	  else lift2 B.join v1 v2
+
+	let meet v1 v2 =
+	  if v1 == v2 || same v1 v2 then v1
+	  else lift2 B.meet v1 v2
+
+        let widen v1 v2 =
+            if Z.compare (to_z v1) (to_z v2) <> 0 then
+                raise Exceptions.Enum_failure
+            else v1
+
+	let to_string v = B.to_string (to_bits v)
+
+	let to_strings v = B.to_strings (to_bits v)
+
+	let shift_amount v =
+	  try Z.to_int (to_z v)
+	  with _ -> raise Exceptions.Enum_failure
+
+	(** word level computation of the binary operations.
+	Returns None when the per bit computation is needed, that is when an operand is not packed
+	or when the operation mixes tainted bits (except for shifts that only move the bits) *)
+	let binary_packed op v1 v2 =
+	  match op, v1, v2 with
+	  | Asm.Shl, Packed (z, t, n), _ ->
+	     let i = shift_amount v2 in
+	     if i >= n then Some (Packed (Z.zero, Z.zero, n))
+	     else Some (Packed (Z.logand (Z.shift_left z i) (mask n), Z.logand (Z.shift_left t i) (mask n), n))
+
+	  | Asm.Shr, Packed (z, t, n), _ ->
+	     let i = shift_amount v2 in
+	     Some (Packed (Z.shift_right z i, Z.shift_right t i, n))
+
+	  | _, Packed (z1, t1, n1), Packed (z2, t2, n2) when Z.sign t1 = 0 && Z.sign t2 = 0 ->
+	     let word z n = Some (Packed (Z.logand z (mask n), Z.zero, n)) in
+	     begin
+	       match op with
+	       | Asm.Add when n1 = n2  -> word (Z.add z1 z2) n1
+	       | Asm.Sub when n1 = n2  -> word (Z.sub z1 z2) n1
+	       | Asm.Xor when n1 = n2  -> word (Z.logxor z1 z2) n1
+	       | Asm.And when n1 = n2  -> word (Z.logand z1 z2) n1
+	       | Asm.Or when n1 = n2   -> word (Z.logor z1 z2) n1
+	       | Asm.Mul when n1 = n2  -> word (Z.mul z1 z2) (2*n1)
+	       | Asm.IMul when n1 = n2 -> word (Z.mul (signed z1 n1) (signed z2 n2)) (2*n1)
+	       (* division by zero is reported by the per bit computation *)
+	       | Asm.Div when n1 >= n2 && Z.sign z2 <> 0  -> word (Z.div z1 z2) n1
+	       | Asm.Mod when n1 >= n2 && Z.sign z2 <> 0  -> word (Z.rem z1 z2) n2
+	       | Asm.IDiv when n1 >= n2 && Z.sign z2 <> 0 -> word (Z.div (signed z1 n1) (signed z2 n2)) n1
+	       | Asm.IMod when n1 >= n2 && Z.sign z2 <> 0 -> word (Z.rem (signed z1 n1) (signed z2 n2)) n2
+	       | _ -> None
+	     end
+
+	  | _ -> None
+
+	let binary op v1 v2 =
+	  match binary_packed op v1 v2 with
+	  | Some v -> v
+	  | None   -> lift2 (B.binary op) v1 v2
+
+	let unary op v =
+	  match op, v with
+	  | Asm.Not, Packed (z, t, n) when Z.sign t = 0 -> Packed (Z.logxor z (mask n), t, n)
+	  | Asm.SignExt i, Packed (z, t, n) when n > 0 ->
+	     if n >= i then v
+	     else
+	       if Z.testbit z (n-1) then Packed (Z.logor z (Z.sub (mask i) (mask n)), t, i)
+	       else Packed (z, t, i)
+	  | Asm.ZeroExt i, Packed (z, t, n) when i >= n -> Packed (z, t, i)
+	  | _ -> lift1 (B.unary op) v
+
+	let untaint v =
+	  match v with
+	  | Packed (z, _, n) -> Packed (z, Z.zero, n)
+	  | Bits b -> of_bits (B.untaint b)
+
+	let taint v =
+	  match v with
+	  | Packed (z, _, n) -> Packed (z, mask n, n)
+	  | Bits b -> of_bits (B.taint b)
+
+	let span_taint v t =
+	  match t, v with
+	  | Tainting.U, Packed _ -> untaint v
+	  | Tainting.T, Packed _ -> taint v
+	  | _ -> lift1 (fun b -> B.span_taint b t) v
+
+	let get_minimal_taint v =
+	  match v with
+	  | Packed (_, t, _) -> if Z.sign t = 0 then Tainting.U else Tainting.T
+	  | Bits b -> B.get_minimal_taint b
+
+	let of_word w =
+	  let n = Data.Word.size w in
+	  Packed (Z.logand (Data.Word.to_int w) (mask n), Z.zero, n)
+
+	let compare v1 op v2 =
+	  match v1, v2 with
+	  | Packed (z1, _, n1), Packed (z2, _, n2) when n1 = n2 ->
+	     let c = Z.compare z1 z2 in
+	     begin
+	       match op with
+	       | Asm.EQ  -> c = 0
+	       | Asm.NEQ -> c <> 0
+	       | Asm.LT  -> c < 0
+	       | Asm.LEQ -> c <= 0
+	       | Asm.GT  -> c > 0
+	       | Asm.GEQ -> c >= 0
+	     end
+	  | _ -> B.compare (to_bits v1) op (to_bits v2)
+
+	let to_addresses r v =
+	  match v with
+	  | Packed (z, _, n) -> Data.Address.Set.singleton (r, Data.Word.of_int z n)
+	  | Bits b -> B.to_addresses r b
+
+	let is_subset v1 v2 =
+	  match v1, v2 with
+	  | Packed (z1, t1, n1), Packed (z2, t2, n2) when n1 = n2 && Z.equal t1 t2 -> Z.equal z1 z2
+	  | _ -> B.is_subset (to_bits v1) (to_bits v2)
+
+	let of_config c n = of_bits (B.of_config c n)
+
+	let taint_of_config t n prev =
+	  let prev' =
+	    match prev with
+	    | Some v -> Some (to_bits v)
+	    | None   -> None
+	  in
+	  of_bits (B.taint_of_config t n prev')
+
+	let combine v1 v2 low up =
+	  match v1, v2 with
+	  | Packed (z1, t1, n1), Packed (z2, t2, n2) when 0 <= low && low <= up && up < n1 && n2 = up-low+1 ->
+	     let m = Z.lognot (Z.shift_left (mask n2) low) in
+	     let set w1 w2 = Z.logor (Z.logand w1 m) (Z.shift_left w2 low) in
+	     Packed (set z1 z2, set t1 t2, n1)
+	  | _ -> lift2 (fun b1 b2 -> B.combine b1 b2 low up) v1 v2
+
+	let extract v low up =
+	  match v with
+	  | Packed (z, t, n) when 0 <= low && low <= up && up < n ->
+	     let get w = Z.logand (Z.shift_right w low) (mask (up-low+1)) in
+	     Packed (get z, get t, up-low+1)
+	  | _ -> lift1 (fun b -> B.extract b low up) v
+
+	let from_position v l len =
+	  match v with
+	  | Packed (_, _, n) when len > 0 && l < n && l-len+1 >= 0 -> extract v (l-len+1) l
+	  | _ -> lift1 (fun b -> B.from_position b l len) v
+
+	let of_repeat_val v v_len nb =
+	  match v with
+	  | Packed (z, t, n) when n = v_len && n > 0 ->
+	     (* w repeated nb times is w * (2^(n*nb) - 1) / (2^n - 1) *)
+	     let repeat w = Z.div (Z.mul w (mask (n*nb))) (mask n) in
+	     Packed (repeat z, repeat t, n*nb)
+	  | _ -> lift1 (fun b -> B.of_repeat_val b v_len nb) v
+
+	let concat v1 v2 =
+	  match v1, v2 with
+	  | Packed (z1, t1, n1), Packed (z2, t2, n2) ->
+	     Packed (Z.logor (Z.shift_left z1 n2) z2, Z.logor (Z.shift_left t1 n2) t2, n1+n2)
+	  | _ -> lift2 B.concat v1 v2
+    end: Vector.T)
@@ -111,12 +111,46 @@ module Make(D: Unrel.T) =
   let copy (uenv, tenv) dst src sz: t =
     U.copy uenv dst src sz, char_type uenv tenv dst
 
+  (* the types of the elements written by a rep prefixed instruction are removed *)
+  let remove_element_types uenv tenv dst nb sz forward =
+    match Data.Address.Set.elements (fst (U.mem_to_addresses uenv dst)) with
+    | [a] -> let low, high = U.element_range a nb sz forward in T.remove_range low high tenv
+    | _ -> T.top
+
+  let copy_elements (uenv, tenv) dst src nb sz forward =
+    let uenv', b = U.copy_elements uenv dst src nb sz forward in
+    (uenv', remove_element_types uenv tenv dst nb sz forward), b
+
+  let fill_elements (uenv, tenv) dst v nb sz forward =
+    let uenv', b = U.fill_elements uenv dst v nb sz forward in
+    (uenv', remove_element_types uenv tenv dst nb sz forward), b
+
+  let skip_elements (uenv, tenv) e cmp v nb sz =
+    let n, b = U.skip_elements uenv e cmp v nb sz in
+    (* as the type directive of SCAS, every compared element is typed as an unsigned integer *)
+    let tenv' =
+      if n = 0 then tenv
+      else
+	match Data.Address.Set.elements (fst (U.mem_to_addresses uenv e)) with
+	| [a] ->
+	   let typ = Types.T (TypedC.Int (Newspeak.Unsigned, sz)) in
+	   let rec set_types tenv i =
+	     if i = n then tenv
+	     else set_types (T.set_address (Data.Address.add_offset a (Z.of_int (i*(sz/8)))) typ tenv) (i+1)
+	   in
+	   set_types tenv 0
+	| _ -> tenv
+    in
+    (uenv, tenv'), n, b
+
   let join (uenv1, tenv1) (uenv2, tenv2) = U.join uenv1 uenv2, T.join tenv1 tenv2
 
   let meet (uenv1, tenv1) (uenv2, tenv2) = U.meet uenv1 uenv2, T.meet tenv1 tenv2
 
   let widen (uenv1, tenv1) (uenv2, tenv2) = U.widen uenv1 uenv2, T.widen tenv1 tenv2
 
+  let log_stats () = U.log_stats ()
+
   let set_memory_from_config a r c n (uenv, tenv) =
     U.set_memory_from_config a r c n uenv, tenv
 
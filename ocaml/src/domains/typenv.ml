@@ -75,6 +75,12 @@ let remove_addresses addrs env =
   | Val env' ->
      Val (List.fold_left (fun env a -> try Env.remove (Env.Key.Mem a) env with Not_found -> env) env' (Data.Address.Set.elements addrs))
        
+(** removes the types of the addresses from low to high (included) *)
+let remove_range low high env =
+  match env with
+  | BOT -> BOT
+  | Val env' -> Val (fst (Env.remove_range (Env.range_cmp low high) env'))
+
 let to_string env =
   match env with
   | BOT -> ["_"]
@@ -23,6 +23,23 @@
 
 module L = Log.Make(struct let name = "unrel" end)
 
+(** binaries mapped into memory, with the size and the modification time of their file.
+A process running several analyses (see Main.serve) maps a binary again only if it has changed *)
+let mapped_binaries: (string, int * float * (int, Bigarray.int8_unsigned_elt, Bigarray.c_layout) Bigarray.Genarray.t) Hashtbl.t = Hashtbl.create 3
+
+let map_binary fname =
+  let st = Unix.stat fname in
+  try
+    let size, mtime, map = Hashtbl.find mapped_binaries fname in
+    if size = st.Unix.st_size && mtime = st.Unix.st_mtime then map
+    else raise Not_found
+  with Not_found ->
+    let fd = Unix.openfile fname [Unix.O_RDONLY] 0 in
+    let map = Bigarray.Genarray.map_file fd ~pos:Int64.zero Bigarray.int8_unsigned Bigarray.c_layout false [|-1|] in
+    Unix.close fd;
+    Hashtbl.replace mapped_binaries fname (st.Unix.st_size, st.Unix.st_mtime, map);
+    map
+
 (** Unrelational domain signature *)
 module type T =
   sig
@@ -140,7 +157,51 @@ module Make(D: T) =
         raw_size : Z.t ;
         name : string }
 
-    let sections_addr : section list ref = ref []
+    (** table of the byte values stored in memory.
+    Every byte written into memory goes through this table so that equal abstract values are stored only once,
+    whatever the number of addresses and states they appear in. Joins then find physically equal values and the
+    untouched parts of the memory maps are shared between states (see MapOpt.map2) *)
+    module Shared = Weak.Make(
+      struct
+	type t = D.t
+	let equal v1 v2 = v1 == v2 || v1 = v2
+	let hash v = Hashtbl.hash_param 32 64 v
+      end)
+
+    let shared_bytes = Shared.create 1024
+
+    (** returns the shared copy of the given byte value *)
+    let share v = Shared.merge shared_bytes v
+
+    (** number of calls to join, meet, widen and is_subset ; number of these calls answered without looking
+    at the environments (physically equal or bottom) ; number of these calls on environments with the same
+    domain (only the values are compared) *)
+    type op_stats = {
+	mutable calls: int;
+	mutable trivial: int;
+	mutable same_domain: int;
+      }
+
+    let new_stats () = { calls = 0; trivial = 0; same_domain = 0 }
+    let reset_stats s = s.calls <- 0; s.trivial <- 0; s.same_domain <- 0
+    let join_stats = new_stats ()
+    let meet_stats = new_stats ()
+    let widen_stats = new_stats ()
+    let subset_stats = new_stats ()
+
+    let log_stats () =
+      let log name s =
+	L.analysis (fun p -> p "%s: %d call(s), %d trivial, %d on the same domain" name s.calls s.trivial s.same_domain)
+      in
+      log "join" join_stats;
+      log "meet" meet_stats;
+      log "widen" widen_stats;
+      log "is_subset" subset_stats;
+      L.analysis (fun p -> p "shared subtrees skipped: %d" !Env.shared_subtrees)
+
+    (** sections sorted by virtual address, with for every index i the highest end address of the sections 0..i
+    (see find_section) *)
+    let sections_index : (section array * Data.Address.t array) ref = ref ([||], [||])
     type arrayt = ((int, Bigarray.int8_unsigned_elt, Bigarray.c_layout) Bigarray.Genarray.t)
     let mapped_file : arrayt option ref = ref None
 
@@ -204,11 +265,16 @@ module Make(D: T) =
       | BOT -> BOT
 		 
     let is_subset m1 m2 =
+      subset_stats.calls <- subset_stats.calls + 1;
       match m1, m2 with
-      | BOT, _ 		 -> true
-      | _, BOT 		 -> false
+      | BOT, _ 		 -> subset_stats.trivial <- subset_stats.trivial + 1; true
+      | _, BOT 		 -> subset_stats.trivial <- subset_stats.trivial + 1; false
+      | Val m1', Val m2' when m1' == m2' -> subset_stats.trivial <- subset_stats.trivial + 1; true
       |	Val m1', Val m2' ->
-         try Env.for_all2 D.is_subset m1' m2'
+         try
+	   let b = Env.for_all2 (fun v1 v2 -> v1 == v2 || D.is_subset v1 v2) m1' m2' in
+	   subset_stats.same_domain <- subset_stats.same_domain + 1;
+	   b
          with _ ->
            try
              Env.iteri (fun k v1 -> try let v2 = Env.find k m2' in if not (D.is_subset v1 v2) then raise Exit with Not_found -> ()) m1';
@@ -295,47 +361,103 @@ module Make(D: T) =
            else 0 (* return 0 if a1 <= a <= a2 *)
 	
 
+    (** returns the section that contains addr. Raises Not_found if there is none.
+    The sections starting at or before addr are found by binary search ; the overlapping ones are then scanned backward
+    as long as one of them may end after addr *)
+    let find_section addr =
+      let secs, max_ends = !sections_index in
+      let rec last_before low high =
+	if low > high then high
+	else
+	  let mid = (low + high) / 2 in
+	  if Data.Address.compare secs.(mid).virt_addr addr <= 0 then last_before (mid+1) high
+	  else last_before low (mid-1)
+      in
+      let rec containing i =
+	if i < 0 || Data.Address.compare addr max_ends.(i) >= 0 then raise Not_found
+	else
+	  let sec = secs.(i) in
+	  if Data.Address.compare addr (Data.Address.add_offset sec.virt_addr sec.virt_size) < 0 then sec
+	  else containing (i-1)
+      in
+      containing (last_before 0 (Array.length secs - 1))
+
+    (** value of the byte at the given offset of the section: its value in the file if it is in raw data, TOP otherwise *)
+    let section_byte sec offset =
+      if Z.compare offset sec.raw_size > 0 then
+	D.top
+      else
+	match !mapped_file with
+	| None -> L.abort (fun p -> p "File not mapped!")
+	| Some map -> D.of_word (Data.Word.of_int (Z.of_int (Bigarray.Genarray.get map [|(Z.to_int (Z.add sec.raw_addr offset))|])) 8)
+
     (** get byte from sections, depending on addr:
             - real value if in raw data
             - TOP if in section but not raw data
             - raise Not_found if not in sections *)
     let read_from_sections addr =
-        let is_in_section addr section =
-            if (Data.Address.compare addr section.virt_addr >= 0) &&
-               (Data.Address.compare addr (Data.Address.add_offset section.virt_addr section.virt_size) < 0) then
-                true else false in
-        let sec = List.find (fun section_info -> is_in_section addr section_info) !sections_addr in
-        (* check if we're out of the section's raw data *)
-        let offset = (Data.Address.sub addr sec.virt_addr) in
-            if Z.compare offset sec.raw_size > 0 then
-                D.top
-            else
-                match !mapped_file with
-                | None -> L.abort (fun p -> p "File not mapped!")
-                | Some map -> D.of_word (Data.Word.of_int (Z.of_int (Bigarray.Genarray.get map [|(Z.to_int (Z.add sec.raw_addr offset))|])) 8)
+      let sec = find_section addr in
+      section_byte sec (Data.Address.sub addr sec.virt_addr)
 
+    (** [read_range_from_sections addr n] returns the values of the n bytes starting at _addr_, the one at the highest
+    address first (see D.concat). When the bytes are in the raw data of a single section, they are read from the file
+    with a single section lookup and returned as one value.
+    Raises Not_found if a byte is not in the sections *)
+    let read_range_from_sections addr n =
+      let sec = find_section addr in
+      let offset = Data.Address.sub addr sec.virt_addr in
+      let last = Z.add offset (Z.of_int (n-1)) in
+      if Z.compare last sec.virt_size < 0 then
+	if Z.compare last sec.raw_size <= 0 then
+	  match !mapped_file with
+	  | None -> L.abort (fun p -> p "File not mapped!")
+	  | Some map ->
+	     let start = Z.to_int (Z.add sec.raw_addr offset) in
+	     (* little endian *)
+	     let z = ref Z.zero in
+	     for i = n-1 downto 0 do
+	       z := Z.logor (Z.shift_left !z 8) (Z.of_int (Bigarray.Genarray.get map [|start+i|]))
+	     done;
+	     [D.of_word (Data.Word.of_int !z (8*n))]
+	else
+	  let rec bytes i l =
+	    if i = n then l
+	    else bytes (i+1) ((section_byte sec (Z.add offset (Z.of_int i)))::l)
+	  in
+	  bytes 0 []
+      else
+	(* the bytes span several sections *)
+	let rec bytes i l =
+	  if i = n then l
+	  else bytes (i+1) ((read_from_sections (Data.Address.add_offset addr (Z.of_int i)))::l)
+	in
+	bytes 0 []
 
     (** computes the value read from the map where _addr_ is located 
         The logic is the following:
-            1) expand the base address and size to an array of addrs
-            2) check "map" for existence
-            3) if "map" contains the adresses, get the values and concat them
-            4) else check in the "sections" maps and read from the file (or raise Not_found)
+            1) check "map" for existence of every byte from _addr_
+            2) if "map" contains the adresses, get the values and concat them
+            3) else read the bytes from the "sections" (or raise Not_found)
     **)
     let get_mem_value map addr sz =
       L.debug (fun p -> p "get_mem_value : %s %d" (Data.Address.to_string addr) sz);
       try
-        (* expand the address + size to a list of addresses *)
-        let exp_addrs = get_addr_list addr (sz/8) in
-
-        (* find the corresponding keys in the map, will raise [Not_found] if no addr matches *)
+        let n = sz/8 in
+        (* find the corresponding keys in the map, will raise [Not_found] if no addr matches.
+        The values are accumulated so that the one at the highest address comes first *)
+        let rec from_map i vals =
+          if i = n then vals
+          else
+            let v = snd (Env.find_key (where (Data.Address.add_offset addr (Z.of_int i))) map) in
+            from_map (i+1) (v::vals)
+        in
         let vals = 
         try
-            List.rev_map (fun cur_addr -> snd (Env.find_key (where cur_addr) map)) exp_addrs
+            from_map 0 []
         with Not_found ->
             L.debug (fun p -> p "\tNot found in mapping, checking sections");
             (* not in mem map, check file sections, again, will raise [Not_found] if not matched *)
-            List.rev_map (fun cur_addr -> read_from_sections cur_addr) exp_addrs
+            read_range_from_sections addr n
         in
 
         (* TODO big endian, here the map is reversed so it should be ordered in little endian order *)
@@ -383,27 +505,49 @@ module Make(D: T) =
          res
       | _ -> L.abort (fun p -> p "Trying to split a non itv")
 		       
-    (* strong update of memory with _byte_ repeated _nb_ times *)
-    let write_repeat_byte_in_mem addr domain byte nb =
-      let addrs = get_addr_list addr nb in
-      (* helper to remove keys to be overwritten, splitting Mem_Itv
-               as necessary *)
-      let delete_mem  addr domain =
-        let key = safe_find addr domain in
+    (** removes from _domain_ every key that overlaps the addresses from _low_ to _high_ (included).
+    The parts of the removed intervals that are outside of this range are added back.
+    Only the keys at both ends of the range are looked for so that the cost does not depend on
+    the number of bytes of the range but on the number of keys it overlaps *)
+    let clear_range low high domain =
+      let domain', removed = Env.remove_range (Env.range_cmp low high) domain in
+      (* same rule as split_itv: a remaining interval is added back if it is not empty and not a single byte *)
+      let add_itv low high v domain =
+        if Data.Address.compare low high < 0 then
+          Env.add (Env.Key.Mem_Itv (low, high)) v domain
+        else
+          domain
+      in
+      let add_remnants domain (key, v) =
         match key with
-        | None -> domain;
-        | Some (Env.Key.Reg _,_) ->  L.abort (fun p -> p "Implementation error: the found key is a Reg")
-        (* We have a byte, delete it *)
-        | Some (Env.Key.Mem (_) as addr_k, _) -> Env.remove addr_k domain
-        | Some (Env.Key.Mem_Itv (_, _) as key, _) ->
-           split_itv domain key addr
+        | Env.Key.Mem_Itv (a_low, a_high) ->
+           L.debug (fun p -> p "Splitting (%s, %s) out of (%s, %s)" (Data.Address.to_string a_low) (Data.Address.to_string a_high)
+             (Data.Address.to_string low) (Data.Address.to_string high));
+           let domain =
+             if Data.Address.compare a_low low < 0 then add_itv a_low (Data.Address.dec low) v domain
+             else domain
+           in
+           if Data.Address.compare high a_high < 0 then add_itv (Data.Address.inc high) a_high v domain
+           else domain
+        | _ -> domain
       in
-      let rec do_cleanup addrs map =
-        match addrs with
-        | [] -> map
-        | to_del::l -> do_cleanup l (delete_mem to_del map) in
-      let dom_clean = do_cleanup addrs domain in
-      Env.add (Env.Key.Mem_Itv (addr, (Data.Address.add_offset addr (Z.of_int nb)))) byte dom_clean
+      (* only the first and the last removed keys may stick out of the range *)
+      match removed with
+      | [] -> domain'
+      | [k] -> add_remnants domain' k
+      | k::l -> add_remnants (add_remnants domain' k) (List.hd (List.rev l))
+
+    (** true if the range of _nb_ bytes from _addr_ wraps around the end of the address space *)
+    let wraps addr nb =
+      Data.Address.compare (Data.Address.add_offset addr (Z.of_int (nb-1))) addr < 0
+
+    (* strong update of memory with _byte_ repeated _nb_ times *)
+    let write_repeat_byte_in_mem addr domain byte nb =
+      let high = Data.Address.add_offset addr (Z.of_int nb) in
+      if Data.Address.compare high addr < 0 then
+        L.abort (fun p -> p "Repeated memory init at %s wraps around the address space" (Data.Address.to_string addr));
+      let dom_clean = clear_range addr high domain in
+      Env.add (Env.Key.Mem_Itv (addr, high)) (share byte) dom_clean
 	      
 	      
     (* Write _value_ of size _sz_ in _domain_ at _addr_, in
@@ -413,6 +557,14 @@ module Make(D: T) =
       let nb = sz / 8 in
       let addrs = get_addr_list addr nb in
       let addrs = if big_endian then List.rev addrs else addrs in
+      let new_mem = List.mapi (fun i addr -> (addr, share (D.extract value (i*8) ((i+1)*8-1)))) addrs in
+      if strong && not (wraps addr nb) then
+        (* the whole range is removed at once then the new bytes are added *)
+        begin
+          let dom_clean = clear_range addr (Data.Address.add_offset addr (Z.of_int (nb-1))) domain in
+          List.fold_left (fun map (addr, byte) -> Env.add (Env.Key.Mem addr) byte map) dom_clean new_mem
+        end
+      else
       (* helper to update one byte in memory *)
       let update_one_key (addr, byte) domain =
           L.debug (fun p -> p "update_one_key (%s, %s)" (Data.Address.to_string addr) (D.to_string byte));
@@ -424,14 +576,14 @@ module Make(D: T) =
            if strong then
              Env.replace addr_k byte domain
            else
-             Env.replace addr_k (D.join byte match_val) domain
+             Env.replace addr_k (share (D.join byte match_val)) domain
         (* we have to split the interval *)
         | Some (Env.Key.Mem_Itv (_, _) as key, match_val) ->
            let dom' = split_itv domain key addr in
            if strong then
              Env.add (Env.Key.Mem(addr)) byte dom'
            else
-             Env.add (Env.Key.Mem(addr)) (D.join byte match_val) dom'
+             Env.add (Env.Key.Mem(addr)) (share (D.join byte match_val)) dom'
         (* the addr was not previously seen *)
         | None -> if strong then
                     Env.add (Env.Key.Mem(addr)) byte domain
@@ -444,7 +596,6 @@ module Make(D: T) =
         | new_val::l ->
 	   do_update l (update_one_key new_val map)
       in
-      let new_mem = List.mapi (fun i addr -> (addr, (D.extract value (i*8) ((i+1)*8-1)))) addrs in
       do_update new_mem domain
 		
 		
@@ -694,20 +845,25 @@ module Make(D: T) =
                 with Exceptions.Empty -> BOT, false
                          
     let join m1 m2 =
+      join_stats.calls <- join_stats.calls + 1;
       match m1, m2 with
-      | BOT, m | m, BOT  -> m
+      | BOT, m | m, BOT  -> join_stats.trivial <- join_stats.trivial + 1; m
+      | Val m1', Val m2' when m1' == m2' -> join_stats.trivial <- join_stats.trivial + 1; m1
       | Val m1', Val m2' ->
-         try Val (Env.map2 D.join m1' m2')
-         with _ ->
-           let m = Env.empty in
-           let m' = Env.fold (fun k v m -> Env.add k v m) m1' m in
-           Val (Env.fold (fun k v m -> try let v' = Env.find k m1' in Env.replace k (D.join v v') m with Not_found -> Env.add k v m) m2' m')
+	 let join v1 v2 = if v1 == v2 then v1 else D.join v1 v2 in
+         try
+	   let m = Env.map2 join m1' m2' in
+	   join_stats.same_domain <- join_stats.same_domain + 1;
+	   if m == m1' then m1 else Val m
+         with _ -> Val (Env.union join m1' m2')
 	       
 	       
 
     let meet m1 m2 =
+      meet_stats.calls <- meet_stats.calls + 1;
       match m1, m2 with
-      | BOT, _ | _, BOT  -> BOT
+      | BOT, _ | _, BOT  -> meet_stats.trivial <- meet_stats.trivial + 1; BOT
+      | Val m1', Val m2' when m1' == m2' -> meet_stats.trivial <- meet_stats.trivial + 1; m1
       | Val m1', Val m2' ->
 	 if Env.is_empty m1' then
 	   m2
@@ -715,20 +871,27 @@ module Make(D: T) =
 	   if Env.is_empty m2' then
 	   m1
 	   else
-	     let m' = Env.empty in
-	     let m' = Env.fold (fun k v1 m' ->
-	       try let v2 = Env.find k m2' in Env.add k (D.meet v1 v2) m' with Not_found -> m') m1' m' in
-	     Val m'
+	     try
+	       let m = Env.map2 (fun v1 v2 -> if v1 == v2 then v1 else D.meet v1 v2) m1' m2' in
+	       meet_stats.same_domain <- meet_stats.same_domain + 1;
+	       if m == m1' then m1 else Val m
+	     with Invalid_argument _ ->
+	       let m' = Env.empty in
+	       let m' = Env.fold (fun k v1 m' ->
+		 try let v2 = Env.find k m2' in Env.add k (D.meet v1 v2) m' with Not_found -> m') m1' m' in
+	       Val m'
 				
     let widen m1 m2 =
+      widen_stats.calls <- widen_stats.calls + 1;
       match m1, m2 with
-      | BOT, m | m, BOT  -> m
+      | BOT, m | m, BOT  -> widen_stats.trivial <- widen_stats.trivial + 1; m
+      | Val m1', Val m2' when m1' == m2' -> widen_stats.trivial <- widen_stats.trivial + 1; m1
       | Val m1', Val m2' ->
-         try Val (Env.map2 D.widen m1' m2')
-         with _ ->
-           let m = Env.empty in
-           let m' = Env.fold (fun k v m -> Env.add k v m) m1' m in
-           Val (Env.fold (fun k v m -> try let v' = Env.find k m1' in let v2 = try D.widen v' v with _ -> D.top in Env.replace k v2 m with Not_found -> Env.add k v m) m2' m')
+         try
+	   let m = Env.map2 (fun v1 v2 -> if v1 == v2 then v1 else D.widen v1 v2) m1' m2' in
+	   widen_stats.same_domain <- widen_stats.same_domain + 1;
+	   if m == m1' then m1 else Val m
+         with _ -> Val (Env.union (fun v1 v2 -> if v1 == v2 then v1 else try D.widen v1 v2 with _ -> D.top) m1' m2')
 	       
 	       
     let convert_section sec =
@@ -738,10 +901,16 @@ module Make(D: T) =
               raw_addr = lraw_addr;
               raw_size = lraw_size;
               name = lname }
-    let init () = sections_addr := List.map convert_section !Config.sections ;
-                  let bin_fd = Unix.openfile !Config.binary [Unix.O_RDONLY] 0 in
-                  mapped_file := Some (Bigarray.Genarray.map_file bin_fd ~pos:Int64.zero Bigarray.int8_unsigned Bigarray.c_layout false [|-1|]);
-		  Unix.close bin_fd;
+    let init () = let secs = Array.of_list (List.map convert_section !Config.sections) in
+                  Array.stable_sort (fun s1 s2 -> Data.Address.compare s1.virt_addr s2.virt_addr) secs;
+                  let ends = Array.map (fun s -> Data.Address.add_offset s.virt_addr s.virt_size) secs in
+                  for i = 1 to Array.length ends - 1 do
+                    if Data.Address.compare ends.(i-1) ends.(i) > 0 then ends.(i) <- ends.(i-1)
+                  done;
+                  sections_index := (secs, ends);
+		  Env.shared_subtrees := 0;
+		  List.iter reset_stats [ join_stats; meet_stats; widen_stats; subset_stats ];
+                  mapped_file := Some (map_binary !Config.binary);
                   Val (Env.empty)
 		      
     (** returns size of content, rounded to the next multiple of Config.operand_sz *)
@@ -1082,6 +1251,100 @@ module Make(D: T) =
 	   end
 	| BOT -> BOT
 
+    (** returns the lowest and the highest addresses of the _nb_ elements of _sz_ bits from _a_,
+    stored upward if _forward_ is true and downward otherwise. Raises Exceptions.Concretization if the range wraps around the address space *)
+    let element_range a nb sz forward =
+      let esz = sz / 8 in
+      let low, high =
+        if forward then
+          a, Data.Address.add_offset a (Z.of_int (nb*esz-1))
+        else
+          Data.Address.add_offset a (Z.of_int (-(nb-1)*esz)), Data.Address.add_offset a (Z.of_int (esz-1))
+      in
+      if Data.Address.compare low a > 0 || Data.Address.compare a high > 0 then
+        raise Exceptions.Concretization;
+      low, high
+
+    (** returns the address of _e_ in _m'_. Raises Exceptions.Concretization if it is not a single address *)
+    let single_address m' e =
+      match Data.Address.Set.elements (D.to_addresses (fst (eval_exp m' e))) with
+      | [a] -> a
+      | _ -> raise Exceptions.Concretization
+
+    (** strong update of the range from _low_ to _high_ with the values of its consecutive elements of _sz_ bits.
+    The range is removed at once and its bytes are then added *)
+    let write_elements m' low high vals sz =
+      let m' = clear_range low high m' in
+      let esz = sz / 8 in
+      let m', _ =
+        List.fold_left (fun (m', a) v ->
+          let rec add_bytes m' i =
+            if i = esz then m'
+            else
+              let a' = Data.Address.add_offset a (Z.of_int i) in
+              add_bytes (Env.add (Env.Key.Mem a') (share (D.extract v (i*8) ((i+1)*8-1))) m') (i+1)
+          in
+          add_bytes m' 0, Data.Address.add_offset a (Z.of_int esz)) (m', low) vals
+      in
+      m'
+
+    (** [copy_elements m dst src nb sz forward] copies the _nb_ elements of _sz_ bits from _src_ to _dst_ as a rep movs would.
+    Returns also whether a copied element or a pointer is tainted.
+    Raises Exceptions.Concretization if _dst_ or _src_ is not a single address, if the source and destination ranges overlap
+    or if an element is bottom: the element by element copy is then the only right one *)
+    let copy_elements m dst src nb sz forward: t * bool =
+      match m with
+      | BOT -> BOT, false
+      | Val m' ->
+         let dst_low, dst_high = element_range (single_address m' dst) nb sz forward in
+         let src_low, src_high = element_range (single_address m' src) nb sz forward in
+         if not (Data.Address.compare dst_high src_low < 0 || Data.Address.compare src_high dst_low < 0) then
+           raise Exceptions.Concretization;
+         let esz = sz / 8 in
+         let src' = Asm.Lval (Asm.M (src, sz)) in
+         let rec read i vals =
+           if i < 0 then vals
+           else
+             let v = get_mem_value m' (Data.Address.add_offset src_low (Z.of_int (i*esz))) sz in
+             if D.is_bot v then raise Exceptions.Concretization;
+             read (i-1) ((span_taint m' src' v)::vals)
+         in
+         let vals = read (nb-1) [] in
+         let tainted = List.exists D.is_tainted vals || snd (eval_exp m' dst) || snd (eval_exp m' src) in
+         Val (write_elements m' dst_low dst_high vals sz), tainted
+      
+    (** [fill_elements m dst v nb sz forward] stores _nb_ times the value _v_ of _sz_ bits from _dst_ as a rep stos would.
+    Returns also whether the value or the pointer is tainted.
+    Raises Exceptions.Concretization if _dst_ is not a single address or if _v_ is bottom *)
+    let fill_elements m dst v nb sz forward: t * bool =
+      match m with
+      | BOT -> BOT, false
+      | Val m' ->
+         let low, high = element_range (single_address m' dst) nb sz forward in
+         let v', b = eval_exp m' v in
+         if D.is_bot v' then raise Exceptions.Concretization;
+         let vals = Array.to_list (Array.make nb v') in
+         Val (write_elements m' low high vals sz), b || snd (eval_exp m' dst)
+
+    (** [skip_elements m e cmp v nb sz] returns the number of elements of _sz_ bits from _e_, upward and at most _nb_-1,
+    for which (element cmp v) is surely false, that is the number of iterations of a rep scas that are known not to stop it.
+    The last iteration is never skipped as it sets the flags. Returns also whether a compared value is tainted *)
+    let skip_elements m e cmp v nb sz: int * bool =
+      match m with
+      | BOT -> 0, false
+      | Val m' ->
+         let a = single_address m' e in
+         let v', b = eval_exp m' v in
+         let esz = sz / 8 in
+         let rec skip i tainted =
+           if i >= nb-1 then i, tainted
+           else
+             let elt = get_mem_value m' (Data.Address.add_offset a (Z.of_int (i*esz))) sz in
+             if D.is_bot elt || D.compare elt cmp v' then i, tainted
+             else skip (i+1) (tainted || D.is_tainted elt)
+         in
+         skip 0 b
+	
     (* display (char) arg on stdout as a raw string *)
     let print m arg _sz: t =
         match m with
@@ -170,6 +170,9 @@ sig
     (** value conversion. May raise an exception *)
     val to_z: t -> Z.t
 
+    (** conversion of the taint into a Z value (bit i is set iff bit i is tainted). May raise an exception *)
+    val taint_to_z: t -> Z.t
+
     (** char conversion. May raise an exception *)
     val to_char: t -> char
 
@@ -304,6 +307,7 @@ module Make(V: Val) =
     let size v = Array.length v
 
     let to_z v = v_to_z V.to_z v 
+    let taint_to_z v = v_to_z V.taint_to_z v
     (* this function may raise an exception if one of the bits cannot be converted into a Z.t integer (one bit at BOT or TOP) *)
     let to_word conv v = Data.Word.of_int (v_to_z conv v) (Array.length v)
     let extract_strings v = 
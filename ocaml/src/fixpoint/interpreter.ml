@@ -47,6 +47,7 @@ module type T =
 	      mutable forward_loop: bool; (** true whenever the state belongs to a loop that is forward analysed in CFA mode *)
 	      mutable branch: bool option; (** None is for unconditional predecessor. Some true if the predecessor is a If-statement for which the true branch has been taken. Some false if the false branch has been taken *)
 	      mutable bytes: char list;      (** corresponding list of bytes *)
+	      mutable block: int list;      (** lengths of the instructions of a basic block node (see Config.block_nodes). Empty for the node of a single instruction *)
 	    mutable is_tainted: bool; (** true whenever a source left value is the stmt list (field stmts) may be tainted *)
 	    }
       end
@@ -54,15 +55,31 @@ module type T =
       val create: unit -> t
       val add_vertex: t -> State.t -> unit
       val print: string -> string -> t -> unit
+      (** [stream_start f] makes forward_bin write the states into the partial result file of f while they are computed *)
+      val stream_start: string -> unit
       val unmarshal: string -> t
+      (** [unmarshal_from f ip forward] loads from f the CFA and the abstract values of the states reachable from the last
+      state at ip. Returns the CFA, this state and a function that loads the abstract values of the other states *)
+      val unmarshal_from: string -> Data.Address.t -> bool -> t * State.t * (unit -> unit)
       val marshal: string -> t -> unit
       val init_abstract_value: unit -> domain
       val last_addr: t -> Data.Address.t -> State.t
     end
     val forward_bin: Code.t -> Cfa.t -> Cfa.State.t -> (Cfa.t -> unit) -> Cfa.t
+    (** [forward_bin_batch code eps dump] runs forward_bin from every entry point of eps (see Config.entry_points) *)
+    val forward_bin_batch: Code.t -> Data.Address.t list -> (Cfa.t -> unit) -> Cfa.t
+    (** [resume_bin code f dump] continues the forward_bin analysis saved into the checkpoint file f *)
+    val resume_bin: Code.t -> string -> (Cfa.t -> unit) -> Cfa.t
+    (** [reanalyze code g addrs dump] updates the CFA g of a previous forward_bin analysis whose overrides at the addresses addrs have changed *)
+    val reanalyze: Code.t -> Cfa.t -> Data.Address.t list -> (Cfa.t -> unit) -> Cfa.t
     val forward_cfa: Cfa.t -> Cfa.State.t -> (Cfa.t -> unit) -> Cfa.t 
     val backward: Cfa.t -> Cfa.State.t -> (Cfa.t -> unit) -> Cfa.t
     val interleave_from_cfa: Cfa.t -> (Cfa.t -> unit) -> Cfa.t
+    (** [write_profile f] writes into f the cost of forward_bin per address (see Config.profile) *)
+    val write_profile: string -> unit
+    (** [reset ()] forgets the previous analysis run with the same module (see Main.serve). The decoded instructions
+    are kept if the code and the decoding options have not changed *)
+    val reset: unit -> unit
   end
     
 module Make(D: Domain.T): (T with type domain = D.t) =
@@ -81,16 +98,118 @@ module Make(D: Domain.T): (T with type domain = D.t) =
 
     open Asm
       
+    (** set of states waiting to be explored by the fixpoint iterations.
+    The smallest element with respect to the strategy given by Config.worklist is explored first.
+    The Address order reads the mutable ip field: the ip of a state is only set (Cfa.update_ip) while the step that
+    creates it runs, that is before the state is added to the set, and a state is removed from the set before its step *)
+    module Vertices = Set.Make(
+      struct
+	type t = Cfa.State.t
+	let compare v1 v2 =
+	  match !Config.worklist with
+	  | Config.Bfs -> Cfa.State.compare v1 v2
+	  | Config.Dfs -> Cfa.State.compare v2 v1
+	  | Config.Address ->
+	     let c = Data.Address.compare v1.Cfa.State.ip v2.Cfa.State.ip in
+	     if c = 0 then Cfa.State.compare v1 v2 else c
+      end)
+
     (* Hash table to know when a widening has to be processed, that is when the associated value reaches the threshold Config.unroll *)
     let unroll_tbl: ((Data.Address.t, int * D.t) Hashtbl.t) ref = ref (Hashtbl.create 1000)
 
     (* Hash table to store number of times a function has been analysed *)
     let fun_unroll_tbl: (Data.Address.t, int) Hashtbl.t = Hashtbl.create 10
+
+    (* addresses that may be reached by several states in forward_bin. Their abstract values are always kept
+    as they are compared with the next states at the same address (see filter_vertices and Config.retention) *)
+    let joins: (Data.Address.t, unit) Hashtbl.t = Hashtbl.create 100
       
     (* current unroll value *)
     (* None is for the default value set in Config *)
     let unroll_nb = ref None
 
+    (* number of updates of the data shared by all the steps of forward_bin except unroll_tbl, that is
+    the function stack, fun_unroll_tbl, unroll_nb and the configuration.
+    A step that increases it cannot be computed by a worker process (see forward_bin_from) *)
+    let shared_writes = ref 0
+
+    (* addresses whose entry in unroll_tbl has been updated by the current step *)
+    let unroll_keys: Data.Address.t list ref = ref []
+
+    (* time at which the analysis has started (see Config.max_time) *)
+    let start_time = ref (Unix.gettimeofday ())
+
+    (** returns the first budget of the analysis (see Config.max_time, Config.max_nodes and Config.max_heap)
+    exceeded once the analysis has created _nodes_ states, or None *)
+    let exceeded_budget (nodes: int): string option =
+      if !Config.max_time > 0 && Unix.gettimeofday () -. !start_time > float_of_int !Config.max_time then
+	Some (Printf.sprintf "time budget of %d s exceeded" !Config.max_time)
+      else if !Config.max_nodes > 0 && nodes > !Config.max_nodes then
+	Some (Printf.sprintf "node budget of %d states exceeded" !Config.max_nodes)
+      else if !Config.max_heap > 0 && (Gc.quick_stat ()).Gc.heap_words / 1024 * (Sys.word_size / 8) > !Config.max_heap * 1024 then
+	Some (Printf.sprintf "heap budget of %d MB exceeded" !Config.max_heap)
+      else None
+
+    (** true whenever a budget of the analysis is exceeded once it has created _nodes_ states. The reason is then
+    written into the log *)
+    let out_of_budget (nodes: int): bool =
+      match exceeded_budget nodes with
+      | Some reason ->
+	 L.analysis (fun p -> p "analysis stopped: %s" reason);
+	 Log.partial reason;
+	 true
+      | None -> false
+
+    (** cost of the analysis of the instructions at an address *)
+    type profile_t = {
+	mutable p_visits: int;      (** number of processed states *)
+	mutable p_decoding: float;  (** time in seconds spent in Decoder.parse *)
+	mutable p_stmts: float;     (** time in seconds spent in process_stmts *)
+	mutable p_filtering: float; (** time in seconds spent in filter_vertices *)
+	mutable p_joins: int;       (** number of joins of new states with the previous ones at this address *)
+	mutable p_widenings: int;   (** number of widenings at this address *)
+      }
+
+    (* profile of forward_bin indexed by address. It is only filled if Config.profile is true *)
+    let profile: (Data.Address.t, profile_t) Hashtbl.t = Hashtbl.create 1000
+
+    let profile_entry a =
+      try Hashtbl.find profile a
+      with Not_found ->
+	let p = { p_visits = 0; p_decoding = 0.; p_stmts = 0.; p_filtering = 0.; p_joins = 0; p_widenings = 0 } in
+	Hashtbl.add profile a p;
+	p
+
+    (** [profiled a update f] returns f (). If profiling is enabled, update is then called with
+    the profile of the address a and the time spent in f *)
+    let profiled a (update: profile_t -> float -> unit) f =
+      if !Config.profile then
+	let t = Unix.gettimeofday () in
+	let r = f () in
+	update (profile_entry a) (Unix.gettimeofday () -. t);
+	r
+      else f ()
+
+    (** [count a f] applies f to the profile of the address a if profiling is enabled *)
+    let count a (f: profile_t -> unit) =
+      if !Config.profile then f (profile_entry a)
+
+    (** [write_profile f] writes the profile of forward_bin into the file f, one tab separated line per address *)
+    let write_profile fname =
+      let f = open_out fname in
+      Printf.fprintf f "# address\tvisits\tdecoding\tstmts\tfiltering\tjoins\twidenings\n";
+      let entries = Hashtbl.fold (fun a p l -> (a, p)::l) profile [] in
+      List.iter (fun (a, p) ->
+	Printf.fprintf f "%s\t%d\t%.6f\t%.6f\t%.6f\t%d\t%d\n" (Data.Address.to_string a)
+	  p.p_visits p.p_decoding p.p_stmts p.p_filtering p.p_joins p.p_widenings)
+	(List.sort (fun (a1, _) (a2, _) -> Data.Address.compare a1 a2) entries);
+      close_out f
+
+    (** adds the event e on the state v to the binary trace *)
+    let trace e v =
+      if Log.tracing () then
+	Log.trace e v.Cfa.State.id (Data.Address.to_int v.Cfa.State.ip)
+
     (** opposite the given comparison operator *)
     let inv_cmp (cmp: Asm.cmp): Asm.cmp =
       match cmp with
@@ -146,9 +265,13 @@ module Make(D: Domain.T): (T with type domain = D.t) =
               try
 		let n', jd' = Hashtbl.find !unroll_tbl ip in
 		let d' = D.join jd' v.Cfa.State.v in
-		Hashtbl.replace !unroll_tbl ip (n'+1, d'); n'+1, jd'
+		Hashtbl.replace !unroll_tbl ip (n'+1, d');
+		count ip (fun p -> p.p_joins <- p.p_joins + 1);
+		unroll_keys := ip::!unroll_keys;
+		n'+1, jd'
               with Not_found ->
 		Hashtbl.add !unroll_tbl v.Cfa.State.ip (1, v.Cfa.State.v);
+		unroll_keys := v.Cfa.State.ip::!unroll_keys;
 		1, v.Cfa.State.v
             in
 	    let nb_max =
@@ -161,13 +284,16 @@ module Make(D: Domain.T): (T with type domain = D.t) =
             else
 	      begin
 		L.analysis (fun p -> p "widening occurs at %s" (Data.Address.to_string ip));
-		widen jd v
+		widen jd v;
+		count ip (fun p -> p.p_widenings <- p.p_widenings + 1);
+		trace Log.Widen v
 	      end
         ) l;
 
        List.fold_left (fun l' v -> if D.is_bot v.Cfa.State.v then
                                       begin
 					L.analysis (fun p -> p "unreachable state at address %s" (Data.Address.to_string ip));
+					trace Log.Unreachable v;
 					Cfa.remove_state g v; l'
                                       end
 	 else v::l') [] l (* TODO: optimize by avoiding creating a state then removing it if its abstract value is bot *)
@@ -188,6 +314,16 @@ module Make(D: Domain.T): (T with type domain = D.t) =
              | If (_, tstmts, estmts)   -> (has_jmp tstmts) || (has_jmp estmts)
              | _ 		        -> (has_jmp stmts')
 
+    (** returns true whenever the given list of statements has a Call stmt *)
+    let rec has_call stmts =
+        match stmts with
+        | [] -> false
+        | s::stmts' ->
+             match s with
+             | Call _ 		      -> true
+             | If (_, tstmts, estmts) -> (has_call tstmts) || (has_call estmts) || (has_call stmts')
+             | _ 		      -> (has_call stmts')
+
     let unroll_wrapper (f: unit -> int): unit =
       try
 	match !unroll_nb with
@@ -195,13 +331,159 @@ module Make(D: Domain.T): (T with type domain = D.t) =
 	| None ->
 	   let n = f () in
 	   unroll_nb := Some n;
+	   incr shared_writes;
 	   L.analysis (fun p -> p "automatic loop unrolling detection. Computed value is 0x%x" n)
       with _ -> ()
       
     exception Jmp_exn
 
-    type fun_stack_t = ((string * string) option * Data.Address.t * Cfa.State.t * (Data.Address.t, int * D.t) Hashtbl.t) list ref
+    (** calling context of a function. Once no state of the body of the function remains to be explored, the call is
+    a summary of the function: the join of the abstract values at the return address computed from the abstract value
+    at the entry of the function *)
+    type call_t = {
+	callee: Data.Address.t;            (** address of the function *)
+	return_ip: Data.Address.t;         (** address of the instruction following the call *)
+	mutable input: D.t option;         (** key of the abstract value at the entry of the function (see summary_key). None if it is not known *)
+	mutable body_tainted: bool;        (** true whenever a state of the function has been tainted *)
+	mutable entry: Cfa.State.t option; (** first state of the body of the function *)
+	mutable returns: Cfa.State.t list; (** states at the return address reached from the body *)
+	mutable output: D.t;               (** join of the abstract values of the states of returns *)
+	mutable complete: bool;            (** true whenever no state of the body remains to be explored *)
+      }
+
+    (** returns a new calling context of the function at address _a_ returning to _ip_ *)
+    let new_call a ip = { callee = a; return_ip = ip; input = None; body_tainted = false; entry = None; returns = []; output = D.bot; complete = false }
+
+    type fun_stack_t = ((string * string) option * Data.Address.t * Cfa.State.t * (Data.Address.t, int * D.t) Hashtbl.t * call_t) list ref
+
+    (** returns the part of the abstract value at the entry of a function that is the key of its summaries.
+    The return address on the top of the stack is forgotten so that a summary may be used by all the call sites *)
+    let summary_key d =
+      try
+	let sp = Register.stack_pointer () in
+	D.forget_lval (M (Lval (V (T sp)), Register.size sp)) d
+      with _ -> d
+
+    (** [restore_return_address entry ip d] writes back the return address _ip_ found at the top of the stack of the
+    abstract value _entry_ at the entry of a function into the abstract value _d_ of one of its summaries, as the
+    summary may have been computed from another call site (see summary_key) *)
+    let restore_return_address entry ip d =
+      try
+	let sp = Register.stack_pointer () in
+	let sz = Register.size sp in
+	(* distance between the stack pointer at the entry of the function and at its return *)
+	let delta = Z.sub (D.value_of_register d sp) (D.value_of_register entry sp) in
+	if Z.sign delta < 0 then d
+	else
+	  let top = BinOp (Sub, Lval (V (T sp)), Const (Data.Word.of_int delta sz)) in
+	  fst (D.set (M (top, sz)) (Const (Data.Address.to_word ip sz)) d)
+      with _ -> d
+
+    (* calls of the analysed functions whose entry value is known, indexed by the address of the function.
+    The complete ones are the summaries of the function *)
+    let summaries: (Data.Address.t, call_t list) Hashtbl.t = Hashtbl.create 10
+
+    (** [in_body g c s] returns true whenever the state _s_ of _g_ belongs to the body of the call _c_, that is the first
+    state of the body is an ancestor of _s_ that is not separated from it by a return of _c_.
+    As a state is created after its predecessor, the ancestors older than the first state of the body are not visited *)
+    let in_body g c s =
+      match c.entry with
+      | None -> false
+      | Some e ->
+	 let rec up s =
+	   if s == e then true
+	   else if s.Cfa.State.id < e.Cfa.State.id || List.memq s c.returns then false
+	   else
+	     match (try Some (Cfa.pred g s) with Invalid_argument _ -> None) with
+	     | Some p -> up p
+	     | None -> false
+	 in
+	 up s
+
+    (** [is_complete g c pending] returns true whenever none of the states _pending_ to be explored belongs to the body of the call _c_ *)
+    let is_complete g c pending =
+      if not c.complete then
+	c.complete <- not (List.exists (in_body g c) pending);
+      c.complete
+
+    (** once an analysis has stopped, its calls are complete if finished is true. Otherwise the ones that are not
+    complete are removed from the summaries as the states of their body will not be explored *)
+    let close_calls (finished: bool) =
+      let calls = Hashtbl.fold (fun a l calls -> (a, l)::calls) summaries [] in
+      List.iter (fun (a, l) ->
+	if finished then List.iter (fun c -> c.complete <- true) l
+	else Hashtbl.replace summaries a (List.filter (fun c -> c.complete) l)) calls
+
+    (* functions called and returned by the current step *)
+    let step_calls: call_t list ref = ref []
+    let step_returns: call_t list ref = ref []
+
+    let summary_hits = ref 0
+    let summary_misses = ref 0
+
+    let reset () =
+      Cfa.reset ();
+      Decoder.reset ();
+      unroll_tbl := Hashtbl.create 1000;
+      Hashtbl.reset fun_unroll_tbl;
+      Hashtbl.reset joins;
+      unroll_nb := None;
+      shared_writes := 0;
+      unroll_keys := [];
+      start_time := Unix.gettimeofday ();
+      Hashtbl.reset profile;
+      Hashtbl.reset summaries;
+      step_calls := [];
+      step_returns := [];
+      summary_hits := 0;
+      summary_misses := 0
     
+    (* number of consecutive waiting vertices whose steps are computed by the same worker process (see Config.workers) *)
+    let worker_batch = 16
+
+    (* number of bytes above which a rep prefixed instruction is left to the iterations of its loop *)
+    let max_rep_bytes = 1 lsl 20
+
+    (** applies in one step the iterations of a rep prefixed string instruction (see Asm.Rep).
+    If the count is not concrete or the domain cannot do the bulk operation then the abstract value is left unchanged
+    and the loop built by the decoder iterates as usual *)
+    let process_rep (d: D.t) (op: Asm.rep_t) (count: Asm.lval) (ptrs: Asm.lval list) (sz: int) (forward: bool): D.t * bool =
+      let lval_size lv =
+	match lv with
+	| V (T r) -> Register.size r
+	| V (P (_, low, up)) -> up-low+1
+	| M (_, n) -> n
+      in
+      try
+	let n = Z.to_int (D.value_of_exp d (Lval count)) in
+	if n <= 0 || n * (sz / 8) > max_rep_bytes then
+	  (d, false)
+	else
+	  let d', nb, tainted =
+	    match op with
+	    | Rep_movs (dst, src) -> let d', b = D.copy_elements d dst src n sz forward in d', n, b
+	    | Rep_stos (dst, v) -> let d', b = D.fill_elements d dst v n sz forward in d', n, b
+	    | Rep_scas (e, cmp, v) -> D.skip_elements d e cmp v n sz
+	  in
+	  if nb = 0 then
+	    (d, false)
+	  else
+	    let move lv off = BinOp ((if forward then Add else Sub), Lval lv, Const (Data.Word.of_int (Z.of_int off) (lval_size lv))) in
+	    let d' = List.fold_left (fun d ptr -> fst (D.set ptr (move ptr (nb * (sz / 8))) d)) d' ptrs in
+	    let d', _ = D.set count (BinOp (Sub, Lval count, Const (Data.Word.of_int (Z.of_int nb) (lval_size count)))) d' in
+	    L.analysis (fun p -> p "%d iterations of a rep prefix applied in one step" nb);
+	    if tainted then
+	      begin
+		match count with
+		| V (T r) | V (P (r, _, _)) -> D.taint_register_mask r (Config.Taint (Bits.ff ((Register.size r) / 8))) d', true
+		| M _ -> d', true
+	      end
+	    else
+	      (d', false)
+      with
+      (* the count or a pointer is not concrete enough: the loop of the decoder does the iterations *)
+      | Exceptions.Concretization | Exceptions.Enum_failure | Exceptions.Illegal_address | Exceptions.Empty | Z.Overflow -> d, false
+
     let rec process_value (d: D.t) (s: Asm.stmt) (fun_stack: fun_stack_t) =
         L.debug (fun p -> p "process_value stmt=\n%s" (Asm.string_of_stmt s true));
         let res, tainted = 
@@ -223,6 +505,7 @@ module Make(D: Domain.T): (T with type domain = D.t) =
             | Directive (Default_unroll) ->
                L.analysis (fun p -> p "set unroll parameter to its default value");
               unroll_nb := None;
+              incr shared_writes;
               d, false
 
             | Asm.Directive (Asm.Unroll_until (addr, cmp, terminator, upper_bound, sz)) ->
@@ -262,7 +545,8 @@ module Make(D: Domain.T): (T with type domain = D.t) =
                  | _ -> L.analysis (fun p -> p "Tainting directive for %s ignored" (Asm.string_of_lval lv false)); d, false   
                end
             | Directive (Type (lv, t)) -> D.set_type lv t d, false
-            | Directive (Stub (fun_name, args)) -> Stubs.process d fun_name args
+            | Directive (Stub (fun_name, args)) -> incr shared_writes; Stubs.process d fun_name args
+            | Directive (Rep (op, count, ptrs, sz, forward)) -> process_rep d op count ptrs sz forward
                (* fun_stack := List.tl !fun_stack; *)
             | _ 				 -> raise Jmp_exn
           in L.debug (fun p -> p "process_value returns taint : %B"  tainted); res, tainted
@@ -276,13 +560,15 @@ module Make(D: Domain.T): (T with type domain = D.t) =
              D.join dt de, bt||be
 
    
-    let process_ret (fun_stack: fun_stack_t) v =
+    let process_ret (fun_stack: fun_stack_t) g v =
       try
 	begin
 	let d = v.Cfa.State.v in
 	let d', ipstack, prev_unroll_tbl =
-            let _f, ipstack, _v, prev_unroll_tbl = List.hd !fun_stack in
+            let _f, ipstack, _v, prev_unroll_tbl, c = List.hd !fun_stack in
             fun_stack := List.tl !fun_stack;	
+            step_returns := c::!step_returns;
+            incr shared_writes;
             (* check and apply tainting and typing rules *)
 	    (* 1. check for assert *)
 	    (* 2. taint ret *)
@@ -295,7 +581,7 @@ module Make(D: Domain.T): (T with type domain = D.t) =
               let ip_on_stack, is_tainted = D.mem_to_addresses d' (Asm.Lval (Asm.M (Asm.Lval (Asm.V (Asm.T sp)), (Register.size sp)))) in
               match Data.Address.Set.elements (ip_on_stack) with
               | [a] -> 
-		 v.Cfa.State.ip <- a;
+		 Cfa.update_ip g v a;
 		 begin
 		   match ipstack with
 		   | Some ip' -> 
@@ -314,8 +600,9 @@ module Make(D: Domain.T): (T with type domain = D.t) =
 		       
 
     (** returns the result of the transfert function corresponding to the statement on the given abstract value *)
-    let import_call vertices a (pred_fun: Cfa.State.t -> Cfa.State.t) fun_stack =
+    let import_call g vertices a (pred_fun: Cfa.State.t -> Cfa.State.t) fun_stack =
         let fundec = Hashtbl.find Decoder.Imports.tbl a in
+        incr shared_writes;
         L.analysis (fun p -> p "at %s: library call for %s found. Looking for a stub." (Data.Address.to_string a) (fundec.Decoder.Imports.name));
         let b =
             List.fold_left (fun b v ->
@@ -327,7 +614,7 @@ module Make(D: Domain.T): (T with type domain = D.t) =
                 in
                 v.Cfa.State.v <- d';
                 let pred = pred_fun v in
-                v.Cfa.State.ip <- Data.Address.add_offset pred.Cfa.State.ip (Z.of_int (List.length pred.Cfa.State.bytes));
+                Cfa.update_ip g v (Data.Address.add_offset pred.Cfa.State.ip (Z.of_int (List.length pred.Cfa.State.bytes)));
                 (* set back the stack register to its pred value *)
                 let stack_register = Register.stack_pointer () in
                 v.Cfa.State.v <- D.copy_register stack_register v.Cfa.State.v pred.Cfa.State.v;
@@ -346,8 +633,8 @@ module Make(D: Domain.T): (T with type domain = D.t) =
                         match addresses with
                         | [a] ->
                           begin
-                              try let res = import_call [v] a ip_pred fun_stack in import := true; res
-                              with Not_found -> v.Cfa.State.ip <- a; apply a; v::l, b||is_tainted
+                              try let res = import_call g [v] a ip_pred fun_stack in import := true; res
+                              with Not_found -> Cfa.update_ip g v a; apply a; v::l, b||is_tainted
                           end
                         | [] -> L.abort (fun p -> p "Unreachable jump target from ip = %s\n" (Data.Address.to_string v.Cfa.State.ip))
                         | l -> L.abort (fun p -> p "Please select between the addresses %s for jump target from %s\n"
@@ -375,7 +662,10 @@ module Make(D: Domain.T): (T with type domain = D.t) =
             Some (Hashtbl.find Config.import_tbl (Data.Address.to_int a))
           with Not_found -> None
 	in
-	fun_stack := (f, ip, v, !unroll_tbl)::!fun_stack;
+	let c = new_call a ip in
+	step_calls := c::!step_calls;
+	fun_stack := (f, ip, v, !unroll_tbl, c)::!fun_stack;
+	incr shared_writes;
 	unroll_tbl := Hashtbl.create 1000
       in
       let copy v d branch is_pred =
@@ -422,11 +712,11 @@ module Make(D: Domain.T): (T with type domain = D.t) =
              | Jmp (A a) ->
 		begin
 		  try
-		    let res = import_call vertices a (fun v -> Cfa.pred g (Cfa.pred g v)) fun_stack in
+		    let res = import_call g vertices a (fun v -> Cfa.pred g (Cfa.pred g v)) fun_stack in
 		    fun_stack := List.tl !fun_stack;
 		    res
 		  with Not_found ->
-		    List.map (fun v -> v.Cfa.State.ip <- a; v) vertices, false		      
+		    List.map (fun v -> Cfa.update_ip g v a; v) vertices, false		      
 		end
 		  
              | Jmp (R target) ->
@@ -435,16 +725,16 @@ module Make(D: Domain.T): (T with type domain = D.t) =
              | Call (A a) ->
 		begin
 		  try		   
-		    import_call vertices a (fun v -> Cfa.pred g v) fun_stack 
+		    import_call g vertices a (fun v -> Cfa.pred g v) fun_stack 
 		  with Not_found ->
 		    add_to_fun_stack a;
-		    List.iter (fun v -> v.Cfa.State.ip <- a) vertices;
+		    List.iter (fun v -> Cfa.update_ip g v a) vertices;
 		    vertices, false
 		end
 	     | Call (R target) -> fold_to_target add_to_fun_stack vertices target (fun v -> Cfa.pred g v)
 		
              | Return -> List.fold_left (fun (l, b) v ->
-			     let v', b' = process_ret fun_stack v in
+			     let v', b' = process_ret fun_stack g v in
 			     match v' with
 			     | None -> l, b||b'
 			     | Some v -> v::l, b||b') ([], false) vertices
@@ -468,22 +758,76 @@ module Make(D: Domain.T): (T with type domain = D.t) =
       in
       let vstart = copy v v.Cfa.State.v None true
       in
-      vstart.Cfa.State.ip <- ip;
+      Cfa.update_ip g vstart ip;
       vstart.Cfa.State.is_tainted <- false;
       let vertices, b = process_list [vstart] v.Cfa.State.stmts in
       if b then
 	begin
           L.debug (fun p->p "FUFU taint : true");
 	  v.Cfa.State.is_tainted <- true;
-	  List.iter (fun (_f, _ip, v, _tbl) -> v.Cfa.State.is_tainted <- true) !fun_stack
+	  if !fun_stack <> [] then incr shared_writes;
+	  List.iter (fun (_f, _ip, v, _tbl, c) -> v.Cfa.State.is_tainted <- true; c.body_tainted <- true) !fun_stack;
+	  List.iter (fun c -> c.body_tainted <- true) !step_returns
 	end;
       vertices
 
-    (** [filter_vertices subsuming g vertices] returns vertices in _vertices_ that are not already in _g_ (same address and same decoding context and subsuming abstract value if subsuming = true) *)
+    (** applies or records function summaries once a step has computed the given vertices.
+    If the step has called a function with a summary whose entry value is greater than the one of the called state,
+    this state is moved to the return address with the abstract value of the summary and the function is not explored.
+    If the step has returned from a call whose entry value is known, the abstract value at the return address is joined
+    to the output of this call. A call is a summary only once none of the states _pending_ to be explored belongs to its body.
+    Summaries are keyed by the abstract value at the entry of the function (see summary_key) and compared by inclusion *)
+    let summarize g (vertices: Cfa.State.t list) (fun_stack: fun_stack_t) (pending: unit -> Cfa.State.t list): Cfa.State.t list =
+      List.iter (fun c ->
+	if c.input <> None then
+	  List.iter (fun v ->
+	    if Data.Address.equal v.Cfa.State.ip c.return_ip then
+	      begin
+		c.returns <- v::c.returns;
+		c.output <- D.join c.output v.Cfa.State.v
+	      end) vertices) !step_returns;
+      match !step_calls, vertices, !fun_stack with
+      | [c], [v], (_f, _ip, caller, prev_unroll_tbl, c')::fun_stack' when c == c' ->
+	 let key = summary_key v.Cfa.State.v in
+	 let l = try Hashtbl.find summaries c.callee with Not_found -> [] in
+	 (* the computed vertices are not yet in the waiting set *)
+	 let pending = lazy (vertices @ (pending ())) in
+	 begin
+	   try
+	     let s = List.find (fun s ->
+	       match s.input with
+	       | Some d -> D.is_subset key d && is_complete g s (Lazy.force pending)
+	       | None -> false) l
+	     in
+	     incr summary_hits;
+	     L.analysis (fun p -> p "summary of the function at %s applied" (Data.Address.to_string c.callee));
+	     fun_stack := fun_stack';
+	     unroll_tbl := prev_unroll_tbl;
+	     (* a summarized call is not counted as an analysis of the function *)
+	     Hashtbl.replace fun_unroll_tbl c.callee ((Hashtbl.find fun_unroll_tbl c.callee) - 1);
+	     Cfa.update_ip g v c.return_ip;
+	     v.Cfa.State.v <- restore_return_address v.Cfa.State.v c.return_ip s.output;
+	     if s.body_tainted then
+	       begin
+		 caller.Cfa.State.is_tainted <- true;
+		 List.iter (fun (_f, _ip, v, _tbl, c) -> v.Cfa.State.is_tainted <- true; c.body_tainted <- true) fun_stack'
+	       end;
+	     vertices
+	   with Not_found ->
+	     incr summary_misses;
+	     c.input <- Some key;
+	     c.entry <- Some v;
+	     Hashtbl.replace summaries c.callee (c::l);
+	     vertices
+	 end
+      | _ -> vertices
+
+    (** [filter_vertices subsuming g vertices] returns vertices in _vertices_ that are not already in _g_ (same address and same decoding context and subsuming abstract value if subsuming = true).
+    Only the states of _g_ at the same address are compared (see Cfa.states_at). The states whose abstract value
+    has not been kept (see Config.retention) cannot subsume a new state *)
     let filter_vertices (subsuming: bool) g vertices =
       (* predicate to check whether a new vertex has to be explored or not *)
       let same prev v' =
-        Data.Address.equal prev.Cfa.State.ip v'.Cfa.State.ip &&
           prev.Cfa.State.ctx.Cfa.State.addr_sz = v'.Cfa.State.ctx.Cfa.State.addr_sz &&
             prev.Cfa.State.ctx.Cfa.State.op_sz = v'.Cfa.State.ctx.Cfa.State.op_sz &&
               (* fixpoint reached *)
@@ -501,12 +845,12 @@ module Make(D: Domain.T): (T with type domain = D.t) =
             else
               (* explore if a greater abstract state of v has already been explored *)
               if subsuming then
-		Cfa.iter_vertex (fun prev ->
-                  if v.Cfa.State.id = prev.Cfa.State.id then
+		List.iter (fun prev ->
+                  if v.Cfa.State.id = prev.Cfa.State.id || D.is_bot prev.Cfa.State.v then
                     ()
                   else
                     if same prev v then raise Exit
-                ) g;
+                ) (Cfa.states_at g v.Cfa.State.ip);
             v::l
           with
             Exit -> l
@@ -518,21 +862,152 @@ module Make(D: Domain.T): (T with type domain = D.t) =
       method value_of_register r = D.value_of_register s r
     end
       
-    (** fixpoint iterator to build the CFA corresponding to the provided code starting from the initial vertex s. 
-     g is the initial CFA reduced to the singleton s *) 
-    let forward_bin (code: Code.t) (g: Cfa.t) (s: Cfa.State.t) (dump: Cfa.t -> unit): Cfa.t =
-      let module Vertices = Set.Make(Cfa.State) in
-      (* check whether the instruction pointer is in the black list of addresses to decode *)
-      if Config.SAddresses.mem (Data.Address.to_int s.Cfa.State.ip) !Config.blackAddresses then
-        L.abort (fun p -> p "Interpreter not started as the entry point belongs to the cut off branches\n");
+    (** everything needed to continue forward_bin from a checkpoint.
+    It is marshalled as a single value so that the states shared by the CFA, the waiting set
+    and the function stack are still shared once loaded *)
+    type checkpoint = {
+	ck_cfa: Cfa.t;
+	ck_waiting: Cfa.State.t list;
+	ck_decoder: Decoder.segment_t;
+	ck_fun_stack: ((string * string) option * Data.Address.t * Cfa.State.t * (Data.Address.t, int * D.t) Hashtbl.t * call_t) list;
+	ck_unroll_tbl: (Data.Address.t, int * D.t) Hashtbl.t;
+	ck_fun_unroll_tbl: (Data.Address.t, int) Hashtbl.t;
+	ck_unroll_nb: int option;
+	ck_state_cpt: int;
+	ck_summaries: (Data.Address.t, call_t list) Hashtbl.t;
+	ck_joins: (Data.Address.t, unit) Hashtbl.t;
+      }
+
+    (** checkpoint files: the magic string, the format version, the vector representation and the digest of the
+    analysed binary, each one preceded by its length, then the marshalled checkpoint. Marshal is not type safe: a
+    checkpoint is only loaded by an analysis that has the same format, vector representation and binary *)
+    let checkpoint_magic = "BINCATCKPT"
+
+    let checkpoint_version = 1
+
+    (** header fields of a checkpoint of the current analysis *)
+    let checkpoint_header () =
+      let vector =
+	match !Config.vector with
+	| Config.Bits -> "bits"
+	| Config.Packed -> "packed"
+      in
+      [ checkpoint_magic; string_of_int checkpoint_version; vector; Digest.to_hex (Digest.file !Config.binary) ]
+
+    let write_checkpoint g waiting d fun_stack =
+      let fname = !Config.checkpoint_file in
+      let ck = {
+	  ck_cfa = g;
+	  ck_waiting = Vertices.elements waiting;
+	  ck_decoder = d;
+	  ck_fun_stack = fun_stack;
+	  ck_unroll_tbl = !unroll_tbl;
+	  ck_fun_unroll_tbl = fun_unroll_tbl;
+	  ck_unroll_nb = !unroll_nb;
+	  ck_state_cpt = !Cfa.State.state_cpt;
+	  ck_summaries = summaries;
+	  ck_joins = joins;
+	}
+      in
+      (* the previous checkpoint is replaced only once the new one is complete *)
+      let tmp = fname ^ ".tmp" in
+      let f = open_out_bin tmp in
+      List.iter (fun field -> output_binary_int f (String.length field); output_string f field) (checkpoint_header ());
+      Marshal.to_channel f ck [];
+      close_out f;
+      Sys.rename tmp fname;
+      L.analysis (fun p -> p "checkpoint saved into %s (%d states)" fname !Cfa.State.state_cpt)
+
+    (** loads the given checkpoint file and restores the global tables of the fixpoint engine *)
+    let read_checkpoint fname =
+      let f =
+	try open_in_bin fname
+	with Sys_error _ -> L.abort (fun p -> p "Failed to open the checkpoint file %s" fname)
+      in
+      let input_field () =
+	let n = input_binary_int f in
+	(* the fields are short: a larger length is not the one of a header field *)
+	if n < 0 || n > 64 then raise End_of_file;
+	really_input_string f n
+      in
+      let fields = try List.map (fun _ -> input_field ()) (checkpoint_header ()) with End_of_file -> [] in
+      begin
+	match fields, checkpoint_header () with
+	| [ magic; version; vector; digest ], [ _; version'; vector'; digest' ] when magic = checkpoint_magic ->
+	   let check name v v' =
+	     if v <> v' then
+	       begin
+		 close_in f;
+		 L.abort (fun p -> p "checkpoint file %s has the %s %s instead of %s" fname name v v')
+	       end
+	   in
+	   check "format version" version version';
+	   check "vector representation" vector vector';
+	   check "binary digest" digest digest'
+	| _ ->
+	   close_in f;
+	   L.abort (fun p -> p "%s is not a checkpoint file of BinCAT" fname)
+      end;
+      let (ck: checkpoint) =
+	try Marshal.from_channel f
+	with End_of_file | Failure _ ->
+	  close_in f;
+	  L.abort (fun p -> p "checkpoint file %s is truncated" fname)
+      in
+      close_in f;
+      unroll_tbl := ck.ck_unroll_tbl;
+      Hashtbl.reset fun_unroll_tbl;
+      Hashtbl.iter (Hashtbl.replace fun_unroll_tbl) ck.ck_fun_unroll_tbl;
+      unroll_nb := ck.ck_unroll_nb;
+      Cfa.State.state_cpt := ck.ck_state_cpt;
+      Hashtbl.reset summaries;
+      Hashtbl.iter (Hashtbl.replace summaries) ck.ck_summaries;
+      Hashtbl.reset joins;
+      Hashtbl.iter (Hashtbl.replace joins) ck.ck_joins;
+      L.analysis (fun p -> p "analysis resumed from checkpoint %s (%d states)" fname ck.ck_state_cpt);
+      ck
+
+    (** result of a step of forward_bin computed by a worker process *)
+    type speculation =
+      | Replay (** the step has to be computed again by the main process *)
+      | Step of step_t
+
+    and step_t = {
+	sp_ctx: Cfa.State.ctx_t; (** decoding context of the processed state *)
+	sp_stmts: Asm.stmt list; (** statements of the processed state *)
+	sp_bytes: char list;     (** bytes of the processed state *)
+	sp_block: int list;      (** instruction lengths of the processed state (see Config.block_nodes) *)
+	sp_tainted: bool;        (** taint flag of the processed state *)
+	sp_succs: Cfa.State.t list; (** states created by the step (successors of the processed state) ordered by id *)
+	sp_new: int list;        (** ids of the created states that are returned by the step *)
+	sp_unroll: (Data.Address.t * (int * D.t)) list; (** updated entries of unroll_tbl *)
+	sp_base: int;            (** state counter at the start of the step *)
+	sp_start: Decoder.segment_t; (** state of the decoder at the start of the step *)
+	sp_cpt: int;             (** state counter at the end of the step *)
+	sp_cid: int;             (** register counter at the end of the step *)
+	sp_decoder: Decoder.segment_t option; (** new state of the decoder. None if no instruction has been decoded *)
+      }
+
+    (** appends the first _len_ bytes of the given file to the log file *)
+    let append_log fname len =
+      let f = open_in_bin fname in
+      let s = really_input_string f len in
+      close_in f;
+      output_string !Log.logfid s;
+      flush !Log.logfid
+
+    (** fixpoint iterator of forward_bin from the given CFA, waiting vertices, decoder state and function stack *)
+    let forward_bin_from (code: Code.t) (g: Cfa.t) (vertices: Cfa.State.t list) (d0: Decoder.segment_t) fun_stack0 (dump: Cfa.t -> unit): Cfa.t =
       (* boolean variable used as condition for exploration of the CFA *)
-      let continue = ref true		      in
+      let continue = ref (vertices <> [])	in
       (* set of waiting nodes in the CFA waiting to be processed *)
-      let waiting  = ref (Vertices.singleton s) in
-      (* set d to the initial internal state of the decoder *)
-      let d = ref (Decoder.init ())             in
+      let waiting  = ref (List.fold_left (fun w v -> Vertices.add v w) Vertices.empty vertices) in
+      (* internal state of the decoder *)
+      let d = ref d0                            in
       (* function stack *)
-      let fun_stack = ref []                    in
+      let fun_stack = ref fun_stack0            in
+      (* time of the last checkpoint *)
+      let last_checkpoint = ref (Unix.gettimeofday ()) in
       let hash_add_or_append htbl key rules = try
         let existing = Hashtbl.find htbl key in
             Hashtbl.replace htbl key (rules @ existing)
@@ -584,49 +1059,499 @@ module Make(D: Domain.T): (T with type domain = D.t) =
         ) tbl)
         [(Config.mem_override, Data.Address.Global) ;
          (Config.stack_override, Data.Address.Stack) ; (Config.heap_override, Data.Address.Heap)];
-      while !continue do
-        (* a waiting node is randomly chosen to be explored *)
-        let v = Vertices.choose !waiting in
-        waiting := Vertices.remove v !waiting;
-        begin
-          try
-            (* the subsequence of instruction bytes starting at the offset provided the field ip of v is extracted *)
-            let text'        = Code.sub code v.Cfa.State.ip						         in
-            (* the corresponding instruction is decoded and the successor vertex of v are computed and added to    *)
-            (* the CFA                                                                                             *)
-            (* except the abstract value field which is set to v.Cfa.State.value. The right value will be          *)
-            (* computed next step                                                                                  *)
-            (* the new instruction pointer (offset variable) is also returned                                      *)
-            let r = Decoder.parse text' g !d v v.Cfa.State.ip (new decoder_oracle v.Cfa.State.v)                   in
-            match r with
-            | Some (v, ip', d') ->
-               (* these vertices are updated by their right abstract values and the new ip                         *)
-               let new_vertices = update_abstract_value g v ip' (process_stmts fun_stack)                in
-	       	(* add overrides if needed *)
-	       let new_vertices =
+      (* decodes v and computes its successors with their abstract values. Returns also the new state of the decoder *)
+      let successors v =
+        unroll_keys := [];
+        step_calls := [];
+        step_returns := [];
+        (* a cursor on the instruction bytes starting at the offset provided the field ip of v is built (no copy) *)
+        let text'        = Code.sub code v.Cfa.State.ip						         in
+        (* the corresponding instruction is decoded and the successor vertex of v are computed and added to    *)
+        (* the CFA                                                                                             *)
+        (* except the abstract value field which is set to v.Cfa.State.value. The right value will be          *)
+        (* computed next step                                                                                  *)
+        (* the new instruction pointer (offset variable) is also returned                                      *)
+        let r = profiled v.Cfa.State.ip (fun p t -> p.p_decoding <- p.p_decoding +. t)
+		  (fun () -> Decoder.parse text' g !d v v.Cfa.State.ip (new decoder_oracle v.Cfa.State.v))       in
+        match r with
+        | Some (v, ip', d') ->
+           (* these vertices are updated by their right abstract values and the new ip                         *)
+           let process_stmts g v ip =
+             profiled v.Cfa.State.ip (fun p t -> p.p_stmts <- p.p_stmts +. t) (fun () -> process_stmts fun_stack g v ip)
+           in
+           let new_vertices = update_abstract_value g v ip' process_stmts                            in
+	   (* add overrides if needed *)
+	   let new_vertices =
+	     try
+	       let rules = Hashtbl.find overrides v.Cfa.State.ip in
+	       L.analysis (fun p -> p "applied tainting (%d) override(s)" (List.length rules));
+	       List.map (fun v ->
+		 v.Cfa.State.v <- List.fold_left (fun d f -> f d) v.Cfa.State.v rules; v) new_vertices
+	     with
+	       Not_found -> new_vertices
+	   in
+	   let new_vertices =
+	     if !Config.function_summaries then summarize g new_vertices fun_stack (fun () -> Vertices.elements !waiting)
+	     else new_vertices
+	   in
+	   Some (v, new_vertices, d')
+        | None -> None
+      in
+      (* true whenever the given successor of a state is inside the same basic block, that is its address is neither
+      the one of another state (join point), nor one where overrides are applied or a node is requested *)
+      let inside_block v' =
+	let a = Data.Address.to_int v'.Cfa.State.ip in
+	not (Hashtbl.mem overrides v'.Cfa.State.ip) &&
+	  not (Config.SAddresses.mem a !Config.node_addresses) &&
+	    not (Config.SAddresses.mem a !Config.blackAddresses) &&
+	      List.for_all (fun s -> s == v') (Cfa.states_at g v'.Cfa.State.ip)
+      in
+      (* successors of v when the CFA has a node per basic block (Config.block_nodes): while the last decoded
+      instruction has a single successor reached without jump and inside the block, this successor is decoded
+      and merged into v. The returned vertices are the successors of the last instruction of the block *)
+      let block_successors v =
+	let rec extend last r =
+	  match r with
+	  | Some (_, [v'], d') when not (has_jmp last.Cfa.State.stmts) && inside_block v' ->
+	     let keys = !unroll_keys in
+	     count v'.Cfa.State.ip (fun p -> p.p_visits <- p.p_visits + 1);
+	     d := d';
+	     let r' = successors v' in
+	     unroll_keys := !unroll_keys @ keys;
+	     begin
+	       match r' with
+	       | Some _ ->
+		  fun_stack := List.map (fun (f, ip, c, tbl, call) -> f, ip, (if c == v' then v else c), tbl, call) !fun_stack;
+		  Cfa.merge_state g v v';
+		  extend v' r'
+	       (* v' could not be decoded: it is kept as the last node of the path *)
+	       | None -> Some (v, [], d')
+	     end
+	  | Some (_, l, d') -> Some (v, l, d')
+	  | None -> None
+	in
+	(* v may be a block node of a previous analysis that is computed again (see reanalyze) *)
+	v.Cfa.State.block <- [];
+	let r = successors v in
+	if !Config.block_nodes then extend v r
+	else r
+      in
+      (* true whenever the abstract value of the processed state v is kept with respect to Config.retention.
+      The abstract values of the call sites are always kept as the stubs of imported functions read them,
+      and the ones of the states at the addresses of joins as they are compared with the next states *)
+      let retained v =
+	match !Config.retention with
+	| Config.All -> true
+	| policy ->
+	   Config.SAddresses.mem (Data.Address.to_int v.Cfa.State.ip) !Config.retained_addresses ||
+	     Hashtbl.mem joins v.Cfa.State.ip || has_call v.Cfa.State.stmts ||
+	       begin
 		 try
-		   let rules = Hashtbl.find overrides v.Cfa.State.ip in
-		   L.analysis (fun p -> p "applied tainting (%d) override(s)" (List.length rules));
-		   List.map (fun v ->
-		     v.Cfa.State.v <- List.fold_left (fun d f -> f d) v.Cfa.State.v rules; v) new_vertices
-		 with
-		   Not_found -> new_vertices
-	       in
-	       (* among these computed vertices only new are added to the waiting set of vertices to compute       *)
-               let vertices'  = filter_vertices true g new_vertices in
-               List.iter (fun v -> waiting := Vertices.add v !waiting) vertices';
-               (* udpate the internal state of the decoder *)
-               d := d'
-            | None -> ()
-          with
-          | Exceptions.Error msg 	  -> dump g; L.abort (fun p -> p "%s" msg)
-          | Exceptions.Enum_failure -> dump g; L.abort (fun p -> p "analysis stopped (computed value too much imprecise)")
-          | e			  -> dump g; raise e
-        end;
+		   let p = Cfa.pred g v in
+		   begin
+		     match policy with
+		     | Config.Block_entries -> !Config.block_nodes || has_jmp p.Cfa.State.stmts || List.length (Cfa.succs g p) > 1
+		     | Config.Function_entries -> has_call p.Cfa.State.stmts
+		     | _ -> false
+		   end
+		 (* entry point *)
+		 with Invalid_argument _ -> true
+	       end
+      in
+      (* among the computed vertices only new are added to the waiting set of vertices to compute *)
+      let insert v new_vertices d' =
+        let vertices'  =
+          profiled v.Cfa.State.ip (fun p t -> p.p_filtering <- p.p_filtering +. t) (fun () -> filter_vertices true g new_vertices)
+        in
+        List.iter (fun v -> waiting := Vertices.add v !waiting) vertices';
+        if Log.tracing () then
+          List.iter (fun v -> trace (if List.memq v vertices' then Log.Explore else Log.Subsumed) v) new_vertices;
+        (* udpate the internal state of the decoder *)
+        d := d';
+	(* the targets of backward jumps are marked before being processed as they are the heads of the loops *)
+	List.iter (fun v' ->
+	  if Data.Address.compare v'.Cfa.State.ip v.Cfa.State.ip <= 0 || List.exists (fun s -> s != v') (Cfa.states_at g v'.Cfa.State.ip) then
+	    Hashtbl.replace joins v'.Cfa.State.ip ()) new_vertices;
+	(* the successors of v are computed: its abstract value is no more needed unless it is retained *)
+	if not (retained v) then v.Cfa.State.v <- D.bot;
+	Cfa.stream_state g v
+      in
+      (* sequential step of the fixpoint on v *)
+      let step v =
+        trace Log.Visit v;
+        count v.Cfa.State.ip (fun p -> p.p_visits <- p.p_visits + 1);
+        try
+          match block_successors v with
+          | Some (v, new_vertices, d') -> insert v new_vertices d'
+          | None -> ()
+        with
+        | Exceptions.Error msg 	  -> dump g; L.abort (fun p -> p "%s" msg)
+        | Exceptions.Enum_failure -> dump g; L.abort (fun p -> p "analysis stopped (computed value too much imprecise)")
+        | e			  -> dump g; raise e
+      in
+      (* step of the fixpoint on v computed by a worker process. Only the changes of the CFA and of unroll_tbl are returned.
+      Replay is returned if the step has updated other shared data. Otherwise the function that adds the new
+      vertices to the CFA of the worker is also returned so that the worker can go on with its next vertex *)
+      let speculate v =
+        let base = !Cfa.State.state_cpt in
+        let start = !d in
+        shared_writes := 0;
+        try
+          let r = block_successors v in
+          if !shared_writes > 0 then (Replay, None)
+          else
+            let succs = List.sort Cfa.State.compare (List.filter (fun s -> s.Cfa.State.id > base) (Cfa.succs g v)) in
+            let new_vertices, decoder =
+              match r with
+              | Some (_, l, d') -> l, Some d'
+              | None -> [], None
+            in
+            if List.exists (fun s -> not (List.memq s succs)) new_vertices then (Replay, None)
+            else
+              (Step {
+                  sp_ctx = v.Cfa.State.ctx;
+                  sp_stmts = v.Cfa.State.stmts;
+                  sp_bytes = v.Cfa.State.bytes;
+                  sp_block = v.Cfa.State.block;
+                  sp_tainted = v.Cfa.State.is_tainted;
+                  sp_succs = succs;
+                  sp_new = List.map (fun s -> s.Cfa.State.id) new_vertices;
+                  sp_unroll = List.map (fun a -> a, Hashtbl.find !unroll_tbl a) (List.sort_uniq Data.Address.compare !unroll_keys);
+                  sp_base = base;
+                  sp_start = start;
+                  sp_cpt = !Cfa.State.state_cpt;
+                  sp_cid = Register.next_id ();
+                  sp_decoder = decoder;
+                },
+              Some (fun () -> match r with Some (v', l, d') -> insert v' l d' | None -> ()))
+        with _ -> Replay, None
+      in
+      (* steps of the worker on the vertices vs, in this order, until one of them has to be replayed. Every step
+      is returned marshalled before its new vertices are added to the CFA of the worker, with the length of the log
+      file at its end *)
+      let rec speculate_batch vs =
+        match vs with
+        | [] -> []
+        | v::vs' ->
+           let r, next = speculate v in
+           let sp = Marshal.to_string (r: speculation) [] in
+           flush !Log.logfid;
+           let res = sp, pos_out !Log.logfid in
+           match next with
+           | Some add -> add (); res::(speculate_batch vs')
+           | None -> [res]
+      in
+      (* forks a worker process computing the steps of the vertices vs. Its log messages are written into a temporary file *)
+      let spawn vs =
+        let logname = Filename.temp_file "bincat" ".log" in
+        let rd, wr = Unix.pipe () in
+        match Unix.fork () with
+        | 0 ->
+           Unix.close rd;
+           Log.logfid := open_out logname;
+           (* the events of the worker are not traced *)
+           Log.trace_fid := None;
+           let res = speculate_batch vs in
+           let c = Unix.out_channel_of_descr wr in
+           Marshal.to_channel c res [];
+           close_out c;
+           close_out !Log.logfid;
+           exit 0
+        | pid ->
+           Unix.close wr;
+           pid, Unix.in_channel_of_descr rd, logname
+      in
+      let release (pid, c, logname) =
+        close_in c;
+        ignore (Unix.waitpid [] pid);
+        Sys.remove logname
+      in
+      (* the result of the worker is not used and its vertices are put back into the waiting set *)
+      let discard (vs, ((pid, _, _) as w)) =
+        (try Unix.kill pid Sys.sigkill with Unix.Unix_error _ -> ());
+        release w;
+        List.iter (fun v -> waiting := Vertices.add v !waiting) vs
+      in
+      (* adds to g the result of the step of v computed by a worker. The created states are numbered as in a
+      sequential exploration *)
+      let apply v sp =
+        let offset = !Cfa.State.state_cpt - sp.sp_base in
+        trace Log.Visit v;
+        count v.Cfa.State.ip (fun p -> p.p_visits <- p.p_visits + 1);
+        v.Cfa.State.ctx <- sp.sp_ctx;
+        v.Cfa.State.stmts <- sp.sp_stmts;
+        v.Cfa.State.bytes <- sp.sp_bytes;
+        v.Cfa.State.block <- sp.sp_block;
+        v.Cfa.State.is_tainted <- sp.sp_tainted;
+        let succs = List.map (fun s -> { s with Cfa.State.id = s.Cfa.State.id + offset }) sp.sp_succs in
+        List.iter (fun s -> Cfa.add_vertex g s; Cfa.add_edge g v s) succs;
+        Cfa.State.state_cpt := sp.sp_cpt + offset;
+        Register.reserve_ids sp.sp_cid;
+        List.iter (fun (a, e) -> Hashtbl.replace !unroll_tbl a e) sp.sp_unroll;
+        match sp.sp_decoder with
+        | Some d' -> insert v (List.map (fun id -> List.find (fun s -> s.Cfa.State.id = id + offset) succs) sp.sp_new) d'
+        | None -> ()
+      in
+      (* explores the first waiting vertices in parallel. Every worker computes the steps of a batch of worker_batch
+      consecutive vertices of the waiting set from the current CFA, a fork being too costly for a single step. The
+      results are then added in the order of the waiting set as long as they are the ones of the sequential
+      exploration, that is while:
+      - the vertex is still the next one to explore (the previous steps may have added smaller vertices) ;
+      - the state of the decoder is the one the step has started from ;
+      - the steps of the previous workers have not changed the same entries of unroll_tbl ;
+      - the step has not updated other shared data (see shared_writes).
+      The first step that does not satisfy the last three conditions is computed again sequentially.
+      The remaining vertices are put back into the waiting set. If there are not enough waiting vertices for two
+      workers then one step is computed sequentially *)
+      let parallel_round () =
+        let rec take n =
+          if n = 0 || Vertices.is_empty !waiting then []
+          else
+            let v = Vertices.min_elt !waiting in
+            waiting := Vertices.remove v !waiting;
+            v::(take (n-1))
+        in
+        let rec split vs =
+          match vs with
+          | [] -> []
+          | _ ->
+             let rec chunk n vs = if n = 0 then [], vs else match vs with [] -> [], [] | v::vs' -> let c, r = chunk (n-1) vs' in v::c, r in
+             let c, rest = chunk worker_batch vs in
+             c::(split rest)
+        in
+        match split (take (!Config.workers * worker_batch)) with
+        | [] -> ()
+        | [v::vs] ->
+           List.iter (fun v -> waiting := Vertices.add v !waiting) vs;
+           step v
+        | batches ->
+           (* nothing buffered must be written twice *)
+           flush_all ();
+           let workers = List.map (fun vs -> vs, spawn vs) batches in
+           let rec merge workers keys =
+             match workers with
+             | [] -> ()
+             | (vs, ((_, c, logname) as w))::workers' ->
+                let results = try (Marshal.from_channel c: (string * int) list) with End_of_file | Failure _ -> [] in
+                (* applies the steps of the worker. Returns the keys of unroll_tbl updated by the worker if all its
+                steps have been applied *)
+                let rec apply_steps vs results own log_len =
+                  let stop () = append_log logname log_len; release w; List.iter discard workers' in
+                  match vs, results with
+                  | [], _ -> append_log logname log_len; release w; Some own
+                  | v::vs', _ when (Vertices.min_elt (Vertices.add v !waiting)).Cfa.State.id <> v.Cfa.State.id ->
+                     stop ();
+                     List.iter (fun v -> waiting := Vertices.add v !waiting) (v::vs');
+                     None
+                  | v::vs', (r, len)::results' ->
+                     begin
+                       match (Marshal.from_string r 0: speculation) with
+                       | Step sp when !d = sp.sp_start && not (List.exists (fun (a, _) -> List.exists (Data.Address.equal a) keys) sp.sp_unroll) ->
+                          apply v sp;
+                          apply_steps vs' results' ((List.map fst sp.sp_unroll) @ own) len
+                       | _ ->
+                          stop ();
+                          List.iter (fun v -> waiting := Vertices.add v !waiting) vs';
+                          step v;
+                          None
+                     end
+                  | v::vs', [] ->
+                     stop ();
+                     List.iter (fun v -> waiting := Vertices.add v !waiting) vs';
+                     step v;
+                     None
+                in
+                match apply_steps vs results [] 0 with
+                | Some own -> merge workers' (own @ keys)
+                | None -> ()
+           in
+           merge workers []
+      in
+      while !continue do
+        if !Config.workers > 1 then
+          parallel_round ()
+        else
+          begin
+            (* the next waiting node is chosen with respect to the exploration strategy *)
+            let v = Vertices.min_elt !waiting in
+            waiting := Vertices.remove v !waiting;
+            step v
+          end;
         (* boolean condition of loop iteration is updated *)
         continue := not (Vertices.is_empty !waiting);
+        if !continue && out_of_budget (Cfa.nb_states g) then
+          begin
+            (* the waiting states are saved so that the analysis can be resumed (see Config.resume_from) *)
+            if !Config.checkpoint_file <> "" then
+              write_checkpoint g !waiting !d !fun_stack;
+            continue := false
+          end;
+        if !continue && !Config.checkpoint_file <> "" && Unix.gettimeofday () -. !last_checkpoint >= float_of_int !Config.checkpoint_period then
+          begin
+            write_checkpoint g !waiting !d !fun_stack;
+            last_checkpoint := Unix.gettimeofday ()
+          end
       done;
+      Decoder.log_cache_stats ();
+      if !Config.flag_liveness then
+	Decoder.log_liveness_stats ();
+      if !Config.function_summaries then
+	begin
+	  close_calls (Vertices.is_empty !waiting);
+	  L.analysis (fun p -> p "function summaries: %d hit(s), %d miss(es), %d summaries" !summary_hits !summary_misses
+	    (Hashtbl.fold (fun _ l n -> n + (List.length l)) summaries 0))
+	end;
+      D.log_stats ();
       g								      
+
+    (** fixpoint iterator to build the CFA corresponding to the provided code starting from the initial vertex s. 
+     g is the initial CFA reduced to the singleton s *) 
+    let forward_bin (code: Code.t) (g: Cfa.t) (s: Cfa.State.t) (dump: Cfa.t -> unit): Cfa.t =
+      (* check whether the instruction pointer is in the black list of addresses to decode *)
+      if Config.SAddresses.mem (Data.Address.to_int s.Cfa.State.ip) !Config.blackAddresses then
+        L.abort (fun p -> p "Interpreter not started as the entry point belongs to the cut off branches\n");
+      forward_bin_from code g [s] (Decoder.init ()) [] dump
+
+    (** [forward_bin_batch code eps dump] runs forward_bin from every entry point of _eps_ one after the other (see
+    Config.entry_points). The decoded instructions, the import table, the function summaries and the initial abstract
+    value are shared by these analyses. Every entry point gets its own CFA whose states have the range of ids
+    recorded into Cfa.entry_ranges. These CFAs are gathered into the returned one *)
+    let forward_bin_batch (code: Code.t) (eps: Data.Address.t list) (dump: Cfa.t -> unit): Cfa.t =
+      let d0 = Decoder.init () in
+      let v0 = Cfa.init_abstract_value () in
+      let analyse gs ep =
+	if Config.SAddresses.mem (Data.Address.to_int ep) !Config.blackAddresses then
+	  begin
+	    L.analysis (fun p -> p "entry point %s ignored as it belongs to the cut off branches" (Data.Address.to_string ep));
+	    gs
+	  end
+	else
+	  begin
+	    L.analysis (fun p -> p "analysis from entry point %s" (Data.Address.to_string ep));
+	    (* the unrolling counters are specific to an entry point *)
+	    unroll_tbl := Hashtbl.create 1000;
+	    Hashtbl.clear fun_unroll_tbl;
+	    Hashtbl.clear joins;
+	    unroll_nb := None;
+	    let s = Cfa.init_entry ep v0 in
+	    let g = Cfa.create () in
+	    Cfa.add_vertex g s;
+	    begin
+	      (* an error stops the analysis from this entry point only *)
+	      try ignore (forward_bin_from code g [s] d0 [] dump)
+	      with Exceptions.Error msg ->
+		close_calls false;
+		L.analysis (fun p -> p "analysis from entry point %s stopped: %s" (Data.Address.to_string ep) msg)
+	    end;
+	    let last = Cfa.fold_vertex (fun v n -> max v.Cfa.State.id n) g s.Cfa.State.id in
+	    Cfa.entry_ranges := (ep, s.Cfa.State.id, last)::!Cfa.entry_ranges;
+	    g::gs
+	  end
+      in
+      let gs = List.rev (List.fold_left analyse [] eps) in
+      let g = Cfa.create () in
+      List.iter (fun g' ->
+	Cfa.iter_vertex (Cfa.add_vertex g) g';
+	Cfa.iter_vertex (fun v -> List.iter (Cfa.add_edge g v) (Cfa.succs g' v)) g') gs;
+      g
+
+    let resume_bin (code: Code.t) (fname: string) (dump: Cfa.t -> unit): Cfa.t =
+      let ck = read_checkpoint fname in
+      (* the import table is built from the configuration as in Decoder.init *)
+      Decoder.init_imports ();
+      forward_bin_from code ck.ck_cfa ck.ck_waiting ck.ck_decoder ck.ck_fun_stack dump
+
+    (** [reanalyze code g addrs dump] updates the CFA _g_ of a previous forward_bin analysis whose overrides at the
+    addresses _addrs_ have changed. As overrides apply to the successors of the states at their address, the states
+    that cannot be reached from the states at these addresses are kept. The other ones are computed again *)
+    let reanalyze (code: Code.t) (g: Cfa.t) (addrs: Data.Address.t list) (dump: Cfa.t -> unit): Cfa.t =
+      (* nearest predecessor of s whose abstract value has been kept (see Config.retention).
+      Raises Not_found if there is none *)
+      let rec known_pred s =
+	let p = try Cfa.pred g s with Invalid_argument _ -> raise Not_found in
+	if D.is_bot p.Cfa.State.v then known_pred p else p
+      in
+      (* true whenever the instruction at a is inside the basic block node s, after its first instruction *)
+      let inside s a =
+	let _, found =
+	  List.fold_left (fun (o, found) n ->
+	    o+n, found || (o > 0 && Data.Address.equal (Data.Address.add_offset s.Cfa.State.ip (Z.of_int o)) a))
+	    (0, false) s.Cfa.State.block
+	in
+	found
+      in
+      (* states from which the analysis restarts for the address a: the states at a and the block nodes
+      containing a, or their nearest known predecessor if their abstract value has not been kept *)
+      let restart a =
+	let l = Cfa.fold_vertex (fun s l -> if inside s a then s::l else l) g (Cfa.states_at g a) in
+	List.map (fun s -> if D.is_bot s.Cfa.State.v then known_pred s else s) l
+      in
+      (* removes from g every state reachable from the successors of s *)
+      let removed = Hashtbl.create 100 in
+      let remove_succs s =
+	let q = Queue.create () in
+	List.iter (fun s' -> Queue.add s' q) (Cfa.succs g s);
+	while not (Queue.is_empty q) do
+	  let s' = Queue.take q in
+	  if not (Hashtbl.mem removed s'.Cfa.State.id) then
+	    begin
+	      Hashtbl.add removed s'.Cfa.State.id ();
+	      List.iter (fun s'' -> Queue.add s'' q) (Cfa.succs g s');
+	      Cfa.remove_state g s'
+	    end
+	done
+      in
+      (* function stack at the state s, replayed along the path from the entry point to s. The unrolling counters
+      of the callers are not known and start again from zero *)
+      let fun_stack_at s =
+	let rec path s l =
+	  match (try Some (Cfa.pred g s) with Invalid_argument _ -> None) with
+	  | Some p -> path p (s::l)
+	  | None -> s::l
+	in
+	let rec replay stack l =
+	  match l with
+	  | v::((v'::_) as l') ->
+	     let ip = Data.Address.add_offset v.Cfa.State.ip (Z.of_int (List.length v.Cfa.State.bytes)) in
+	     let stack' =
+	       if has_call v.Cfa.State.stmts && not (Data.Address.equal v'.Cfa.State.ip ip) then
+		 let f =
+		   try Some (Hashtbl.find Config.import_tbl (Data.Address.to_int v'.Cfa.State.ip))
+		   with Not_found -> None
+		 in
+		 let c = new_call v'.Cfa.State.ip ip in
+		 (f, ip, v, Hashtbl.create 1000, c)::stack
+	       else
+		 match stack with
+		 | (_, ret, _, _, _)::stack'' when has_jmp v.Cfa.State.stmts && Data.Address.equal v'.Cfa.State.ip ret -> stack''
+		 | _ -> stack
+	     in
+	     replay stack' l'
+	  | _ -> stack
+	in
+	replay [] (path s [])
+      in
+      match (try Some (List.sort_uniq Cfa.State.compare (List.concat (List.map restart addrs))) with Not_found -> None) with
+      | Some starts ->
+	 (* the starts are sorted by id: a start removed by a previous one is skipped *)
+	 List.iter (fun s -> if not (Hashtbl.mem removed s.Cfa.State.id) then remove_succs s) starts;
+	 let starts = List.filter (fun s -> not (Hashtbl.mem removed s.Cfa.State.id)) starts in
+	 L.analysis (fun p -> p "overrides changed: %d state(s) removed, analysis restarted from %d state(s)"
+	   (Hashtbl.length removed) (List.length starts));
+	 let fun_stack =
+	   match starts with
+	   | s::_ -> fun_stack_at s
+	   | [] -> []
+	 in
+	 forward_bin_from code g starts (Decoder.init ()) fun_stack dump
+      | None ->
+	 (* no abstract value is known before a changed override: the whole analysis is done again *)
+	 L.analysis (fun p -> p "overrides changed: analysis restarted from scratch");
+	 let ep = Data.Address.of_int Data.Address.Global !Config.ep !Config.address_sz in
+	 let s = Cfa.init ep in
+	 let g' = Cfa.create () in
+	 Cfa.add_vertex g' s;
+	 forward_bin code g' s dump
 	
    
     (******************** BACKWARD *******************************)
@@ -670,6 +1595,7 @@ module Make(D: Domain.T): (T with type domain = D.t) =
 	| Directive (Unroll_until _) -> d, false
 	| Directive Default_unroll -> d, false
 	| Directive (Stub _) -> d, false
+	| Directive (Rep _) -> D.forget d, false
 	| Set (dst, src) -> back_set dst src d
 	| Assert (_bexp, _msg) -> d, false (* TODO *)
 	| If (e, istmts, estmts) ->
@@ -747,6 +1673,7 @@ module Make(D: Domain.T): (T with type domain = D.t) =
 	| Asm.Return
 	| Asm.Call (Asm.A _) -> d, false
 	| Asm.Set (dst, src) -> D.set dst src d
+	| Asm.Directive (Asm.Rep (op, count, ptrs, sz, forward)) -> process_rep d op count ptrs sz forward
 	| Assert (_bexp, _msg) -> d, false (* TODO *)
 	| Asm.If (e, istmts, estmts) ->
 	   begin
@@ -787,20 +1714,22 @@ module Make(D: Domain.T): (T with type domain = D.t) =
 	  L.abort (fun p -> p "analysis not started: empty meet with previous computed value")
 	end
       else
-	let module Vertices = Set.Make(Cfa.State) in
 	let continue = ref true in
 	let waiting = ref (Vertices.singleton s) in
+	(* the states of the loaded CFA are not counted in the node budget *)
+	let loaded = Cfa.nb_states g in
 	try
 	  while !continue do
-	    let v = Vertices.choose !waiting in	
+	    let v = Vertices.min_elt !waiting in	
 	    waiting := Vertices.remove v !waiting;
 	    let v' = next g v in
 	    let new_vertices = List.fold_left (fun l v' -> (update_abstract_value g v v'.Cfa.State.ip [v'])@l) [] v' in
 	    let new_vertices' = List.map (unroll g v) new_vertices in
 	    let vertices' = filter_vertices false g new_vertices' in
 	    List.iter (fun v -> waiting := Vertices.add v !waiting) vertices';
-	    continue := not (Vertices.is_empty !waiting)
+	    continue := not (Vertices.is_empty !waiting) && not (out_of_budget (Cfa.nb_states g - loaded))
 	  done;
+	  D.log_stats ();
 	  g
 	with
 	| Invalid_argument _ -> L.analysis (fun p -> p "entry node of the CFA reached"); g
@@ -18,6 +18,36 @@
 
 module L = Log.Make(struct let name = "main" end)
 
+(** modules of the analyses with a given representation of the vectors *)
+module type Analyzer =
+  sig
+    module Domain: Domain.T
+    module Interpreter: Interpreter.T with type domain = Domain.t
+  end
+
+(* the modules are generated once for every representation of the vectors and kept for the next analyses run by
+the process, so that the decoded instructions can be reused (see Interpreter.reset) *)
+let analyzers: (Config.vector_t, (module Analyzer)) Hashtbl.t = Hashtbl.create 2
+
+let analyzer (vector: Config.vector_t): (module Analyzer) =
+  try Hashtbl.find analyzers vector
+  with Not_found ->
+    let module Vector =
+      (val (match vector with
+	    | Config.Bits   -> (module Vector.Make(Reduced_bit_tainting): Vector.T)
+	    | Config.Packed -> (module Packed_vector.Make(Reduced_bit_tainting): Vector.T)): Vector.T)
+    in
+    let module A =
+      struct
+	module Pointer 	   = Pointer.Make(Vector)
+	module Domain 	   = Reduced_unrel_typenv.Make(Pointer)
+	module Interpreter = Interpreter.Make(Domain)
+      end
+    in
+    let a = (module A: Analyzer) in
+    Hashtbl.add analyzers vector a;
+    a
+
 (** Entry points of the library *)
 
 (** [process cfile rfile lfile] launches an analysis run such that
@@ -27,12 +57,9 @@ module L = Log.Make(struct let name = "main" end)
 let process (configfile:string) (resultfile:string) (logfile:string): unit =
   (* cleaning global data structures *)
   Config.clear_tables();
-  Register.clear();
-  (* generating modules needed for the analysis *)
-  let module Vector 	 = Vector.Make(Reduced_bit_tainting) in
-  let module Pointer 	 = Pointer.Make(Vector)		       in
-  let module Domain 	 = Reduced_unrel_typenv.Make(Pointer)  in
-  let module Interpreter = Interpreter.Make(Domain)	       in
+  Config.reset_options();
+  (* the registers of the decoder are kept as the configuration refers to them *)
+  Register.remove_from Decoder.first_tmp_id;
   (* setting the log file *)
   Log.init logfile;
   (* setting the backtrace parameters for debugging purpose *)
@@ -67,21 +94,32 @@ let process (configfile:string) (resultfile:string) (logfile:string): unit =
       L.abort (fun p -> p "Parse error near location %s of %s" (string_of_position lexbuf) configfile)
   end;
   close_in cin;
+  if !Config.trace_file <> "" then
+    Log.trace_init !Config.trace_file;
+
+  (* modules needed for the analysis ; the vector representation is chosen in the configuration file *)
+  let module A 		 = (val analyzer !Config.vector: Analyzer) in
+  let module Domain 	 = A.Domain				   in
+  let module Interpreter = A.Interpreter			   in
+  Interpreter.reset ();
   
   (* defining the dump function to provide to the fixpoint engine *)
   let dump cfa = Interpreter.Cfa.print resultfile !Config.dotfile cfa in
   
     (* internal function to launch backward/forward analysis from a previous CFA and config *)
-    let from_cfa fixpoint =
-        let orig_cfa = Interpreter.Cfa.unmarshal !Config.in_mcfa_file in
+    (* only the abstract values of the states reachable from the entry point are loaded before the analysis:
+    following the edges if forward is true. The other ones are loaded when the results are written *)
+    let from_cfa fixpoint forward =
         let ep'      = Data.Address.of_int Data.Address.Global !Config.ep !Config.address_sz in
         let d        = Interpreter.Cfa.init_abstract_value () in
-        try
-            let prev_s = Interpreter.Cfa.last_addr orig_cfa ep' in
-            prev_s.Interpreter.Cfa.State.v <- Domain.meet prev_s.Interpreter.Cfa.State.v d;
-            fixpoint orig_cfa prev_s dump
-        with
-        | Not_found -> L.abort (fun p -> p "entry point of the analysis not in the given CFA")
+        let orig_cfa, prev_s, load_others =
+          try Interpreter.Cfa.unmarshal_from !Config.in_mcfa_file ep' forward
+          with Not_found -> L.abort (fun p -> p "entry point of the analysis not in the given CFA")
+        in
+        prev_s.Interpreter.Cfa.State.v <- Domain.meet prev_s.Interpreter.Cfa.State.v d;
+        let g = fixpoint orig_cfa prev_s (fun g -> load_others (); dump g) in
+        load_others ();
+        g
     in
 
     (* launching the right analysis depending on the value of !Config.analysis *)
@@ -92,13 +130,38 @@ let process (configfile:string) (resultfile:string) (logfile:string): unit =
         | Config.Forward Config.Bin ->
           (* 6: generate code *)
           let code = Code.make !Config.text !Config.rva_code !Config.ep		        in
-          (* 7: generate the nitial cfa with only an initial state *)
-          let ep' 	= Data.Address.of_int Data.Address.Global !Config.ep !Config.address_sz in
-          let s  	= Interpreter.Cfa.init ep'					        in
-          let g 	= Interpreter.Cfa.create ()					        in
-          Interpreter.Cfa.add_vertex g s;
+          if !Config.stream_results then
+            Interpreter.Cfa.stream_start resultfile;
           let cfa =
-              Interpreter.forward_bin code g s dump
+            if !Config.resume_from <> "" then
+              begin
+                (* the abstract value is not used but its computation initializes the domain (sections, mapped binary) *)
+                ignore (Interpreter.Cfa.init_abstract_value ());
+                Interpreter.resume_bin code !Config.resume_from dump
+              end
+            else if not (Config.SAddresses.is_empty !Config.changed_overrides) && Sys.file_exists !Config.in_mcfa_file then
+              begin
+                (* only the overrides have changed since the analysis that produced in_mcfa_file *)
+                ignore (Interpreter.Cfa.init_abstract_value ());
+                let addrs = List.map (fun a -> Data.Address.of_int Data.Address.Global a !Config.address_sz)
+                  (Config.SAddresses.elements !Config.changed_overrides) in
+                Interpreter.reanalyze code (Interpreter.Cfa.unmarshal !Config.in_mcfa_file) addrs dump
+              end
+            else if List.length !Config.entry_points > 1 then
+              begin
+                (* batch analysis of several entry points *)
+                let eps = List.map (fun a -> Data.Address.of_int Data.Address.Global a !Config.address_sz) !Config.entry_points in
+                Interpreter.forward_bin_batch code eps dump
+              end
+            else
+              begin
+                (* 7: generate the nitial cfa with only an initial state *)
+                let ep' 	= Data.Address.of_int Data.Address.Global !Config.ep !Config.address_sz in
+                let s  	= Interpreter.Cfa.init ep'					        in
+                let g 	= Interpreter.Cfa.create ()					        in
+                Interpreter.Cfa.add_vertex g s;
+                Interpreter.forward_bin code g s dump
+              end
           in
           (* launch an interleaving of backward/forward if an inferred property can be backward propagated *)
           if !Config.interleave then
@@ -107,10 +170,10 @@ let process (configfile:string) (resultfile:string) (logfile:string): unit =
             cfa
 
         (* forward analysis from a CFA *)
-        | Config.Forward Config.Cfa -> from_cfa Interpreter.forward_cfa
+        | Config.Forward Config.Cfa -> from_cfa Interpreter.forward_cfa true
 
         (* backward analysis from a CFA *)
-        | Config.Backward -> from_cfa Interpreter.backward
+        | Config.Backward -> from_cfa Interpreter.backward false
 
     in
 
@@ -118,8 +181,47 @@ let process (configfile:string) (resultfile:string) (logfile:string): unit =
     if !Config.store_mcfa = true then
         Interpreter.Cfa.marshal !Config.out_mcfa_file cfa;
     dump cfa;
+    if !Config.profile then
+      Interpreter.write_profile (resultfile ^ ".profile");
+    L.analysis (fun p -> p "peak heap size: %d words" (Gc.quick_stat ()).Gc.top_heap_words);
+    Log.trace_close ();
     Log.close()
 ;;
 
+(** [serve ic oc] runs the analyses requested on _ic_ until its end, one request per line made of the names of the
+configuration, result and log files separated by spaces. For every request the line "ok" or "error <message>" is
+written on _oc_ once the analysis is finished. The mapped binaries and the function headers are kept between
+the analyses as long as their file does not change. So are the decoded instructions as long as the code and the
+decoding options do not change (see analyzers) *)
+let serve (ic: in_channel) (oc: out_channel): unit =
+  let reply s =
+    output_string oc (s ^ "\n");
+    flush oc
+  in
+  try
+    while true do
+      let line = String.trim (input_line ic) in
+      if line <> "" then
+	try
+	  let configfile, resultfile, logfile = Scanf.sscanf line "%s %s %s%!" (fun c r l -> c, r, l) in
+	  if configfile = "" || resultfile = "" || logfile = "" then
+	    raise (Scanf.Scan_failure "missing file name");
+	  begin
+	    try
+	      process configfile resultfile logfile;
+	      reply "ok"
+	    with e ->
+	      (* the log and trace files of the failed analysis are closed *)
+	      (try Log.close () with Sys_error _ -> ());
+	      Log.trace_close ();
+	      match e with
+	      | Exceptions.Error msg -> reply ("error " ^ msg)
+	      | e -> reply ("error " ^ (Printexc.to_string e))
+	  end
+	with Scanf.Scan_failure _ | End_of_file -> reply "error invalid request (expected: <config file> <result file> <log file>)"
+    done
+  with End_of_file -> ()
+;;
+
 (* enables the process function to be callable from the .so *)
 Callback.register "process" process;;
@@ -53,14 +53,86 @@ type analysis_t =
 
 let analysis = ref (Forward Bin);;
 
+(* order in which the waiting states of the fixpoint iterations are explored *)
+type worklist_t =
+  | Bfs (* breadth first: states are explored in their creation order *)
+  | Dfs (* depth first: the last created state is explored first *)
+  | Address (* lowest address first, ties broken by creation order: as back edges usually target lower addresses, a loop is mostly stabilized before the code that follows it *)
+
+let worklist = ref Bfs;;
+
+(* representation of the abstract bit vectors *)
+type vector_t =
+  | Bits   (* one abstract value per bit *)
+  | Packed (* machine words for fully known values, one abstract value per bit otherwise *)
+
+let vector = ref Bits;;
+
+(* if true then the result file gives for every state only the values that differ from the ones of its predecessor *)
+let delta_output = ref false;;
+
+(* states of the forward_bin analysis whose abstract value is kept once their successors are computed *)
+type retention_t =
+  | All              (* every state *)
+  | Block_entries    (* states at the start of a basic block *)
+  | Function_entries (* states at the entry of a function *)
+  | Addresses        (* only the states at the addresses of retained_addresses *)
+
+let retention = ref All;;
+
+(* addresses whose states are always kept (see retention) *)
+let retained_addresses = ref SAddresses.empty;;
+
 let mode = ref Protected
 
 let in_mcfa_file = ref "";;
+(* addresses whose overrides have changed since the analysis that produced in_mcfa_file. If not empty the forward_bin
+analysis reuses this CFA and only computes again the states reachable from these addresses *)
+let changed_overrides = ref SAddresses.empty;;
 let out_mcfa_file = ref "";;
   
 let load_mcfa = ref false;;
 let store_mcfa = ref false;;
 
+(* if true then the results are also written into <result file>.part during the analysis *)
+let stream_results = ref false;;
+
+(* file into which the state of forward_bin is saved every checkpoint_period seconds ("" for no checkpoint).
+Every checkpoint writes the whole CFA: the period is a time so that the time spent in checkpoints stays
+a bounded fraction of the analysis however large the CFA grows *)
+let checkpoint_file = ref "";;
+let checkpoint_period = ref 600;;
+
+(* checkpoint file from which forward_bin is resumed ("" to start a new analysis) *)
+let resume_from = ref "";;
+
+(* number of processes exploring the waiting states of forward_bin in parallel (1 for a sequential exploration) *)
+let workers = ref 1;;
+
+(* if true then forward_bin reuses the result of a function call for the next calls with a smaller entry value *)
+let function_summaries = ref false;;
+
+(* binary trace file of the fixpoint iterations ("" for no trace, see Log.trace) *)
+let trace_file = ref "";;
+
+(* if true then the cost of forward_bin is measured per address and written into <result file>.profile *)
+let profile = ref false;;
+
+(* if true then the updates of flags that are set again before being read are removed from the decoded statements *)
+let flag_liveness = ref false;;
+
+(* if true then the forward_bin analysis builds a CFA node per basic block instead of a node per instruction *)
+let block_nodes = ref false;;
+
+(* addresses where a node is built even if they are inside a basic block (see block_nodes) *)
+let node_addresses = ref SAddresses.empty;;
+
+(* budgets of the analysis: when one of them is exceeded the analysis stops and its partial result is written.
+0 is for no limit *)
+let max_time = ref 0;;  (* wall-clock time in seconds *)
+let max_nodes = ref 0;; (* number of states of the CFA ; for forward_cfa and backward, of the states added to the loaded CFA *)
+let max_heap = ref 0;;  (* size of the major heap in MB *)
+
 (* name of binary file to analyze *)
 let binary = ref "";;
 
@@ -76,6 +148,8 @@ let call_conv = ref CDECL
 let text = ref ""
 let code_length = ref 0
 let ep = ref Z.zero
+(* entry points of a batch analysis: the analysis_ep option of the [loader] section may list several addresses. ep is the first one *)
+let entry_points: Z.t list ref = ref []
 let phys_code_addr = ref 0
 let rva_code = ref Z.zero
 
@@ -155,4 +229,44 @@ let clear_tables () =
   Hashtbl.clear reg_override;
   Hashtbl.clear mem_override;
   Hashtbl.clear stack_override;
-  Hashtbl.clear heap_override
+  Hashtbl.clear heap_override;
+  Hashtbl.clear register_content;
+  Hashtbl.clear module_loglevel;
+  Hashtbl.clear gdt;
+  Hashtbl.clear tainting_rules;
+  Hashtbl.clear typing_rules;
+  sections := [];
+  blackAddresses := SAddresses.empty;
+  node_addresses := SAddresses.empty;
+  retained_addresses := SAddresses.empty;
+  changed_overrides := SAddresses.empty
+
+(* sets back the options of the [analyzer] section to their default value so that an analysis does not depend on
+the configuration of the previous one run by the same process *)
+let reset_options () =
+  unroll := 20;
+  fun_unroll := 50;
+  loglevel := 3;
+  dotfile := "";
+  analysis := Forward Bin;
+  worklist := Bfs;
+  vector := Bits;
+  delta_output := false;
+  retention := All;
+  in_mcfa_file := "";
+  out_mcfa_file := "";
+  store_mcfa := false;
+  stream_results := false;
+  checkpoint_file := "";
+  checkpoint_period := 600;
+  resume_from := "";
+  workers := 1;
+  function_summaries := false;
+  trace_file := "";
+  profile := false;
+  flag_liveness := false;
+  block_nodes := false;
+  max_time := 0;
+  max_nodes := 0;
+  max_heap := 0;
+  interleave := false
@@ -21,27 +21,124 @@
 (** fid of the log file *)
 let logfid = ref stdout
 
+(** messages are buffered by the channel of the log file. They are written at the latest flush_period seconds
+after the previous flush, whenever the analysis aborts and when the log file is closed *)
+let flush_period = 1.
+
+(* time of the last flush of the log file *)
+let last_flush = ref 0.
+
+(** writes the buffered messages into the log file *)
+let flush_log () =
+  flush !logfid;
+  last_flush := Unix.gettimeofday ()
+
+(** writes the buffered messages if the last flush is older than flush_period *)
+let periodic_flush () =
+  if Unix.gettimeofday () -. !last_flush >= flush_period then
+    flush_log ()
+
+(** when true, messages are not written into the log file (see mute) *)
+let muted = ref false
+
+(** [mute f] applies f without writing its messages into the log file *)
+let mute f =
+  let prev = !muted in
+  muted := true;
+  try
+    let res = f () in
+    muted := prev;
+    res
+  with e -> muted := prev; raise e
+
 (** open the given log file *)
 let init fname =
-  logfid := open_out fname
+  logfid := open_out fname;
+  last_flush := Unix.gettimeofday ()
 
 (** dump a message provided by the analysis step *)
-let from_analysis msg = Printf.fprintf (!logfid) "[analysis] %s\n" msg; flush !logfid
+let from_analysis msg = Printf.fprintf (!logfid) "[analysis] %s\n" msg; periodic_flush ()
 
 (** dump a message produced by the decoding step *)
-let from_decoder msg = Printf.fprintf (!logfid) "[decoding] %s\n" msg; flush !logfid
+let from_decoder msg = Printf.fprintf (!logfid) "[decoding] %s\n" msg; periodic_flush ()
 						   
 (** dump a message generated by then configuration parsing step *)
-let from_config msg = Printf.fprintf !logfid "[config] %s\n" msg; flush !logfid
+let from_config msg = Printf.fprintf !logfid "[config] %s\n" msg; periodic_flush ()
+
+(** prefix of the status line written when the analysis stops before its end. The result is then partial *)
+let partial_prefix = "[PARTIAL] "
+
+(** writes the status line of an analysis stopped before its end for the given reason. It is written whatever the
+log level is as pybincat reads it to report a partial result *)
+let partial reason = Printf.fprintf !logfid "%s%s\n" partial_prefix reason; flush_log ()
 
 (** dump the string on the log file *)
-let stdout_buf = ref ""
-let open_stdout () = stdout_buf := ""
-let print msg = stdout_buf := !stdout_buf ^ msg
-let dump_stdout () = Printf.fprintf !logfid "%s\n" !stdout_buf; flush !logfid
+let stdout_buf = Buffer.create 1024
+let open_stdout () = Buffer.clear stdout_buf
+let print msg = Buffer.add_string stdout_buf msg
+let dump_stdout () = Printf.fprintf !logfid "%s\n" (Buffer.contents stdout_buf); periodic_flush ()
 
 (** close the log file *)
 let close () = close_out !logfid
+
+(* buffered messages are not lost if the analyzer exits without closing the log file *)
+let () = at_exit (fun () -> try flush !logfid with Sys_error _ -> ())
+
+(** events of the binary trace *)
+type event =
+  | Visit       (** a state is processed by the fixpoint iterator *)
+  | Explore     (** a new state is added to the set of states to process *)
+  | Subsumed    (** a new state is not explored as it is included in a previous one *)
+  | Widen       (** a widening has been applied to a new state *)
+  | Unreachable (** a new state is removed as its abstract value is bottom *)
+
+let event_code e =
+  match e with
+  | Visit       -> 1
+  | Explore     -> 2
+  | Subsumed    -> 3
+  | Widen       -> 4
+  | Unreachable -> 5
+
+(** binary trace file. It starts with the magic string trace_magic followed by records of 13 bytes:
+the event code (1 byte), the node id (4 bytes) and the address (8 bytes), integers being little endian *)
+let trace_fid: out_channel option ref = ref None
+
+let trace_magic = "BCTRACE1"
+
+(** open the given binary trace file *)
+let trace_init fname =
+  let f = open_out_bin fname in
+  output_string f trace_magic;
+  trace_fid := Some f;
+  at_exit (fun () -> try flush f with Sys_error _ -> ())
+
+(** returns true whenever a binary trace file is opened *)
+let tracing () = !trace_fid <> None
+
+let output_le f n i =
+  for k = 0 to n-1 do
+    output_byte f ((i lsr (8*k)) land 0xff)
+  done
+
+(** [trace e id a] adds to the binary trace the event e on node id at the address a *)
+let trace e id a =
+  match !trace_fid with
+  | None -> ()
+  | Some f ->
+     output_byte f (event_code e);
+     output_le f 4 id;
+     if Z.fits_int a && Z.sign a >= 0 then output_le f 8 (Z.to_int a)
+     else
+       for k = 0 to 7 do
+	 output_byte f (Z.to_int (Z.extract a (8*k) 8))
+       done
+
+(** close the binary trace file *)
+let trace_close () =
+  match !trace_fid with
+  | None -> ()
+  | Some f -> close_out f; trace_fid := None
   
 module Make(Modname: sig val name : string end) = struct
   let modname = Modname.name
@@ -58,30 +155,33 @@ module Make(Modname: sig val name : string end) = struct
   let debug fmsg = 
     if loglevel () >= 4 then
 	let msg = fmsg Printf.sprintf in
-	Printf.fprintf !logfid  "[DEBUG] %s: %s\n" modname msg;
-	flush !logfid
+	if not !muted then Printf.fprintf !logfid  "[DEBUG] %s: %s\n" modname msg;
+	periodic_flush ()
   let info fmsg = 
     if loglevel () >= 3 then
 	let msg = fmsg Printf.sprintf in
-	Printf.fprintf !logfid  "[INFO]  %s: %s\n" modname msg;
-	flush !logfid
+	if not !muted then Printf.fprintf !logfid  "[INFO]  %s: %s\n" modname msg;
+	periodic_flush ()
   let warn fmsg = 
     if loglevel () >= 2 then
 	let msg = fmsg Printf.sprintf in
-	Printf.fprintf !logfid  "[WARN]  %s: %s\n" modname msg;
-	flush !logfid
+	if not !muted then Printf.fprintf !logfid  "[WARN]  %s: %s\n" modname msg;
+	periodic_flush ()
   let error fmsg = 
     let msg = fmsg Printf.sprintf in
-    if loglevel () >= 1 then
+    if loglevel () >= 1 && not !muted then
       Printf.fprintf !logfid  "[ERROR] %s: %s\n" modname msg;
-    flush !logfid;
+    flush_log ();
     flush stdout;
     raise (Exceptions.Error msg)
   let abort fmsg = 
     let msg = fmsg Printf.sprintf in
-    Printf.fprintf !logfid  "[ABORT] %s: %s\n" modname msg;
-    Printexc.print_raw_backtrace !logfid (Printexc.get_callstack 100);
-    flush !logfid;
+    if not !muted then
+      begin
+	Printf.fprintf !logfid  "[ABORT] %s: %s\n" modname msg;
+	Printexc.print_raw_backtrace !logfid (Printexc.get_callstack 100)
+      end;
+    flush_log ();
     flush stdout;
     raise (Exceptions.Error msg)
 
@@ -89,12 +189,12 @@ module Make(Modname: sig val name : string end) = struct
   let analysis fmsg = 
     if !Config.loglevel >= 1 then
 	let msg = fmsg Printf.sprintf in
-	Printf.fprintf !logfid  "[ANALYSIS] %s: %s\n" modname msg;
-	flush !logfid
+	if not !muted then Printf.fprintf !logfid  "[ANALYSIS] %s: %s\n" modname msg;
+	periodic_flush ()
   let decoder fmsg = 
     if !Config.loglevel >= 1 then
 	let msg = fmsg Printf.sprintf in
-	Printf.fprintf !logfid  "[DECODER] %s: %s\n" modname msg;
-	flush !logfid
+	if not !muted then Printf.fprintf !logfid  "[DECODER] %s: %s\n" modname msg;
+	periodic_flush ()
       
 end
@@ -0,0 +1,106 @@
+(*
+    This file is part of BinCAT.
+    Copyright 2014-2017 - Airbus Group
+
+    BinCAT is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or (at your
+    option) any later version.
+
+    BinCAT is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with BinCAT.  If not, see <http://www.gnu.org/licenses/>.
+*)
+
+(** byte oriented LZ77 compression of strings. A compressed string is a sequence of:
+- literal runs: a byte n < 128 followed by the n+1 next bytes of the uncompressed string ;
+- back references: a byte n >= 128 followed by a distance d on 2 bytes (little endian): the n-128+min_match
+  bytes starting d bytes before the current end of the uncompressed string are copied *)
+
+(* length of the shortest and of the longest back reference *)
+let min_match = 4
+let max_match = 127 + min_match
+
+(* greatest distance of a back reference *)
+let window = 0xffff
+
+(* hash of the min_match bytes of s starting at i *)
+let hash s i =
+  let c k = Char.code (String.unsafe_get s (i+k)) in
+  ((c 0) lxor ((c 1) lsl 4) lxor ((c 2) lsl 8) lxor ((c 3) lsl 12)) land 0xffff
+
+let compress (s: string): string =
+  let n = String.length s in
+  let out = Buffer.create (n / 2 + 16) in
+  (* last position of every hash *)
+  let last = Array.make 0x10000 (-1) in
+  let literals = ref 0 in
+  let add_literals i =
+    let rec add start =
+      if start < i then
+	let len = min 128 (i - start) in
+	Buffer.add_char out (Char.chr (len - 1));
+	Buffer.add_substring out s start len;
+	add (start + len)
+    in
+    add !literals
+  in
+  let i = ref 0 in
+  while !i + min_match <= n do
+    let h = hash s !i in
+    let p = last.(h) in
+    last.(h) <- !i;
+    let len =
+      if p >= 0 && !i - p <= window then
+	let rec count l =
+	  if l < max_match && !i + l < n && String.unsafe_get s (p+l) = String.unsafe_get s (!i+l) then count (l+1)
+	  else l
+	in
+	count 0
+      else 0
+    in
+    if len >= min_match then
+      begin
+	add_literals !i;
+	let d = !i - p in
+	Buffer.add_char out (Char.chr (128 + len - min_match));
+	Buffer.add_char out (Char.chr (d land 0xff));
+	Buffer.add_char out (Char.chr (d lsr 8));
+	i := !i + len;
+	literals := !i
+      end
+    else
+      incr i
+  done;
+  add_literals n;
+  Buffer.contents out
+
+(** raises Invalid_argument if _s_ is not a compressed string *)
+let decompress (s: string): string =
+  let n = String.length s in
+  let out = Buffer.create (4 * n) in
+  let i = ref 0 in
+  while !i < n do
+    let c = Char.code s.[!i] in
+    if c < 128 then
+      begin
+	Buffer.add_substring out s (!i+1) (c+1);
+	i := !i + c + 2
+      end
+    else
+      begin
+	let d = (Char.code s.[!i+1]) lor ((Char.code s.[!i+2]) lsl 8) in
+	let start = Buffer.length out - d in
+	if d = 0 || start < 0 then invalid_arg "Lz.decompress";
+	(* the copied bytes may overlap the ones being added *)
+	for k = 0 to c - 128 + min_match - 1 do
+	  Buffer.add_char out (Buffer.nth out (start + k))
+	done;
+	i := !i + 3
+      end
+  done;
+  Buffer.contents out
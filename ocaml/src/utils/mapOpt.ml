@@ -28,6 +28,17 @@ module Make(Ord: OrderedType) = struct
 (* left tree, key, value, right tree, height of whole tree *)
       | Node of ('a t * key * 'a * 'a t * int)
 
+    (* number of non empty subtrees that have been skipped because they were physically equal *)
+    let shared_subtrees = ref 0
+
+    let skip m =
+      begin
+	match m with
+	| Empty -> ()
+	| Node _ -> incr shared_subtrees
+      end;
+      m
+
     let height = function
         Empty -> 0
       | Node(_, _, _, _,h) -> h
@@ -245,13 +256,18 @@ module Make(Ord: OrderedType) = struct
 
 
     (* f must be such that f d d = d
-       m1 and m2 should have the same set of keys *)
+       m1 and m2 should have the same set of keys
+       the subtrees of m1 that are left unchanged by f (physically equal results) are shared with the result *)
     let rec map2 f m1 m2 =
       match (m1, m2) with
-	  _ when (m1 == m2) -> m1
+	  _ when (m1 == m2) -> skip m1
 	| (Node (l1, v1, d1, r1, h1), Node (l2, v2, d2, r2, _))
 	    when (Ord.compare v1 v2 = 0) ->
-	    Node (map2 f l1 l2, v1, f d1 d2, map2 f r1 r2, h1)
+	    let l = map2 f l1 l2 in
+	    let d = f d1 d2 in
+	    let r = map2 f r1 r2 in
+	    if l == l1 && d == d1 && r == r1 then m1
+	    else Node (l, v1, d, r, h1)
 
 	| (Node (_, v, _, _, _), Node n) -> 
 	    map2 f m1 (Node (set_root v n))
@@ -260,10 +276,14 @@ module Make(Ord: OrderedType) = struct
 
     let rec mapi2 f m1 m2 =
       match (m1, m2) with
-	  _ when (m1 == m2) -> m1
+	  _ when (m1 == m2) -> skip m1
 	| (Node (l1, v1, d1, r1, h1), Node (l2, v2, d2, r2, _))
 	    when (Ord.compare v1 v2 = 0) ->
-	    Node (mapi2 f l1 l2, v1, f v1 d1 d2, mapi2 f r1 r2, h1)
+	    let l = mapi2 f l1 l2 in
+	    let d = f v1 d1 d2 in
+	    let r = mapi2 f r1 r2 in
+	    if l == l1 && d == d1 && r == r1 then m1
+	    else Node (l, v1, d, r, h1)
 
 	| (Node (_, v, _, _, _), Node n) -> 
 	    mapi2 f m1 (Node (set_root v n))
@@ -271,6 +291,84 @@ module Make(Ord: OrderedType) = struct
 	| _ -> invalid_arg "MapOpt.mapi2"
 
     
+    let rec add_min_binding k d = function
+      | Empty -> Node (Empty, k, d, Empty, 1)
+      | Node (l, v, d', r, _) -> bal (add_min_binding k d l) v d' r
+
+    let rec add_max_binding k d = function
+      | Empty -> Node (Empty, k, d, Empty, 1)
+      | Node (l, v, d', r, _) -> bal l v d' (add_max_binding k d r)
+
+    (* builds a balanced tree from l, v, d, r where all keys of l are smaller than v and all keys of r greater than v *)
+    let rec join l v d r =
+      match (l, r) with
+      | (Empty, _) -> add_min_binding v d r
+      | (_, Empty) -> add_max_binding v d l
+      | (Node (ll, lv, ld, lr, lh), Node (rl, rv, rd, rr, rh)) ->
+	 if lh > rh + 2 then bal ll lv ld (join lr v d r)
+	 else if rh > lh + 2 then bal (join l v d rl) rv rd rr
+	 else create l v d r
+
+    (* returns the subtree of the keys smaller than x, the value bound to x if any and the subtree of the keys greater than x *)
+    let rec split x = function
+      | Empty -> (Empty, None, Empty)
+      | Node (l, v, d, r, _) ->
+	 let c = Ord.compare x v in
+	 if c = 0 then (l, Some d, r)
+	 else if c < 0 then
+	   let (ll, pres, rl) = split x l in (ll, pres, join rl v d r)
+	 else
+	   let (lr, pres, rr) = split x r in (join l v d lr, pres, rr)
+
+    (* concatenates two trees where all keys of t1 are smaller than the keys of t2, whatever their heights *)
+    let concat_trees t1 t2 =
+      match (t1, t2) with
+      | (Empty, t) | (t, Empty) -> t
+      | (_, _) ->
+	 let (x, d) = min_binding t2 in
+	 join t1 x d (remove_min_binding t2)
+
+    let remove_range p m =
+      let rec remove m =
+	match m with
+	| Empty -> Empty, []
+	| Node (l, k, d, r, _) ->
+	   let c = p k in
+	   if c < 0 then
+	     let (l', removed) = remove l in join l' k d r, removed
+	   else if c > 0 then
+	     let (r', removed) = remove r in join l k d r', removed
+	   else
+	     let (l', removed_l) = remove l in
+	     let (r', removed_r) = remove r in
+	     concat_trees l' r', removed_l @ ((k, d)::removed_r)
+      in
+      remove m
+
+    let rec union f m1 m2 =
+      match (m1, m2) with
+      | _ when m1 == m2 -> skip m1
+      | (Empty, m) | (m, Empty) -> m
+      | (Node (l1, v1, d1, r1, h1), Node (l2, v2, d2, r2, h2)) ->
+	 if h1 >= h2 then
+	   begin
+	     let (l2', d2', r2') = split v1 m2 in
+	     let l = union f l1 l2' in
+	     let r = union f r1 r2' in
+	     match d2' with
+	     | None -> if l == l1 && r == r1 then m1 else join l v1 d1 r
+	     | Some d2' -> join l v1 (f d1 d2') r
+	   end
+	 else
+	   begin
+	     let (l1', d1', r1') = split v2 m1 in
+	     let l = union f l1' l2 in
+	     let r = union f r1' r2 in
+	     match d1' with
+	     | None -> join l v2 d2 r
+	     | Some d1' -> join l v2 (f d1' d2) r
+	   end
+
     let rec for_all p m =
       match m with
 	Empty -> true
@@ -279,7 +377,7 @@ module Make(Ord: OrderedType) = struct
     (* p must be such that p m m = true *)
     let rec for_all2 p m1 m2 = 
       match (m1,m2) with
-	  _ when m1 == m2 -> true
+	  _ when m1 == m2 -> ignore (skip m1); true
 	| (Node(l1, v1, d1, r1, _), Node(l2, v2, d2, r2, _)) 
 	    when (Ord.compare v1 v2 = 0) ->
 	    (p d1 d2) && (for_all2 p l1 l2) && (for_all2 p r1 r2)
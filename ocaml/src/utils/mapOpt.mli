@@ -78,6 +78,12 @@ sig
 	[m], except for [x] which is unbound in the returned map.
 	Raises [Not_found] if no such binding exists. *)
 
+  val remove_range: (key -> int) -> 'a t -> 'a t * (key * 'a) list
+    (** [remove_range p m] returns [m] without the keys [k] such that [p k = 0]
+	and the removed bindings in increasing order of keys. As for [find_key],
+	[p k < 0] means that the range is below [k] and [p k > 0] that it is above [k].
+	O(log(n)) plus the number of removed bindings. *)
+
   val replace: key -> 'a -> 'a t -> 'a t
     (** [replace x d m] returns a map containing the same bindings as
 	[m], except for [x] which is bound to [d] in the returned map.
@@ -146,6 +152,8 @@ sig
 	where [a] and [b] are the associated values by [m1] and [m2]
 	respectively. The bindings are passed to [f] in increasing order
 	with respect to the ordering over the type of the keys.
+	Subtrees of [m1] whose values are all returned unchanged (physically) by [f]
+	are shared with the result.
 	Raise [Invalid_argument] if the two maps have different domains. *)
 
   val mapi: (key -> 'a -> 'b) -> 'a t -> 'b t    
@@ -156,6 +164,16 @@ sig
     (** Same as {!MapOpt.S.map2}, but the function receives as arguments both the
 	key and the associated values for each binding of the both maps. *)
 
+  val union: ('a -> 'a -> 'a) -> 'a t -> 'a t -> 'a t
+    (** [union f m1 m2] returns a map whose domain is the union of the domains of [m1] and [m2].
+	Keys bound in both maps are associated to [f] [a] [b], where [a] and [b] are the associated
+	values by [m1] and [m2] respectively ; other keys keep their value.
+	Physically equal subtrees of [m1] and [m2] are not traversed and are shared with the result. *)
+
+  val shared_subtrees: int ref
+    (** number of non empty subtrees that {!MapOpt.S.map2}, {!MapOpt.S.mapi2}, {!MapOpt.S.for_all2} and {!MapOpt.S.union}
+	skipped because they were physically equal *)
+
   val fold: (key -> 'a -> 'b -> 'b) -> 'a t -> 'b -> 'b
     (** [fold f m a] computes [(f kN dN ... (f k1 d1 a)...)],
 	where [k1 ... kN] are the keys of all bindings in [m]
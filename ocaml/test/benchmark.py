@@ -0,0 +1,109 @@
+#!/usr/bin/env python2
+"""
+Microbenchmarks of the analyzer. They are not run by pytest:
+    python benchmark.py [number of runs]
+Every run is made in a child process so that its peak resident set size can be
+reported, whatever the version of the analyzer.
+"""
+
+import os.path
+import shutil
+import sys
+import tempfile
+import time
+import traceback
+from pybincat import cfa
+
+# 64 KB memory interval initialized from the configuration
+BIG_MEMORY = ("mem[0x100] = 0xa5 ! 0xf0",
+              "mem[0x100] = 0xa5 ! 0xf0\nmem[0x10000*65536] = 0xaa")
+
+# eight consecutive branches on an unknown condition
+BRANCHES = ("85c0"+"7401"+"43") * 8
+
+
+def workers(n):
+    return ("analysis = forward_binary",
+            "analysis = forward_binary\nworkers = %d" % n)
+
+
+BENCHMARKS = [
+    # memory writes inside the interval
+    #   mov dword [0x18000], 0x11223344
+    #   mov eax, [0x18000]
+    #   mov ebx, [0x17ffe]
+    ("analysis with a 64 KB memory interval",
+     "c70500800100"+"44332211"+"a100800100"+"8b1dfe7f0100", BIG_MEMORY),
+    # 64 KB memcpy
+    #   mov esi, 0x10000
+    #   mov edi, 0x30000
+    #   mov ecx, 0x4000
+    #   cld
+    #   rep movsd
+    #   mov eax, [0x3fffc]
+    ("64 KB rep movsd",
+     "be00000100"+"bf00000300"+"b900400000"+"fc"+"f3a5"+"a1fcff0300",
+     BIG_MEMORY),
+    # 2^8 paths explored by one or four worker processes
+    #   test eax, eax   ; eax is partially unknown: both branches are taken
+    #   jz +1
+    #   inc ebx
+    #   (8 times)
+    ("2^8 paths, workers = 1", BRANCHES, workers(1)),
+    ("2^8 paths, workers = 4", BRANCHES, workers(4)),
+    # 2^8 states with a 64 KB memory interval, which differ by one register
+    #   (8 times) test eax, eax ; jz +1 ; inc ebx
+    #   mov dword [0x18000], ebx
+    ("2^8 states with a 64 KB memory interval",
+     BRANCHES+"891d00800100", BIG_MEMORY),
+]
+
+
+def run_analyzer(tmpdir, initialState, binarystr):
+    """
+    Create .ini and .bin in tmpdir, run the analyzer in a child process and
+    return the elapsed time and the peak resident set size of the child in KB
+    """
+    initfname = os.path.join(tmpdir, 'init.ini')
+    with open(initfname, 'w+') as f:
+        f.write(initialState.format(code_length=len(binarystr)))
+    with open(os.path.join(tmpdir, 'file.bin'), 'w+') as f:
+        f.write(binarystr)
+    outfname = os.path.join(tmpdir, 'end.ini')
+    logfname = os.path.join(tmpdir, 'log.txt')
+    start = time.time()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            cfa.CFA.from_filenames(initfname, outfname, logfname)
+        except Exception:
+            traceback.print_exc()
+            os._exit(1)
+        os._exit(0)
+    _, status, rusage = os.wait4(pid, 0)
+    if status != 0:
+        raise RuntimeError("the analyzer failed (status %d)" % status)
+    return time.time() - start, rusage.ru_maxrss
+
+
+def main(runs):
+    template = open(os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                                 'template0.ini'), 'rb').read()
+    tmpdir = tempfile.mkdtemp()
+    oldpath = os.getcwd()
+    os.chdir(tmpdir)
+    try:
+        for name, opcodes, (old, new) in BENCHMARKS:
+            state = template.replace(old, new)
+            results = [run_analyzer(tmpdir, state, opcodes.decode("hex"))
+                       for _ in range(runs)]
+            print "%s: %.3fs, %d KB (best of %d)" % (
+                name, min(t for t, _ in results),
+                min(m for _, m in results), runs)
+    finally:
+        os.chdir(oldpath)
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 3)
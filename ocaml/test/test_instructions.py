@@ -8,6 +8,8 @@ import subprocess
 import copy
 import binascii
 import os.path
+import shutil
+import time
 from pybincat import cfa
 
 
@@ -816,3 +818,686 @@ def test_reg_part_cmp(analyzer, initialState):
     zf = getReg(after,"zf")
     assert(zf.value == 1)
 
+
+def test_parallel_workers(analyzer, initialState):
+    """
+    Test that the analysis computed by several worker processes is the
+    sequential one
+        test eax, eax   ; eax is partially unknown: both branches are taken
+        jz +2
+        inc ebx
+        inc ecx
+        inc edx
+        inc esi
+    """
+    opcode = ("85c0"+"7402"+"43"+"41"+"42"+"46").decode("hex")
+    sequential = analyzer(initialState, binarystr=opcode)
+    parallelState = initialState.replace(
+        "analysis = forward_binary",
+        "analysis = forward_binary\nworkers = 4")
+    parallel = analyzer(parallelState, binarystr=opcode)
+
+    assert sorted(parallel.nodes.keys()) == sorted(sequential.nodes.keys())
+    for node_id, state in sequential.nodes.items():
+        other = parallel[node_id]
+        assert other.address == state.address
+        assert other == state, \
+            "node %s differs between sequential and parallel analyses\n%s" % (
+                node_id, state.diff(other, "sequential", "parallel"))
+    for node_id, succs in sequential.edges.items():
+        assert sorted(parallel.edges.get(node_id, [])) == sorted(succs)
+
+
+def test_worklist_orders(analyzer, initialState):
+    """
+    Test that the states computed at each address do not depend on the
+    exploration order of the waiting states
+        mov ecx, 3
+    loop:
+        inc ebx
+        dec ecx
+        jnz loop
+        test eax, eax   ; eax is partially unknown: both branches are taken
+        jz +1
+        inc edx
+        inc esi
+    """
+    opcode = ("b903000000"+"43"+"49"+"75fc"+"85c0"+"7401"+"42"+"46").decode(
+        "hex")
+
+    def states_by_address(order):
+        state = initialState.replace(
+            "analysis = forward_binary",
+            "analysis = forward_binary\nworklist = %s" % order)
+        prgm = analyzer(state, binarystr=opcode)
+        res = {}
+        for node_id, st in prgm.nodes.items():
+            res.setdefault(st.address, []).append(st)
+        return res
+
+    bfs = states_by_address("bfs")
+    for order in ["dfs", "address"]:
+        other = states_by_address(order)
+        assert sorted(other.keys()) == sorted(bfs.keys())
+        for address, states in bfs.items():
+            others = list(other[address])
+            assert len(others) == len(states)
+            for st in states:
+                assert st in others, \
+                    "a state at %s differs with the %s order" % (address, order)
+                others.remove(st)
+
+
+packed_vector_opcodes = [
+    ("shl eax, 3", "c1e003"),
+    ("sar ebx, cl", "d3fb"),
+    ("rol edx, 7", "c1c207"),
+    ("mul ebx", "f7e3"),
+    ("imul ecx, edx", "0fafca"),
+    ("imul ebx", "f7eb"),
+    ("xor edx, edx; div ecx", "31d2"+"f7f1"),
+    ("cdq; idiv ecx", "99"+"f7f9"),
+    ("add eax, ebx", "01d8"),
+    ("sub ecx, edx", "29d1"),
+    ("cmp al, bl; adc edx, esi", "38d8"+"11f2"),
+]
+
+
+@pytest.mark.parametrize('name_opcode', packed_vector_opcodes,
+                         ids=lambda x: x[0])
+def test_packed_vector(analyzer, initialState, name_opcode):
+    """
+    Test that the packed representation of the bit vectors computes the same
+    states as the bit by bit one
+    """
+    opcode = name_opcode[1].decode("hex")
+    bits = analyzer(initialState.replace(
+        "analysis = forward_binary",
+        "analysis = forward_binary\nvector = bits"), binarystr=opcode)
+    packed = analyzer(initialState.replace(
+        "analysis = forward_binary",
+        "analysis = forward_binary\nvector = packed"), binarystr=opcode)
+
+    assert sorted(packed.nodes.keys()) == sorted(bits.nodes.keys())
+    for node_id, state in bits.nodes.items():
+        other = packed[node_id]
+        assert other.address == state.address
+        assert other == state, \
+            "node %s differs between bits and packed vectors\n%s" % (
+                node_id, state.diff(other, "bits", "packed"))
+
+
+def test_stream_results(analyzer, initialState, tmpdir):
+    """
+    Test that the partial result file written while the analysis is running
+    contains the first states of the analysis and is removed at its end
+        mov ecx, 0x100000
+    loop:
+        dec ecx
+        jnz loop
+    """
+    opcode = ("b900001000"+"49"+"75fd").decode("hex")
+    streamState = initialState.replace(
+        "unroll = 5", "unroll = 2000000").replace(
+        "analysis = forward_binary",
+        "analysis = forward_binary\nstream_results = true")
+    # the analysis of the loop lasts long enough to read its partial results
+    initfname = str(tmpdir.join('stream.ini'))
+    with open(initfname, 'w+') as f:
+        f.write(streamState.format(code_length=len(opcode)))
+    with open(str(tmpdir.join('file.bin')), 'w+') as f:
+        f.write(opcode)
+    outfname = str(tmpdir.join('stream.out.ini'))
+    logfname = str(tmpdir.join('stream.log'))
+    proc = subprocess.Popen(["bincat_native", initfname, outfname, logfname],
+                            cwd=str(tmpdir), stdout=subprocess.PIPE)
+    partial = None
+    try:
+        deadline = time.time() + 60
+        while partial is None and proc.poll() is None and \
+                time.time() < deadline:
+            time.sleep(0.1)
+            partial = cfa.CFA.parse_partial(outfname)
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+        proc.wait()
+    assert partial is not None, "no partial result has been streamed"
+    assert '0' in partial.nodes
+    for node_id in partial.edges:
+        assert node_id in partial.nodes
+
+    # streamed states are the ones of the complete result
+    budgetState = streamState.replace(
+        "analysis = forward_binary",
+        "analysis = forward_binary\nmax_nodes = 20")
+    prgm = analyzer(budgetState, binarystr=opcode)
+    assert not os.path.exists(str(tmpdir.join('end.ini.part')))
+    for node_id, state in prgm.nodes.items():
+        if node_id in partial.nodes:
+            assert partial[node_id] == state, \
+                partial[node_id].diff(state, "streamed", "complete")
+
+
+def test_binary_trace(analyzer, initialState, tmpdir):
+    """
+    Test that the binary trace records the processed states
+        test eax, eax   ; eax is partially unknown: both branches are taken
+        jz +2
+        inc ebx
+        inc ecx
+    """
+    from pybincat import trace, PyBinCATException
+    opcode = ("85c0"+"7402"+"43"+"41").decode("hex")
+    tracefname = str(tmpdir.join('trace.bin'))
+    prgm = analyzer(initialState.replace(
+        "analysis = forward_binary",
+        "analysis = forward_binary\ntrace_file = %s" % tracefname),
+        binarystr=opcode)
+    events = list(trace.read_trace(tracefname))
+    visited = [node_id for (event, node_id, _) in events if event == "visit"]
+    assert '0' in visited
+    assert len(set(visited)) == len(visited)
+    for node_id in visited:
+        assert node_id in prgm.nodes
+    for event, node_id, address in events:
+        if node_id in prgm.nodes:
+            assert prgm[node_id].address.value == address
+    counts = trace.count_events(tracefname)
+    assert sum(counts["visit"].values()) == len(visited)
+    # both branches of jz are visited
+    assert 4 in counts["visit"] and 6 in counts["visit"]
+
+    with open(tracefname, 'wb') as f:
+        f.write("BCTRACE0")
+    with pytest.raises(PyBinCATException):
+        list(trace.read_trace(tracefname))
+
+
+def test_profile(analyzer, initialState, tmpdir):
+    """
+    Test that the profile gives the number of processed states per address
+        test eax, eax   ; eax is partially unknown: both branches are taken
+        jz +2
+        inc ebx
+        inc ecx
+    """
+    from pybincat import profile
+    opcode = ("85c0"+"7402"+"43"+"41").decode("hex")
+    outfname = str(tmpdir.join('end.ini'))
+    prgm = analyzer(initialState, binarystr=opcode)
+    assert profile.Profile.from_result(outfname) is None
+    prgm = analyzer(initialState.replace(
+        "analysis = forward_binary",
+        "analysis = forward_binary\nprofile = true"), binarystr=opcode)
+    prof = profile.Profile.from_result(outfname)
+    assert prof is not None
+    addresses = set(addr.value for addr in prgm.states)
+    for addr, entry in prof.entries.items():
+        assert addr in addresses
+        assert 0 < entry.visits <= len(
+            [s for s in prgm.nodes.values() if s.address.value == addr])
+        assert entry.time >= 0
+    assert prof.entries[0].visits == 1
+    # the instruction at 6 is reached by both branches of jz
+    assert prof.entries[6].visits == 2
+
+
+def test_write_in_large_interval(analyzer, initialState):
+    """
+    Test memory writes inside a 64 KB interval initialized from the
+    configuration: the interval is only split around the written bytes
+        mov dword [0x18000], 0x11223344
+        mov eax, [0x18000]
+        mov ebx, [0x17ffe]
+    """
+    opcode = ("c70500800100"+"44332211"+"a100800100"+"8b1dfe7f0100").decode("hex")
+    bigState = initialState.replace(
+        "mem[0x100] = 0xa5 ! 0xf0",
+        "mem[0x100] = 0xa5 ! 0xf0\nmem[0x10000*65536] = 0xaa")
+    prgm = analyzer(bigState, binarystr=opcode)
+    last = getLastState(prgm, prgm['0'])
+    assert getReg(last, 'eax').value == 0x11223344
+    assert getReg(last, 'ebx').value == 0x3344aaaa
+
+
+def test_rep_movsd_64k(analyzer, initialState):
+    """
+    Test a 64 KB memcpy: the iterations of the rep prefix are applied in one
+    step
+        mov esi, 0x10000
+        mov edi, 0x30000
+        mov ecx, 0x4000
+        cld
+        rep movsd
+        mov eax, [0x3fffc]
+    """
+    opcode = ("be00000100"+"bf00000300"+"b900400000"+"fc"+"f3a5" +
+              "a1fcff0300").decode("hex")
+    bigState = initialState.replace(
+        "mem[0x100] = 0xa5 ! 0xf0",
+        "mem[0x100] = 0xa5 ! 0xf0\nmem[0x10000*65536] = 0xaa")
+    prgm = analyzer(bigState, binarystr=opcode)
+    last = getLastState(prgm, prgm['0'])
+    # iterating would have built thousands of nodes
+    assert len(prgm.nodes) < 20
+    assert getReg(last, 'eax').value == 0xaaaaaaaa
+    assert getReg(last, 'ecx').value == 0
+    assert getReg(last, 'esi').value == 0x20000
+    assert getReg(last, 'edi').value == 0x40000
+
+
+def test_repe_cmpsw(analyzer, initialState):
+    """
+    Test that rep followed by an operand size prefix is still repe for
+    cmps: the loop stops at the first different words
+        mov esi, 0x10000
+        mov edi, 0x10010
+        mov ecx, 4
+        mov word [0x10002], 0x1234
+        cld
+        repe cmpsw
+        nop
+    """
+    opcode = ("be00000100"+"bf10000100"+"b904000000" +
+              "66c705020001003412"+"fc"+"f366a7"+"90").decode("hex")
+    bigState = initialState.replace(
+        "mem[0x100] = 0xa5 ! 0xf0",
+        "mem[0x100] = 0xa5 ! 0xf0\nmem[0x10000*65536] = 0xaa").replace(
+        "unroll = 5", "unroll = 20")
+    prgm = analyzer(bigState, binarystr=opcode)
+    after = [prgm[n] for n in prgm.node_id_from_addr(28)]
+    assert after
+    for state in after:
+        assert getReg(state, 'ecx').value == 2
+        assert getReg(state, 'esi').value == 0x10004
+        assert getReg(state, 'edi').value == 0x10014
+
+
+def test_flag_liveness(analyzer, initialState):
+    """
+    Test that removing the dead flag updates does not change the last state
+        add eax, ebx    ; its flags are set again by sub
+        sub ecx, edx
+    """
+    opcode = ("01d8"+"29d1").decode("hex")
+    prgm = analyzer(initialState, binarystr=opcode)
+    last = getLastState(prgm, prgm['0'])
+    livenessState = initialState.replace(
+        "analysis = forward_binary",
+        "analysis = forward_binary\nflag_liveness = true")
+    prgm_liveness = analyzer(livenessState, binarystr=opcode)
+    last_liveness = getLastState(prgm_liveness, prgm_liveness['0'])
+    assert last_liveness == last, last_liveness.diff(last, "liveness", "all")
+
+
+def test_block_nodes(analyzer, initialState):
+    """
+    Test that a basic block analysed as a single node ends with the same
+    state as when every instruction has its own node
+        add eax, ebx
+        sub ecx, edx
+        inc eax
+    """
+    opcode = ("01d8"+"29d1"+"40").decode("hex")
+    prgm = analyzer(initialState, binarystr=opcode)
+    last = getLastState(prgm, prgm['0'])
+    blockState = initialState.replace(
+        "analysis = forward_binary",
+        "analysis = forward_binary\nblock_nodes = true")
+    prgm_block = analyzer(blockState, binarystr=opcode)
+    assert len(prgm_block['0'].instructions) == 3
+    assert len(prgm_block.nodes) == 2
+    last_block = getLastState(prgm_block, prgm_block['0'])
+    assert last_block == last, last_block.diff(last, "block", "instruction")
+
+
+def test_retention_function_entries(analyzer, initialState):
+    """
+    Test that the states that are not retained have no value while the
+    last state is the same as when every state is kept
+        add eax, ebx
+        sub ecx, edx
+        inc eax
+    """
+    opcode = ("01d8"+"29d1"+"40").decode("hex")
+    prgm = analyzer(initialState, binarystr=opcode)
+    last = getLastState(prgm, prgm['0'])
+    sparseState = initialState.replace(
+        "analysis = forward_binary",
+        "analysis = forward_binary\nretention = function_entries")
+    prgm_sparse = analyzer(sparseState, binarystr=opcode)
+    # the entry point is retained
+    assert prgm_sparse['0'].regaddrs
+    middle = getNextState(prgm_sparse, prgm_sparse['0'])
+    assert not middle.regaddrs
+    last_sparse = getLastState(prgm_sparse, prgm_sparse['0'])
+    assert last_sparse == last, last_sparse.diff(last, "sparse", "all")
+
+
+def test_retention_loop(analyzer, initialState):
+    """
+    Test that the states of a loop head are kept so that the loop stops as
+    soon as when every state is kept
+        nop
+    loop:
+        mov eax, 1
+        jmp loop
+    """
+    opcode = ("90"+"b801000000"+"ebf9").decode("hex")
+    prgm = analyzer(initialState, binarystr=opcode)
+    sparseState = initialState.replace(
+        "analysis = forward_binary",
+        "analysis = forward_binary\nretention = function_entries")
+    prgm_sparse = analyzer(sparseState, binarystr=opcode)
+    assert sorted(prgm_sparse.nodes) == sorted(prgm.nodes)
+    for addr in prgm.states:
+        for node_id in prgm.states[addr]:
+            if prgm_sparse[node_id].regaddrs:
+                assert prgm_sparse[node_id] == prgm[node_id]
+
+
+def test_delta_output(analyzer, initialState):
+    """
+    Test that the states rebuilt from a delta encoded output are the ones
+    of the complete output
+        add eax, ebx
+        mov [esp], eax
+        inc ecx
+    """
+    opcode = ("01d8"+"890424"+"41").decode("hex")
+    prgm = analyzer(initialState, binarystr=opcode)
+    deltaState = initialState.replace(
+        "analysis = forward_binary",
+        "analysis = forward_binary\ndelta_output = true")
+    prgm_delta = analyzer(deltaState, binarystr=opcode)
+    assert sorted(prgm_delta.nodes) == sorted(prgm.nodes)
+    assert any(s.parent is not None for s in prgm_delta.nodes.values())
+    for node_id, state in prgm.nodes.items():
+        delta = prgm_delta[node_id]
+        assert delta == state, delta.diff(state, "delta", "complete")
+
+
+def test_changed_overrides(analyzer, initialState, tmpdir):
+    """
+    Test that the re-analysis of a CFA whose overrides have changed gives
+    the states of a complete analysis with the new overrides
+        add eax, ebx
+        inc ecx
+        mov edx, eax
+    """
+    opcode = ("01d8"+"41"+"89c2").decode("hex")
+    overrides = "\n[override]\n0x2 = reg[eax], TAINT_%s;\n"
+    analyzer(initialState + overrides % "NONE", binarystr=opcode)
+    shutil.copyfile(str(tmpdir.join('outcfa.marshal')),
+                    str(tmpdir.join('incfa.marshal')))
+    changedState = initialState.replace(
+        "analysis = forward_binary",
+        "analysis = forward_binary\nchanged_overrides = 0x2")
+    prgm_changed = analyzer(changedState + overrides % "ALL",
+                            binarystr=opcode)
+    prgm = analyzer(initialState + overrides % "ALL", binarystr=opcode)
+    assert sorted(prgm_changed.states) == sorted(prgm.states)
+    for addr in prgm.states:
+        state = prgm[prgm.node_id_from_addr(addr)[0]]
+        changed = prgm_changed[prgm_changed.node_id_from_addr(addr)[0]]
+        assert changed == state, changed.diff(state, "changed", "complete")
+
+
+def test_marshalled_cfa(analyzer, initialState, tmpdir):
+    """
+    Test that a forward analysis from a marshalled CFA keeps the states
+    that are not reachable from its entry point
+        add eax, ebx
+        inc ecx
+        mov edx, eax
+    """
+    opcode = ("01d8"+"41"+"89c2").decode("hex")
+    prgm = analyzer(initialState, binarystr=opcode)
+    shutil.copyfile(str(tmpdir.join('outcfa.marshal')),
+                    str(tmpdir.join('incfa.marshal')))
+    cfaState = initialState.replace(
+        "analysis = forward_binary", "analysis = forward_cfa").replace(
+        "analysis_ep = 0x00", "analysis_ep = 0x02")
+    prgm_cfa = analyzer(cfaState, binarystr=opcode)
+    for node_id in prgm.nodes:
+        assert node_id in prgm_cfa.nodes
+    # the state at 0 is not reachable from 2: it is loaded unchanged
+    assert prgm_cfa['0'] == prgm['0'], prgm_cfa['0'].diff(
+        prgm['0'], "forward_cfa", "forward_binary")
+
+    # the loaded states are not counted in the node budget
+    budgetState = cfaState.replace(
+        "analysis = forward_cfa", "analysis = forward_cfa\nmax_nodes = 2")
+    prgm_budget = analyzer(budgetState, binarystr=opcode)
+    assert len(prgm.nodes) > 2
+    assert prgm_budget.partial is None
+
+
+@pytest.mark.parametrize("content, message", [
+    ("garbage", "is not a marshalled CFA"),
+    ("BINCATMCFA\x00\x00\x00\x01" + "0" * 20,
+     "unsupported format version 1"),
+    ("BINCATMCFA\x00\x00\x00\x02" + "%020d" % 14, "is corrupted"),
+])
+def test_marshalled_cfa_rejected(analyzer, initialState, tmpdir,
+                                 content, message):
+    """
+    Test that a forward analysis from a foreign, old or truncated
+    marshalled CFA is aborted
+    """
+    with open(str(tmpdir.join('incfa.marshal')), 'wb') as f:
+        f.write(content)
+    cfaState = initialState.replace(
+        "analysis = forward_binary", "analysis = forward_cfa")
+    with pytest.raises(Exception):
+        analyzer(cfaState, binarystr="90".decode("hex"))
+    assert message in tmpdir.join('log.txt').read()
+
+
+def test_function_summaries(analyzer, initialState):
+    """
+    Test that the states after the second call of a function with two
+    returns are the same with and without function summaries. The second
+    return is reached after the second call has started: the summary of the
+    first call cannot be applied before
+        call f
+        call f
+        nop
+    f:
+        test al, 0xf0   ; al is partially unknown: both branches are taken
+        jz r2
+        mov ebx, 1
+        ret
+    r2:
+        mov ebx, 2
+        nop
+        nop
+        nop
+        ret
+    """
+    opcode = ("e806000000"+"e801000000"+"90"+"a8f0"+"7406"+"bb01000000" +
+              "c3"+"bb02000000"+"90"+"90"+"90"+"c3").decode("hex")
+    prgm = analyzer(initialState, binarystr=opcode)
+    summaryState = initialState.replace(
+        "analysis = forward_binary",
+        "analysis = forward_binary\nfunction_summaries = true")
+    prgm_summary = analyzer(summaryState, binarystr=opcode)
+
+    after = [prgm[n] for n in prgm.node_id_from_addr(10)]
+    after_summary = [prgm_summary[n]
+                     for n in prgm_summary.node_id_from_addr(10)]
+    assert after
+    ebx = sorted(set(getReg(s, 'ebx').value for s in after))
+    ebx_summary = sorted(set(getReg(s, 'ebx').value for s in after_summary))
+    assert ebx_summary == ebx
+
+
+def test_function_summary_applied(analyzer, initialState, tmpdir):
+    """
+    Test that the summary of a function without branches is applied to its
+    second call and gives the states of the analysis without summaries
+        call f
+        call f
+        nop
+    f:
+        mov ecx, ecx
+        ret
+    """
+    opcode = ("e806000000"+"e801000000"+"90"+"89c9"+"c3").decode("hex")
+    prgm = analyzer(initialState, binarystr=opcode)
+    summaryState = initialState.replace(
+        "analysis = forward_binary",
+        "analysis = forward_binary\nfunction_summaries = true")
+    prgm_summary = analyzer(summaryState, binarystr=opcode)
+
+    log = tmpdir.join('log.txt').read()
+    assert "summary of the function at" in log
+    assert "function summaries: 1 hit(s)" in log
+    after = [prgm[n] for n in prgm.node_id_from_addr(10)]
+    after_summary = [prgm_summary[n]
+                     for n in prgm_summary.node_id_from_addr(10)]
+    assert len(after) == 1
+    assert len(after_summary) == 1
+    assert after_summary[0] == after[0], \
+        "state after the second call differs with summaries\n%s" % (
+            after[0].diff(after_summary[0], "without", "with summaries"))
+
+
+def test_node_budget(analyzer, initialState):
+    """
+    Test that an analysis exceeding its node budget stops with a partial
+    result
+        inc eax
+        inc ebx
+        inc ecx
+        inc edx
+    """
+    opcode = ("40"+"43"+"41"+"42").decode("hex")
+    prgm = analyzer(initialState, binarystr=opcode)
+    assert prgm.partial is None
+    budgetState = initialState.replace(
+        "analysis = forward_binary",
+        "analysis = forward_binary\nmax_nodes = 2")
+    prgm_budget = analyzer(budgetState, binarystr=opcode)
+    assert prgm_budget.partial == "node budget of 2 states exceeded"
+    assert len(prgm_budget.nodes) < len(prgm.nodes)
+    for node_id, state in prgm_budget.nodes.items():
+        assert state == prgm[node_id], \
+            state.diff(prgm[node_id], "budget", "complete")
+
+
+def test_checkpoint_resume(analyzer, initialState, tmpdir):
+    """
+    Test that an analysis stopped after 2 states then resumed from its
+    checkpoint computes the states of an uninterrupted analysis
+        test eax, eax   ; eax is partially unknown: both branches are taken
+        jz +2
+        inc ebx
+        inc ecx
+        inc edx
+        inc esi
+    """
+    opcode = ("85c0"+"7402"+"43"+"41"+"42"+"46").decode("hex")
+    prgm = analyzer(initialState, binarystr=opcode)
+    ckfname = str(tmpdir.join('checkpoint'))
+    stoppedState = initialState.replace(
+        "analysis = forward_binary",
+        "analysis = forward_binary\nmax_nodes = 2\ncheckpoint_file = %s" %
+        ckfname)
+    stopped = analyzer(stoppedState, binarystr=opcode)
+    assert stopped.partial is not None
+    assert len(stopped.nodes) < len(prgm.nodes)
+    resumedState = initialState.replace(
+        "analysis = forward_binary",
+        "analysis = forward_binary\nresume_from = %s" % ckfname)
+    resumed = analyzer(resumedState, binarystr=opcode)
+    assert resumed.partial is None
+    assert sorted(resumed.nodes.keys()) == sorted(prgm.nodes.keys())
+    for node_id, state in prgm.nodes.items():
+        assert resumed[node_id] == state, \
+            resumed[node_id].diff(state, "resumed", "uninterrupted")
+    for node_id, succs in prgm.edges.items():
+        assert sorted(resumed.edges.get(node_id, [])) == sorted(succs)
+
+    # a checkpoint is only resumed with the same vector representation
+    with pytest.raises(Exception):
+        analyzer(resumedState.replace(
+            "analysis = forward_binary",
+            "analysis = forward_binary\nvector = packed"), binarystr=opcode)
+    assert "vector representation bits instead of packed" in \
+        tmpdir.join('log.txt').read()
+    with open(ckfname, 'wb') as f:
+        f.write("garbage")
+    with pytest.raises(Exception):
+        analyzer(resumedState, binarystr=opcode)
+    assert "is not a checkpoint file" in tmpdir.join('log.txt').read()
+
+
+def test_entry_points(analyzer, initialState):
+    """
+    Test that the states of every entry point of a batch analysis are the
+    ones of the analysis from this entry point only
+        inc eax
+        inc ebx
+        inc ecx
+        inc edx
+    """
+    opcode = ("40"+"43"+"41"+"42").decode("hex")
+    prgm = analyzer(initialState.replace(
+        "analysis_ep = 0x00", "analysis_ep = 0x00, 0x02"), binarystr=opcode)
+    assert len(prgm.entry_points) == 2
+    for ep in (0, 2):
+        single = analyzer(initialState.replace(
+            "analysis_ep = 0x00", "analysis_ep = %#x" % ep), binarystr=opcode)
+        node_ids = prgm.entry_point_node_ids(ep)
+        single_ids = sorted(single.nodes, key=int)
+        assert len(node_ids) == len(single_ids)
+        for node_id, single_id in zip(node_ids, single_ids):
+            state = prgm[node_id]
+            assert state.address == single[single_id].address
+            assert state == single[single_id], \
+                state.diff(single[single_id], "batch", "single")
+
+
+def test_server(analyzer, initialState, tmpdir):
+    """
+    Test that the analyses run one after the other by the same server give
+    the results of separate runs, whether the code and the vector
+    representation change or not, and that a malformed request is rejected
+        add eax, ebx    then    add eax, ecx
+        inc ecx                 dec ebx
+                                nop
+    """
+    from pybincat import server
+    packedState = initialState.replace(
+        "analysis = forward_binary",
+        "analysis = forward_binary\nvector = packed")
+    # the fourth run decodes other instructions at the same addresses
+    runs = [("01d8"+"41", initialState), ("01d8"+"41", initialState),
+            ("01d8"+"41", packedState), ("01c8"+"4b"+"90", initialState),
+            ("01d8"+"41", initialState)]
+    expected = [analyzer(state, binarystr=opcodes.decode("hex"))
+                for opcodes, state in runs]
+    analyzer_server = server.AnalyzerServer()
+    try:
+        for i, (opcodes, state) in enumerate(runs):
+            binarystr = opcodes.decode("hex")
+            with open(str(tmpdir.join('file.bin')), 'wb') as f:
+                f.write(binarystr)
+            initfname = str(tmpdir.join('server%d.ini' % i))
+            with open(initfname, 'w') as f:
+                f.write(state.format(code_length=len(binarystr)))
+            prgm = analyzer_server.analyze(
+                initfname, str(tmpdir.join('server%d.out.ini' % i)),
+                str(tmpdir.join('server%d.log' % i)))
+            assert sorted(prgm.nodes) == sorted(expected[i].nodes)
+            for node_id, state in expected[i].nodes.items():
+                assert prgm[node_id] == state, \
+                    prgm[node_id].diff(state, "server", "library")
+        analyzer_server.proc.stdin.write("init.ini end.ini\n")
+        analyzer_server.proc.stdin.flush()
+        assert analyzer_server.proc.stdout.readline().startswith(
+            "error invalid request")
+    finally:
+        analyzer_server.close()
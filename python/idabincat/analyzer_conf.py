@@ -326,6 +326,67 @@ class AnalyzerConfig(object):
         self._config.set('analyzer', 'out_marshalled_cfa_file', out_cfa)
         self._config.set('analyzer', 'in_marshalled_cfa_file', in_cfa)
 
+    def set_stream_results(self, stream="true"):
+        self._config.set('analyzer', 'stream_results', stream)
+
+    def set_changed_overrides(self, addresses):
+        """
+        addresses: addresses (int) whose overrides changed since the analysis
+        stored into in_marshalled_cfa_file. Only the states reachable from
+        them are computed again. An empty list requests a full analysis.
+        """
+        if addresses:
+            self._config.set(
+                'analyzer', 'changed_overrides',
+                ", ".join("0x%x" % a for a in sorted(addresses)))
+        else:
+            self._config.remove_option('analyzer', 'changed_overrides')
+
+    #: options of the [analyzer] section that do not change the result of
+    #: a forward_binary analysis
+    _run_options = ('in_marshalled_cfa_file', 'out_marshalled_cfa_file',
+                    'store_marshalled_cfa', 'stream_results',
+                    'changed_overrides')
+
+    def _overrides(self):
+        """
+        Returns a dict address (int) -> set of override rules
+        """
+        res = {}
+        if not self._config.has_section('override'):
+            return res
+        for addr, rules in self._config.items('override'):
+            rules = set(r.strip() for r in rules.split(';') if r.strip())
+            res[int(addr, 16)] = rules
+        return res
+
+    def changed_overrides(self, previous):
+        """
+        Returns the set of addresses whose overrides differ in the previous
+        config, or None if anything else that has an effect on the analysis
+        differs.
+        """
+        for section in set(self._config.sections() +
+                           previous._config.sections()):
+            if section == 'override':
+                continue
+            items = []
+            for config in (self._config, previous._config):
+                if config.has_section(section):
+                    items.append(dict(config.items(section)))
+                else:
+                    items.append({})
+            if section == 'analyzer':
+                for d in items:
+                    for opt in self._run_options:
+                        d.pop(opt, None)
+            if items[0] != items[1]:
+                return None
+        overrides = self._overrides()
+        prev_overrides = previous._overrides()
+        return set(a for a in set(overrides) | set(prev_overrides)
+                   if overrides.get(a) != prev_overrides.get(a))
+
     def update_overrides(self, overrides):
         # 1. Empty existing overrides sections
         self._config.remove_section("override")
@@ -20,6 +20,7 @@
 """
 
 import collections
+import copy
 import hashlib
 import logging
 import os
@@ -113,6 +114,8 @@ class BincatPlugin(idaapi.plugin_t):
         try:
             from pybincat import cfa as cfa_module
             global cfa_module
+            from pybincat import profile as profile_module
+            global profile_module
         except:
             bc_log.warning(
                 "Failed to load 'pybincat.cfa' python module\n%s",
@@ -146,9 +149,11 @@ class BincatPlugin(idaapi.plugin_t):
 
 
 class Analyzer(object):
-    def __init__(self, path, finish_cb):
+    def __init__(self, path, finish_cb, partial_cb=None):
         self.path = path
         self.finish_cb = finish_cb
+        #: called with (outfname, logfname) while the analysis is running
+        self.partial_cb = partial_cb
 
     def generate_tnpk(self, fname=None, destfname=None):
         """
@@ -195,6 +200,9 @@ class LocalAnalyzer(Analyzer, QtCore.QProcess):
         self.stateChanged.connect(self.procanalyzer_on_state_change)
         self.started.connect(self.procanalyzer_on_start)
         self.finished.connect(self.procanalyzer_on_finish)
+        # periodic loading of the partial results
+        self.partial_timer = QtCore.QTimer()
+        self.partial_timer.timeout.connect(self.load_partial)
 
     def generate_tnpk(self, fname=None, destfname=None):
         if fname:
@@ -229,6 +237,7 @@ class LocalAnalyzer(Analyzer, QtCore.QProcess):
         except IndexError:
             errtxt = "Unspecified error %s" % err
         bc_log.error("Analyzer error: %s", errtxt)
+        self.partial_timer.stop()
         self.process_output()
 
     def procanalyzer_on_state_change(self, new_state):
@@ -237,13 +246,22 @@ class LocalAnalyzer(Analyzer, QtCore.QProcess):
 
     def procanalyzer_on_start(self):
         bc_log.info("Analyzer: starting process")
+        if self.partial_cb:
+            self.partial_timer.start(10000)
 
     def procanalyzer_on_finish(self):
         bc_log.info("Analyzer process finished")
+        self.partial_timer.stop()
         exitcode = self.exitCode()
         bc_log.error("analyzer returned exit code=%i", exitcode)
         self.process_output()
 
+    def load_partial(self):
+        """
+        Load the results streamed so far by the running analyzer.
+        """
+        self.partial_cb(self.outfname, self.logfname)
+
     def process_output(self):
         """
         Try to process analyzer output.
@@ -353,6 +371,8 @@ class WebAnalyzer(Analyzer):
         # patch in_marshalled_cfa_file - replace with file contents sha256
         if os.path.exists(self.cfainfname):
             cfa_sha256 = self.sha256_digest(self.cfainfname)
+            if not self.upload_file(self.cfainfname, cfa_sha256):
+                return
             temp_config.in_marshalled_cfa_file = cfa_sha256
         else:
             temp_config.in_marshalled_cfa_file = "no-input-file"
@@ -452,6 +472,8 @@ class State(object):
     def __init__(self):
         self.current_ea = None
         self.cfa = None
+        #: per address cost of the last analysis, if it has been profiled
+        self.profile = None
         self.current_state = None
         self.current_node_ids = []
         #: last run config
@@ -469,6 +491,10 @@ class State(object):
         self.configurations = AnalyzerConfigurations(self)
         # XXX store in idb after encoding?
         self.last_cfaout_marshal = None
+        #: configuration of the analysis that produced last_cfaout_marshal
+        self.last_cfaout_config = None
+        #: configuration of the running analysis
+        self.analyzed_config = None
         #: filepath to last dumped remapped binary
         self.remapped_bin_path = None
         self.remap_binary = True
@@ -523,11 +549,76 @@ class State(object):
                 ea = v.value
                 idaapi.set_item_color(ea, color)
 
+    def analysis_partial_cb(self, outfname, logfname):
+        cfa = cfa_module.CFA.parse_partial(outfname, logs=logfname)
+        if not cfa:
+            return
+        bc_log.debug("Loaded partial analysis results (%d nodes)",
+                     len(cfa.nodes))
+        self.clear_background()
+        self.cfa = cfa
+        self.profile = None
+        self.color_states()
+        self.set_current_ea(self.current_ea, force=True)
+
+    def color_states(self):
+        """
+        Colors analyzed instructions, depending on whether they are tainted,
+        or on their analysis cost if the analysis has been profiled
+        """
+        if self.profile:
+            self.color_profile()
+            return
+        for addr, nodeids in self.cfa.states.items():
+            ea = addr.value
+            tainted = False
+            for n_id in nodeids:
+                # is it tainted?
+                # find children state
+                state = self.cfa[n_id]
+                if state.tainted:
+                    tainted = True
+                    break
+
+            if tainted:
+                idaapi.set_item_color(ea, 0xDDFFDD)
+            else:
+                idaapi.set_item_color(ea, 0xCDCFCE)
+
+    def color_profile(self):
+        """
+        Colors analyzed instructions from light yellow to red depending on
+        the time spent analyzing them
+        """
+        max_time = self.profile.max_time()
+        for addr in self.cfa.states:
+            ea = addr.value
+            entry = self.profile.entries.get(ea)
+            if entry is None or max_time == 0:
+                ratio = 0.
+            else:
+                ratio = entry.time / max_time
+            # colors are 0xBBGGRR
+            blue = 0xCC - int(ratio * 0x4C)
+            green = 0xFF - int(ratio * 0x7F)
+            idaapi.set_item_color(ea, (blue << 16) | (green << 8) | 0xFF)
+
     def analysis_finish_cb(self, outfname, logfname, cfaoutfname, ea=None):
         bc_log.debug("Parsing analyzer result file")
         cfa = cfa_module.CFA.parse(outfname, logs=logfname)
+        if cfa and cfa.partial:
+            bc_log.warning("Partial result, the analysis stopped before its "
+                           "end: %s", cfa.partial)
         self.clear_background()
         self.cfa = cfa
+        try:
+            self.profile = profile_module.Profile.from_result(outfname)
+        except Exception as e:
+            bc_log.warning("Could not load the analysis profile: %s", e)
+            self.profile = None
+        if self.profile:
+            for addr, entry in self.profile.hottest(10):
+                bc_log.debug("analysis cost at 0x%x: %r", addr, entry)
         if cfa:
             # XXX add user preference for saving to idb? in that case, store
             # reference to marshalled cfa elsewhere
@@ -542,6 +633,7 @@ class State(object):
             if cfaoutfname is not None and os.path.isfile(cfaoutfname):
                 with open(cfaoutfname, 'rb') as f:
                     self.last_cfaout_marshal = f.read()
+                self.last_cfaout_config = self.analyzed_config
         else:
             bc_log.info("Empty or unparseable result file.")
         bc_log.debug("----------------------------")
@@ -563,21 +655,7 @@ class State(object):
         self.netnode["current_ea"] = current_ea
         if not cfa:
             return
-        for addr, nodeids in cfa.states.items():
-            ea = addr.value
-            tainted = False
-            for n_id in nodeids:
-                # is it tainted?
-                # find children state
-                state = cfa[n_id]
-                if state.tainted:
-                    tainted = True
-                    break
-
-            if tainted:
-                idaapi.set_item_color(ea, 0xDDFFDD)
-            else:
-                idaapi.set_item_color(ea, 0xCDCFCE)
+        self.color_states()
 
     def set_current_node(self, node_id):
         if self.cfa:
@@ -649,7 +727,8 @@ class State(object):
         # instance variable: we don't want the garbage collector to delete the
         # *Analyzer instance, killing an unlucky QProcess in the process
         try:
-            self.analyzer = self.new_analyzer(path, self.analysis_finish_cb)
+            self.analyzer = self.new_analyzer(path, self.analysis_finish_cb,
+                                              self.analysis_partial_cb)
         except AnalyzerUnavailable as e:
             bc_log.error("Analyzer is unavailable", exc_info=True)
 
@@ -670,6 +749,9 @@ class State(object):
         # may not exist if analysis mode is forward_binary
         self.current_config.set_cfa_options('true', self.analyzer.cfainfname,
                                             self.analyzer.cfaoutfname)
+        # partial results can only be read while a local analyzer is running
+        self.current_config.set_stream_results(
+            str(isinstance(self.analyzer, LocalAnalyzer)).lower())
         bc_log.debug("Generating .no files...")
 
         headers_filenames = self.current_config.headers_files.split(',')
@@ -727,6 +809,22 @@ class State(object):
             bc_log.debug("Final npk files: %r" % headers_filenames)
         self.current_config.headers_files = ','.join(headers_filenames)
 
+        # if only overrides have changed since the previous analysis, its
+        # CFA is reused and only the states depending on them are computed
+        # again
+        changed_overrides = None
+        if (analysis_method == "forward_binary" and
+                self.last_cfaout_config is not None):
+            changed_overrides = self.current_config.changed_overrides(
+                self.last_cfaout_config)
+        if changed_overrides:
+            bc_log.info("Only overrides have changed, reusing the previous "
+                        "CFA")
+            with open(self.analyzer.cfainfname, 'wb') as f:
+                f.write(self.last_cfaout_marshal)
+        self.current_config.set_changed_overrides(changed_overrides)
+        self.analyzed_config = copy.copy(self.current_config)
+
         self.current_config.write(self.analyzer.initfname)
         self.analyzer.run()
 
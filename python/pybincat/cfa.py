@@ -17,6 +17,7 @@
 """
 
 import ConfigParser
+import StringIO
 from collections import defaultdict
 import re
 from pybincat.tools import parsers
@@ -52,6 +53,21 @@ RE_REGION_ADDR = re.compile("(?P<region>reg|mem)\s*\[(?P<addr>[^]]+)\]")
 RE_VALTAINT = re.compile(
     "(?P<memreg>[a-zA-Z])(?P<value>0[xb][0-9a-fA-F_?]+)(!(?P<taint>\S+)|)?")
 
+#: prefix of the log line written by an analysis stopped before its end
+#: (max_time, max_nodes and max_heap options of the [analyzer] section)
+PARTIAL_PREFIX = "[PARTIAL] "
+
+
+def partial_status(logs):
+    """
+    Returns the reason why the analysis whose log contents are given stopped
+    before its end, or None if its result is complete
+    """
+    for line in logs.splitlines():
+        if line.startswith(PARTIAL_PREFIX):
+            return line[len(PARTIAL_PREFIX):].strip()
+    return None
+
 
 class PyBinCATParseError(PyBinCATException):
     pass
@@ -65,22 +81,25 @@ class CFA(object):
     #: Cache to speed up value parsing. (str, length) -> [Value, ...]
     _valcache = {}
 
-    def __init__(self, states, edges, nodes):
+    def __init__(self, states, edges, nodes, blocks=None, entry_points=None):
         #: Value (address) -> [node_id]. Nodes marked "final" come first.
         self.states = states
+        #: Value (address) -> [node_id] of the basic block nodes containing
+        #: the instruction at this address (block_nodes option)
+        self.blocks = blocks if blocks is not None else defaultdict(list)
         #: node_id (string) -> list of node_id (string)
         self.edges = edges
         #: node_id (string) -> State
         self.nodes = nodes
+        #: Value (address) -> (first node_id, last node_id) (int) of the
+        #: states computed from this entry point of a batch analysis
+        #: (several addresses in the analysis_ep option)
+        self.entry_points = entry_points if entry_points is not None else {}
         self.logs = None
 
     @classmethod
     def parse(cls, filename, logs=None):
 
-        states = defaultdict(list)
-        edges = defaultdict(list)
-        nodes = {}
-
         config = ConfigParser.RawConfigParser()
         try:
             config.read(filename)
@@ -91,6 +110,39 @@ class CFA(object):
             raise PyBinCATException(
                 "Invalid INI format for parsed output file %s.\n%s" %
                 (filename, estr))
+        return cls._parse_config(config, filename, logs)
+
+    @classmethod
+    def parse_partial(cls, filename, logs=None):
+        """
+        Parses the partial results of an analysis that is still running with
+        stream_results = true. They are read from filename + '.part'.
+        Returns None if this file does not exist (analysis not started or
+        already finished) or does not contain any complete section yet.
+        """
+        try:
+            with open(filename + '.part', 'rb') as f:
+                content = f.read()
+        except IOError:
+            return None
+        # sections end with an empty line, the last one may be incomplete
+        end = content.rfind('\n\n')
+        if end == -1:
+            return None
+        config = ConfigParser.RawConfigParser()
+        # sections appearing several times ([edges], updated nodes) are merged
+        config.readfp(StringIO.StringIO(content[:end+1]), filename + '.part')
+        return cls._parse_config(config, filename + '.part', logs)
+
+    @classmethod
+    def _parse_config(cls, config, filename, logs):
+
+        states = defaultdict(list)
+        edges = defaultdict(list)
+        nodes = {}
+        blocks = defaultdict(list)
+        entry_points = {}
+
         if len(config.sections()) == 0:
             raise PyBinCATException(
                 "Parsing error: no sections in %s, check analysis logs" %
@@ -112,11 +164,30 @@ class CFA(object):
                 else:
                     states[address].append(state.node_id)
                 nodes[state.node_id] = state
+                for insn in state.instructions:
+                    blocks[insn].append(state.node_id)
+                continue
+            elif section == 'entry points':
+                for addr, ids in config.items(section):
+                    m = RE_VALTAINT.match(addr)
+                    address = Value(m.group("memreg"),
+                                    int(m.group("value"), 0), 0)
+                    first, last = ids.split(', ')
+                    entry_points[address] = (int(first), int(last))
                 continue
             raise PyBinCATException("Cannot parse section name (%r)" % section)
 
+        # delta encoded states (delta_output option)
+        for state in nodes.values():
+            if state.parent is not None:
+                if state.parent not in nodes:
+                    raise PyBinCATException(
+                        "Parent node %s of node %s is missing" %
+                        (state.parent, state.node_id))
+                state._parent_state = nodes[state.parent]
+
         CFA._valcache = dict()
-        cfa = cls(states, edges, nodes)
+        cfa = cls(states, edges, nodes, blocks, entry_points)
         if logs:
             cfa.logs = open(logs, 'rb').read()
         return cfa
@@ -177,10 +248,41 @@ class CFA(object):
             node_id = str(node_id)
         return self.nodes.get(node_id, None)
 
+    @property
+    def partial(self):
+        """
+        Reason why the analysis stopped before its end because of a budget,
+        or None if the result is complete or the logs have not been loaded
+        """
+        if not self.logs:
+            return None
+        return partial_status(self.logs)
+
     def node_id_from_addr(self, addr):
         addr = self._toValue(addr)
         return self.states[addr]
 
+    def block_node_ids(self, addr):
+        """
+        Returns the node_ids of the states holding the instruction at addr,
+        either as their own address or inside their basic block (block_nodes
+        option). The abstract value of a basic block node is the one at its
+        first instruction.
+        """
+        addr = self._toValue(addr)
+        node_ids = list(self.states.get(addr, []))
+        return node_ids + [n for n in self.blocks.get(addr, [])
+                           if n not in node_ids]
+
+    def entry_point_node_ids(self, addr):
+        """
+        Returns the node_ids of the states computed from the given entry
+        point of a batch analysis, ordered by creation
+        """
+        addr = self._toValue(addr)
+        first, last = self.entry_points[addr]
+        return [str(n) for n in range(first, last+1) if str(n) in self.nodes]
+
     def next_states(self, node_id):
         """
         Returns a list of State
@@ -209,7 +311,8 @@ class State(object):
     example valtaints: G0x1234 G0x12!0xF0 S0x12!ALL
     """
     __slots__ = ['address', 'node_id', '_regaddrs', '_regtypes', 'final',
-                 'statements', 'bytes', 'tainted', '_outputkv']
+                 'statements', 'bytes', 'tainted', 'instructions', 'parent',
+                 '_parent_state', '_removed', '_outputkv']
 
     def __init__(self, node_id, address=None, lazy_init=None):
         self.address = address
@@ -223,6 +326,15 @@ class State(object):
         self.statements = ""
         self.bytes = ""
         self.tainted = False
+        #: addresses (Value) of the instructions of a basic block node, empty
+        #: for the node of a single instruction
+        self.instructions = []
+        #: node_id of the state the values of this one are relative to
+        #: (delta_output option), None if its values are complete
+        self.parent = None
+        self._parent_state = None
+        #: keys of the values of the parent that this state does not have
+        self._removed = []
 
     @property
     def regaddrs(self):
@@ -265,6 +377,16 @@ class State(object):
         new_state.statements = outputkv.pop("statements", "")
         new_state.bytes = outputkv.pop("bytes", "")
         new_state.tainted = outputkv.pop("tainted", "False") == "true"
+        insns = outputkv.pop("instructions", "")
+        if insns:
+            for insn in insns.split(', '):
+                m = RE_VALTAINT.match(insn)
+                new_state.instructions.append(
+                    Value(m.group("memreg"), int(m.group("value"), 0), 0))
+        new_state.parent = outputkv.pop("parent", None)
+        removed = outputkv.pop("removed", "")
+        if removed:
+            new_state._removed = removed.split('; ')
         new_state._outputkv = outputkv
         new_state._regaddrs = None
         new_state._regtypes = None
@@ -272,10 +394,53 @@ class State(object):
 
     def parse_regaddrs(self):
         """
-        Parses entries containing taint & type data
+        Parses entries containing taint & type data.
+        The values of a delta encoded state are rebuilt from the ones of its
+        parent, which are parsed first. Chains of states are followed
+        iteratively as they may be longer than the recursion limit.
         """
-        self._regaddrs = {}
-        self._regtypes = {}
+        chain = [self]
+        parent = self._parent_state
+        while parent is not None and parent._regaddrs is None:
+            chain.append(parent)
+            parent = parent._parent_state
+        for state in reversed(chain):
+            state._parse_own_regaddrs()
+
+    @staticmethod
+    def _key_regaddr(k):
+        """
+        Returns (typedata, regaddr) for the given key of a value
+        """
+        # keys are lower case, as the ones read by ConfigParser
+        k = k.lower()
+        typedata = k.startswith("t-")
+        if typedata:
+            k = k[2:]
+        m = RE_REGION_ADDR.match(k)
+        if not m:
+            raise PyBinCATException("Parsing error (key=%r)" % (k,))
+        region = m.group("region")
+        addr = m.group("addr")
+        if region == "mem":
+            # first address of "s0xabcd, s0xabce" or "g0x24*32"
+            m = RE_VALTAINT.match(addr.split('*')[0].split(', ')[0])
+            region, addr = m.group('memreg'), m.group('value')
+        return typedata, Value.parse(region, addr, '0', 0)
+
+    def _parse_own_regaddrs(self):
+        if self._parent_state is not None:
+            self._regaddrs = dict(self._parent_state._regaddrs)
+            self._regtypes = dict(self._parent_state._regtypes)
+            for k in self._removed:
+                typedata, regaddr = self._key_regaddr(k)
+                if typedata:
+                    self._regtypes.pop(regaddr, None)
+                else:
+                    self._regaddrs.pop(regaddr, None)
+        else:
+            self._regaddrs = {}
+            self._regtypes = {}
         for k, v in self._outputkv.iteritems():
             if k.startswith("t-"):
                 typedata = True
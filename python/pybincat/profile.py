@@ -0,0 +1,90 @@
+"""
+Reader for the per address profile of the analyzer (profile option of the
+[analyzer] section), written next to the result file as <out.ini>.profile
+"""
+
+import os.path
+from pybincat import PyBinCATException
+
+
+class ProfileEntry(object):
+    """
+    Cost of the analysis of the instructions at one address
+    """
+    def __init__(self, visits, decoding, stmts, filtering, joins, widenings):
+        #: number of analyzed states
+        self.visits = visits
+        #: time in seconds spent decoding the instruction
+        self.decoding = decoding
+        #: time in seconds spent computing the abstract values
+        self.stmts = stmts
+        #: time in seconds spent comparing new states with previous ones
+        self.filtering = filtering
+        self.joins = joins
+        self.widenings = widenings
+
+    @property
+    def time(self):
+        return self.decoding + self.stmts + self.filtering
+
+    def __repr__(self):
+        return ("ProfileEntry(visits=%d, time=%.6f, joins=%d, widenings=%d)" %
+                (self.visits, self.time, self.joins, self.widenings))
+
+
+class Profile(object):
+    def __init__(self, entries):
+        #: address (int) -> ProfileEntry
+        self.entries = entries
+
+    @classmethod
+    def parse(cls, filename):
+        entries = {}
+        with open(filename, 'rb') as f:
+            for line in f:
+                if line.startswith('#') or not line.strip():
+                    continue
+                fields = line.split('\t')
+                if len(fields) != 7:
+                    raise PyBinCATException(
+                        "Cannot parse profile line (%r)" % line)
+                # addresses are prefixed by their region
+                addr = int(fields[0][1:], 16)
+                entry = ProfileEntry(int(fields[1]), float(fields[2]),
+                                     float(fields[3]), float(fields[4]),
+                                     int(fields[5]), int(fields[6]))
+                # several regions may share the same offset
+                prev = entries.get(addr)
+                if prev is not None:
+                    entry = ProfileEntry(
+                        prev.visits + entry.visits,
+                        prev.decoding + entry.decoding,
+                        prev.stmts + entry.stmts,
+                        prev.filtering + entry.filtering,
+                        prev.joins + entry.joins,
+                        prev.widenings + entry.widenings)
+                entries[addr] = entry
+        return cls(entries)
+
+    @classmethod
+    def from_result(cls, outfname):
+        """
+        Returns the profile written next to the given result file, or None if
+        the analysis has not been profiled
+        """
+        fname = outfname + ".profile"
+        if not os.path.isfile(fname):
+            return None
+        return cls.parse(fname)
+
+    def hottest(self, n=20):
+        """
+        Returns the n (address, ProfileEntry) that took the most time
+        """
+        return sorted(self.entries.items(), key=lambda e: e[1].time,
+                      reverse=True)[:n]
+
+    def max_time(self):
+        if not self.entries:
+            return 0.
+        return max(e.time for e in self.entries.values())
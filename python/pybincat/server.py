@@ -0,0 +1,45 @@
+"""
+Client of a long running analyzer (bincat_native --server).
+
+Every analysis is requested by a line giving the names of its configuration,
+result and log files. The analyzer answers "ok" or "error <message>" once it
+is finished. Binaries and function headers stay loaded between the analyses
+as long as their file does not change, and so do the decoded instructions as
+long as the code and the decoding options do not change.
+"""
+
+import subprocess
+from pybincat import PyBinCATException
+from pybincat.cfa import CFA
+
+
+class AnalyzerServer(object):
+    def __init__(self, command="bincat_native"):
+        self.proc = subprocess.Popen([command, "--server"],
+                                     stdin=subprocess.PIPE,
+                                     stdout=subprocess.PIPE)
+
+    def analyze(self, initfname, outfname, logfname):
+        """
+        Runs the analysis of the given configuration file and returns its
+        CFA. File names must not contain spaces.
+        """
+        for fname in (initfname, outfname, logfname):
+            if ' ' in fname:
+                raise PyBinCATException(
+                    "File names sent to the analyzer cannot contain spaces "
+                    "(%s)" % fname)
+        self.proc.stdin.write("%s %s %s\n" % (initfname, outfname, logfname))
+        self.proc.stdin.flush()
+        status = self.proc.stdout.readline()
+        if not status:
+            raise PyBinCATException("The analyzer has stopped")
+        status = status.rstrip('\n')
+        if status != "ok":
+            raise PyBinCATException(
+                "Analysis failed: %s" % status[len("error "):])
+        return CFA.parse(outfname, logs=logfname)
+
+    def close(self):
+        self.proc.stdin.close()
+        self.proc.wait()
@@ -0,0 +1,52 @@
+"""
+Reader for the binary trace of the analyzer (trace_file option of the
+[analyzer] section).
+
+The file starts with a magic string followed by records of 13 bytes: the
+event code (1 byte), the node id (4 bytes) and the address (8 bytes), all
+little endian.
+"""
+
+import struct
+from pybincat import PyBinCATException
+
+MAGIC = "BCTRACE1"
+
+#: event code -> event name
+EVENTS = {
+    1: "visit",
+    2: "explore",
+    3: "subsumed",
+    4: "widen",
+    5: "unreachable",
+}
+
+_RECORD = struct.Struct("<BIQ")
+
+
+def read_trace(filename):
+    """
+    Yields the events of the given trace file as (event, node_id, address)
+    tuples. node_id is a string, as the keys of CFA.nodes.
+    A truncated last record (interrupted analysis) is ignored.
+    """
+    with open(filename, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise PyBinCATException("%s is not a BinCAT trace file" % filename)
+        while True:
+            record = f.read(_RECORD.size)
+            if len(record) < _RECORD.size:
+                return
+            code, node_id, address = _RECORD.unpack(record)
+            yield EVENTS.get(code, code), str(node_id), address
+
+
+def count_events(filename):
+    """
+    Returns a dict event -> {address: number of events at this address}
+    """
+    counts = {}
+    for event, _, address in read_trace(filename):
+        per_addr = counts.setdefault(event, {})
+        per_addr[address] = per_addr.get(address, 0) + 1
+    return counts
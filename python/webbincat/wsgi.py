@@ -28,6 +28,7 @@ import flask
 import zlib
 import logging
 import idabincat.npkgen
+from pybincat.cfa import partial_status
 
 logging.basicConfig(level=logging.DEBUG)
 
@@ -159,7 +160,10 @@ def analyze():
     binary_name = config.get('binary', 'filepath').lower()
     analysis_method = config.get('analyzer', 'analysis').lower()
     input_files = [binary_name]
-    if analysis_method in ("forward_cfa", "backward"):
+    # the CFA of a previous analysis is also reused by a forward_binary
+    # analysis when only overrides have changed
+    if (analysis_method in ("forward_cfa", "backward") or
+            config.has_option("analyzer", "changed_overrides")):
         in_marshalled_cfa_file = \
             config.get('analyzer', 'in_marshalled_cfa_file').lower()
         input_files.append(in_marshalled_cfa_file)
@@ -227,6 +231,9 @@ def analyze():
                 # file exists, ignore
                 pass
             result['analyzer.log'] = fname
+        # reason why the analysis stopped before its end (budgets)
+        with open(logfname, 'rb') as f:
+            result['partial'] = partial_status(f.read())
     else:
         result['analyzer.log'] = ""
     outfname = os.path.join(dirname, 'out.ini')